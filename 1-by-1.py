@@ -1,37 +1,17 @@
+import os
 import pandas as pd
+from compound_index import add_smiles_columns
 
+# Set metadata tables for density, refractive index and melting point
+output_csv_files = ['density_output.csv', 'refrindex-output.csv', 'meltpoint-output.csv']
 
-df_smiles = pd.read_csv('compounds.csv')
-output_df = pd.read_csv('meltpoint-output.csv')
-compound_id_1 = output_df['compound id 1']
-compound_id_2 = output_df['compound id 2']
-compound_id_3 = output_df['compound id 3']
-comp1smiles = []
-for i in compound_id_1:
-    smile = df_smiles.loc[df_smiles['compound id'] == i, 'smiles']
-    if not smile.empty:
-        comp1smiles.append(smile.values[0])
-    else:
-        comp1smiles.append(None)
-output_df['smile 1'] = comp1smiles
-comp2smiles = []
-for i in compound_id_2:
-    smile = df_smiles.loc[df_smiles['compound id'] == i, 'smiles']
-    if not smile.empty:
-        comp2smiles.append(smile.values[0])
-    else:
-        comp2smiles.append(None)
-
-output_df['smile 2'] = comp2smiles
-comp3smiles = []
-for i in compound_id_3:
-    smile = df_smiles.loc[df_smiles['compound id'] == i, 'smiles']
-    if not smile.empty:
-        comp3smiles.append(smile.values[0])
-    else:
-        comp3smiles.append(None)
-
-output_df['smile 3'] = comp3smiles
-output_df['smile 1'] = comp1smiles
-
-output_df.to_csv('meltpoint-output.csv', index=False)
+for output_csv_file in output_csv_files:
+    if not os.path.exists(output_csv_file):
+        continue
+    output_df = pd.read_csv(output_csv_file, dtype=str)
+    before = output_df.copy()
+    add_smiles_columns(output_df, 'compounds.csv')
+    # json_to_csv and main_functions read these tables, so the SMILES are written back into them;
+    # a table whose SMILES were already filled is left untouched
+    if not output_df.equals(before):
+        output_df.to_csv(output_csv_file, index=False)
@@ -0,0 +1,227 @@
+import os
+import sys
+import csv
+import json
+import time
+import runpy
+import random
+import string
+import argparse
+from contextlib import contextmanager
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shapes of the three properties: JSON folder, metadata CSV, idset name, property name,
+# measured column and its value range, and the mean number of rows per set
+PROPERTY_SHAPES = {
+    'density': {'folder': 'density_data', 'metadata_csv': 'density_output.csv', 'idset': 'density',
+                'property': 'Density', 'title': 'Volumetric properties: Specific density',
+                'column': 'Specific density, kg/m<SUP>3</SUP>', 'value': (800.0, 1600.0), 'rows': 30},
+    'refindex': {'folder': 'refindex_json_data', 'metadata_csv': 'refrindex-output.csv', 'idset': 'refracrive-index',
+                 'property': 'Refractive index', 'title': 'Refraction, surface tension, and speed of sound: Refractive index (Na D-line)',
+                 'column': 'Refractive index (Na D-line)', 'value': (1.30, 1.60), 'rows': 12},
+    'meltingtemp': {'folder': 'meltingtemp_json_data', 'metadata_csv': 'meltpoint-output.csv', 'idset': 'melting-temperature',
+                    'property': 'Normal melting temperature', 'title': 'Phase transition properties: Normal melting temperature',
+                    'column': 'Normal melting temperature, K', 'value': (250.0, 450.0), 'rows': 1},
+}
+
+IDSET_HEADER = ['setid', 'ref', 'prp', 'phases', 'cmp1', 'cmp2', 'cmp3', 'np', 'nm1', 'nm2', 'nm3']
+
+# Share of density/refindex sets with 1, 2 and 3 components in the real density corpus
+COMPONENT_WEIGHTS = [50, 37, 13]
+
+def _random_id(rng, length, taken):
+    while True:
+        candidate = ''.join(rng.choice(string.ascii_letters) for _ in range(length))
+        if candidate not in taken:
+            taken.add(candidate)
+            return candidate
+
+def _value(rng, low, high, uncertainty):
+    """A raw ILThermo cell: ['997.8'] or ['997.8', '2']."""
+    value = f'{rng.uniform(low, high):.4g}'
+    return [value, f'{rng.uniform(0.01, 2):.2g}'] if uncertainty else [value]
+
+def generate_compounds(rng, n_compounds):
+    """Synthetic compounds.csv rows: id, name and a SMILES-like string."""
+    taken = set()
+    return [{'compound id': 'AA' + _random_id(rng, 4, taken),
+             'name': f'1-alkyl-{i}-methylimidazolium salt {i}',
+             'smiles': 'C' * rng.randint(1, 12) + f'[n+]1ccn(C)c1.[X-{i}]'} for i in range(n_compounds)]
+
+def generate_set(rng, setid, shape, compounds):
+    """One set JSON with the dhead/data/ref/components layout of the real files."""
+    if shape['rows'] == 1:
+        n_components, n_rows = 1, 1
+    else:
+        n_components = rng.choices([1, 2, 3], COMPONENT_WEIGHTS)[0]
+        n_rows = max(1, min(400, int(rng.expovariate(1 / shape['rows']))))
+    members = rng.sample(compounds, n_components)
+    uncertainty = rng.random() < 0.5
+
+    dhead, columns = [], []
+    if shape['rows'] > 1:
+        dhead += [['Temperature, K', None], ['Pressure, kPa', None]]
+        columns += [lambda: [f'{rng.choice(range(273, 374, 5)) + 0.15:.2f}'], lambda: ['101.325']]
+        for member in members[1:]:
+            dhead.append([f"Mole fraction of {member['name']}", 'Liquid'])
+            columns.append(lambda: [f'{rng.random():.4f}'])
+    dhead.append([shape['column'], 'Liquid'])
+    columns.append(lambda: _value(rng, *shape['value'], uncertainty))
+
+    return {
+        'phases': ['Liquid'] if shape['rows'] > 1 else ['Crystal', 'Liquid'],
+        'ref': {'title': f'Synthetic measurements of set {setid}', 'full': f'Author, A.; Author, B. (2020) J. Synth. Data {rng.randint(1, 99)}, 1-10.'},
+        'constr': [] if shape['rows'] > 1 else ['Pressure of 1 atm'],
+        'footer': '',
+        'data': [[column() for column in columns] for _ in range(n_rows)],
+        'solvent': None,
+        'expmeth': 'Vibrating tube method',
+        'title': shape['title'],
+        'components': [{'sample': [['Source:', 'commercial source'], ['Purity:', '99 mass %']], 'name': member['name'],
+                        'formula': 'C<SUB>8</SUB>H<SUB>15</SUB>N<SUB>2</SUB>', 'mw': f'{rng.uniform(100, 500):.2f}',
+                        'idout': member['compound id']} for member in members],
+        'dhead': dhead,
+    }
+
+def generate_corpus(root, n_sets=1000, seed=0, n_compounds=500):
+    """
+    Writes a synthetic corpus under root: n_sets density sets and proportionally sized
+    refindex and meltingtemp sets (the real 8770 : 2184 : 1262 ratio), their idsets and
+    metadata CSVs, output.csv and compounds.csv. The same seed gives the same corpus.
+    """
+    from pipeline import build_metadata_csv
+
+    rng = random.Random(seed)
+    compounds = generate_compounds(rng, n_compounds)
+    os.makedirs(os.path.join(root, 'idsets'), exist_ok=True)
+    with open(os.path.join(root, 'compounds.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['compound id', 'name', 'smiles'])
+        writer.writeheader()
+        writer.writerows(compounds)
+
+    taken = set()
+    counts = {'density': n_sets, 'refindex': max(1, n_sets * 2184 // 8770), 'meltingtemp': max(1, n_sets * 1262 // 8770)}
+    for name, shape in PROPERTY_SHAPES.items():
+        folder = os.path.join(root, shape['folder'])
+        os.makedirs(folder, exist_ok=True)
+        idset_rows = []
+        for _ in range(counts[name]):
+            setid = _random_id(rng, 5, taken)
+            full_data = generate_set(rng, setid, shape, compounds)
+            with open(os.path.join(folder, f'{name}_setid_{setid}.json'), 'w') as f:
+                json.dump(full_data, f)
+            ids = [c['idout'] for c in full_data['components']] + [None] * (3 - len(full_data['components']))
+            names = [c['name'] for c in full_data['components']] + [None] * (3 - len(full_data['components']))
+            idset_rows.append([setid, f'Author et al. ({rng.randint(1990, 2024)})', shape['property'],
+                               ';'.join(full_data['phases']), *ids, str(len(full_data['data'])), *names])
+        idset_path = os.path.join(root, 'idsets', f"{shape['idset']}-idset.json")
+        with open(idset_path, 'w') as f:
+            json.dump({'res': idset_rows, 'warnings': [], 'cnt': len(idset_rows), 'errors': [], 'header': IDSET_HEADER}, f)
+        build_metadata_csv(idset_path, os.path.join(root, shape['metadata_csv']), os.path.join(root, 'compounds.csv'))
+
+    # main_functions.main reads the density metadata from output.csv
+    with open(os.path.join(root, PROPERTY_SHAPES['density']['metadata_csv']), 'rb') as src, \
+            open(os.path.join(root, 'output.csv'), 'wb') as dst:
+        dst.write(src.read())
+    return counts
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def _timed(results, stage, files, func, repeat):
+    """Runs func repeat times and keeps the fastest run, which is the least noisy."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    results[stage] = {'seconds': seconds, 'files': files, 'files_per_s': files / seconds if seconds else 0.0}
+
+def run_stages(root, repeat=3):
+    """Times each offline stage on the corpus in root (best of repeat runs) and returns {stage: timing}."""
+    from compound_index import clear_compound_index
+    from main_functions import process_json_files_to_csv, update_density_csv_with_metadata
+    from json_to_csv import json_to_csv, load_additional_data
+    from merge_csv_files import merge_csv_files
+
+    column_mappings = {'ref': 'reference', 'prp': 'property', 'cmp1': 'compound id 1', 'cmp2': 'compound id 2',
+                       'cmp3': 'compound id 3', 'nm1': 'compound name 1', 'nm2': 'compound name 2', 'nm3': 'compound name 3'}
+    results = {}
+    with working_directory(root):
+        density_files = sorted(os.listdir('density_data'))
+        _timed(results, 'process_json_files_to_csv', len(density_files),
+               lambda: process_json_files_to_csv(density_files, 'density_data1.csv', column_mappings), repeat)
+
+        def convert_all():
+            for name, shape in PROPERTY_SHAPES.items():
+                additional_data = load_additional_data(shape['metadata_csv'])
+                csv_folder = f'{name}_csv_data'
+                os.makedirs(csv_folder, exist_ok=True)
+                for json_file in sorted(os.listdir(shape['folder'])):
+                    json_to_csv(os.path.join(shape['folder'], json_file),
+                                os.path.join(csv_folder, f'{os.path.splitext(json_file)[0]}.csv'), additional_data)
+        all_files = sum(len(os.listdir(shape['folder'])) for shape in PROPERTY_SHAPES.values())
+        _timed(results, 'json_to_csv', all_files, convert_all, repeat)
+
+        _timed(results, 'update_density_csv_with_metadata', len(density_files),
+               lambda: update_density_csv_with_metadata('output.csv', 'density_data1.csv'), repeat)
+
+        def smiles_join():
+            # Include loading compounds.csv, as a fresh run of 1-by-1.py does
+            clear_compound_index()
+            runpy.run_path(os.path.join(PACKAGE_DIR, '1-by-1.py'))
+        _timed(results, 'smiles_join', len(PROPERTY_SHAPES), smiles_join, repeat)
+
+        _timed(results, 'merge_csv_files', len(density_files),
+               lambda: merge_csv_files('density_csv_data', 'density-data.csv', required_columns=None), repeat)
+    return results
+
+def check_regressions(results, baseline, tolerance):
+    """Returns the stages slower than tolerance times their baseline seconds."""
+    failures = []
+    for stage, timing in results.items():
+        reference = baseline.get('stages', {}).get(stage)
+        if reference and timing['seconds'] > reference['seconds'] * tolerance:
+            failures.append(f"{stage}: {timing['seconds']:.3f} s > {tolerance} x {reference['seconds']:.3f} s")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the offline stages on a synthetic ILThermo corpus.")
+    parser.add_argument('--root', default='bench_corpus', help="corpus directory, generated if it does not exist")
+    parser.add_argument('--sets', type=int, default=1000, help="number of density sets to generate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json', help="where to write the timings")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage, the fastest is reported")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="allowed slowdown factor against the baseline")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        counts = generate_corpus(args.root, args.sets, args.seed)
+        print(f"Generated {counts} sets in {args.root}")
+    report = {'sets': args.sets, 'seed': args.seed, 'stages': run_stages(args.root, args.repeat)}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    for stage, timing in report['stages'].items():
+        print(f"{stage:>34}: {timing['seconds']:8.3f} s {timing['files_per_s']:10.0f} files/s")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        failures = check_regressions(report['stages'], baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
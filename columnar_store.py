@@ -0,0 +1,172 @@
+import os
+import logging
+import pandas as pd
+from tqdm import tqdm
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet store is optional, the CSV pipeline works without it
+    pa = None
+    ds = None
+    pq = None
+
+# Repeated per-set metadata, stored dictionary-encoded
+CATEGORICAL_COLUMNS = [
+    'reference',
+    'property',
+    'phases',
+    'compound id 1',
+    'compound name 1',
+    'smile 1',
+    'compound id 2',
+    'compound name 2',
+    'smile 2',
+    'compound id 3',
+    'compound name 3',
+    'smile 3'
+]
+
+PARTITION_COLUMNS = ['property', 'setid']
+
+UNCERTAINTY_SUFFIX = ' uncertainty'
+
+def _require_pyarrow():
+    if pq is None:
+        raise ImportError("The columnar store needs pyarrow: pip install pyarrow")
+
+def split_value_uncertainty(values):
+    """
+    Splits text cells such as '997.8±2', '997.8' or "['997.8']" into a float value Series
+    and a float uncertainty Series (NaN where no uncertainty was given).
+    """
+    text = values.astype('string').str.strip("[]'\" ")
+    parts = text.str.partition('±')
+    value = pd.to_numeric(parts[0], errors='coerce').astype('float64')
+    uncertainty = pd.to_numeric(parts[2].where(parts[1] == '±'), errors='coerce').astype('float64')
+    return value, uncertainty
+
+def to_typed_frame(df, property_name=None):
+    """
+    Converts a converted measurement table to typed columns: numbers and value±uncertainty
+    pairs become float64 columns, repeated metadata becomes categorical.
+    """
+    df = df.rename(columns={'propertiy': 'property'})
+    if 'property' not in df.columns:
+        df['property'] = property_name
+    elif property_name is not None:
+        df['property'] = df['property'].fillna(property_name)
+    df['setid'] = df['setid'].astype(str)
+
+    typed = {}
+    for col in df.columns:
+        series = df[col]
+        if col == 'setid' or col in CATEGORICAL_COLUMNS:
+            typed[col] = series
+            continue
+        if pd.api.types.is_numeric_dtype(series):
+            typed[col] = series.astype('float64')
+            continue
+        value, uncertainty = split_value_uncertainty(series)
+        if value.notna().sum() != series.notna().sum():
+            # Not a numeric column, keep the text as it is
+            typed[col] = series
+            continue
+        typed[col] = value
+        if uncertainty.notna().any():
+            typed[col + UNCERTAINTY_SUFFIX] = uncertainty
+
+    typed_df = pd.DataFrame(typed)
+    for col in CATEGORICAL_COLUMNS:
+        if col in typed_df.columns:
+            typed_df[col] = typed_df[col].astype('category')
+    return typed_df
+
+def set_partition_dir(store_root, property_value, setid):
+    """Returns the hive-style directory of one set: <root>/property=<p>/setid=<id>."""
+    return os.path.join(store_root, f'property={property_value}', f'setid={setid}')
+
+def write_set(typed_df, store_root):
+    """
+    Writes one set's typed table without its all-null columns, so each file only carries
+    the composition columns that set actually has. Returns the file's Arrow schema.
+    """
+    set_df = typed_df.dropna(axis=1, how='all')
+    property_value = typed_df['property'].iloc[0]
+    setid = typed_df['setid'].iloc[0]
+    set_df = set_df.drop(columns=[col for col in PARTITION_COLUMNS if col in set_df.columns])
+    # Metadata is written as plain strings, Parquet dictionary-encodes it on disk
+    set_df = set_df.astype({col: object for col in CATEGORICAL_COLUMNS if col in set_df.columns})
+    table = pa.Table.from_pandas(set_df, preserve_index=False)
+    partition_dir = set_partition_dir(store_root, property_value, setid)
+    os.makedirs(partition_dir, exist_ok=True)
+    pq.write_table(table, os.path.join(partition_dir, 'part-0.parquet'))
+    return table.schema
+
+def merge_schemas(schemas, previous=None):
+    """Unions per-set schemas; a column that is numeric in one set and text in another becomes text."""
+    fields = {}
+    for schema in ([previous] if previous is not None else []) + list(schemas):
+        for field in schema:
+            known = fields.get(field.name)
+            if known is None or pa.types.is_null(known.type):
+                fields[field.name] = field
+            elif known.type != field.type and not pa.types.is_null(field.type):
+                fields[field.name] = pa.field(field.name, pa.string())
+    partition_fields = [pa.field(col, pa.string()) for col in PARTITION_COLUMNS]
+    return pa.schema([field for name, field in fields.items() if name not in PARTITION_COLUMNS] + partition_fields)
+
+def _write_dataset_schema(store_root, schemas):
+    schema_path = os.path.join(store_root, '_common_metadata')
+    previous = pq.read_schema(schema_path) if os.path.exists(schema_path) else None
+    pq.write_metadata(merge_schemas(schemas, previous), schema_path)
+
+def write_store(df, store_root, property_name=None):
+    """
+    Writes a measurement table (e.g. the density_dataN.csv shards) to a Parquet dataset
+    partitioned by property and setid, typing each set separately.
+    """
+    _require_pyarrow()
+    schemas = []
+    for _, set_df in df.groupby('setid', sort=False):
+        schemas.append(write_set(to_typed_frame(set_df.reset_index(drop=True), property_name), store_root))
+    _write_dataset_schema(store_root, schemas)
+    return len(schemas)
+
+def csv_files_to_store(csv_paths, store_root, property_name=None):
+    """Loads converted per-set CSV files (e.g. density_csv_data/*.csv) into the store one set at a time."""
+    _require_pyarrow()
+    schemas = []
+    for path in tqdm(csv_paths, desc=f"Writing {store_root}"):
+        try:
+            df = pd.read_csv(path, dtype=str)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            logging.error(f"Error reading {path}: {e}")
+            continue
+        for _, set_df in df.groupby('setid', sort=False):
+            schemas.append(write_set(to_typed_frame(set_df.reset_index(drop=True), property_name), store_root))
+    _write_dataset_schema(store_root, schemas)
+    return len(schemas)
+
+def csv_dir_to_store(csv_dir, store_root, property_name=None):
+    """Loads every CSV in a *_csv_data directory into the store."""
+    csv_paths = [os.path.join(csv_dir, f) for f in sorted(os.listdir(csv_dir)) if f.endswith('.csv')]
+    return csv_files_to_store(csv_paths, store_root, property_name)
+
+def read_store(store_root, columns=None, filters=None):
+    """
+    Reads the store with column projection and predicate pushdown, e.g.
+    read_store('store', ['setid', 'Temperature, K'], [('property', '=', 'Density')]).
+    Metadata columns come back as categoricals.
+    """
+    _require_pyarrow()
+    schema = pq.read_schema(os.path.join(store_root, '_common_metadata'))
+    dataset = ds.dataset(store_root, schema=schema, format='parquet', partitioning='hive',
+                         exclude_invalid_files=False, ignore_prefixes=['_', '.'])
+    expression = pq.filters_to_expression(filters) if filters else None
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    for col in CATEGORICAL_COLUMNS + PARTITION_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
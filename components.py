@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import time
+import logging
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+import metrics
+from main_functions import iter_json_sets, list_json_files
+from value_parser import parse_values
+
+FORMULA_TAGS = re.compile(r'</?SUB>')
+ELEMENT_PATTERN = re.compile(r'([A-Z][a-z]?)(\d*)')
+
+# Columns before the element counts; every other column of a component table is an element
+TABLE_COLUMNS = ['id', 'name', 'formula', 'molar_mass', 'n_sets']
+
+# Sets handed to a worker at a time
+CHUNK_SIZE = 256
+
+def plain_formula(formula):
+    """'C<SUB>8</SUB>H<SUB>9</SUB>N' -> 'C8H9N'."""
+    return FORMULA_TAGS.sub('', formula or '').strip()
+
+def parse_formula(formula):
+    """Element counts of a formula with or without SUB tags, e.g. {'C': 8, 'H': 9, 'N': 1}; None if it is not element symbols and counts."""
+    text = plain_formula(formula)
+    counts = {}
+    position = 0
+    for match in ELEMENT_PATTERN.finditer(text):
+        if match.start() != position:
+            return None
+        counts[match.group(1)] = counts.get(match.group(1), 0) + int(match.group(2) or 1)
+        position = match.end()
+    return counts if text and position == len(text) else None
+
+def hill_order(elements):
+    """Carbon, then hydrogen, then the other elements alphabetically, as formulas are written."""
+    return sorted(elements, key=lambda element: (element != 'C', element != 'H', element))
+
+def extract_chunk(args):
+    """
+    Reads one chunk of sets and returns ({compound id: Counter of (name, mw, formula)}, sets read).
+    Each set counts once per compound.
+    """
+    json_files, data_dir = args
+    found = {}
+    for _, full_data in iter_json_sets(json_files, data_dir=data_dir):
+        for component in {c.get('idout'): c for c in full_data.get('components') or [] if c.get('idout')}.values():
+            variant = (component.get('name') or '', component.get('mw') or '', component.get('formula') or '')
+            found.setdefault(component['idout'], Counter())[variant] += 1
+    return found, len(json_files)
+
+def extract_components(json_dirs, processes=None, chunk_size=CHUNK_SIZE):
+    """
+    Scans the set JSONs of json_dirs (directories or json_pack packs) on all cores and returns
+    {compound id: Counter of (name, mw, formula)}, counting the sets that list each variant.
+    """
+    # Listed once per directory: a pack's index or a large folder is not cheap to list
+    files = {json_dir: list_json_files(json_dir) for json_dir in json_dirs}
+    chunks = [(names[i:i + chunk_size], json_dir) for json_dir, names in files.items() for i in range(0, len(names), chunk_size)]
+    n_files = sum(len(files) for files, _ in chunks)
+    components = {}
+    with metrics.stage('components', files=n_files) as record, \
+            Pool(processes or cpu_count()) as pool, \
+            tqdm(total=n_files, desc=f"Extracting components from {', '.join(json_dirs)}") as progress:
+        for found, n_sets in pool.imap_unordered(extract_chunk, chunks):
+            for compound_id, variants in found.items():
+                components.setdefault(compound_id, Counter()).update(variants)
+            progress.update(n_sets)
+        record['rows'] = len(components)
+    return components
+
+def component_table(components):
+    """
+    The deduplicated compound table: id, name, formula (without tags), molar_mass (float64),
+    n_sets and one int32 column per element in Hill order. An id listed with different names
+    or formulas keeps the variant most sets use.
+    """
+    rows, element_counts = [], []
+    for compound_id in sorted(components):
+        variants = components[compound_id]
+        (name, mw, formula), _ = variants.most_common(1)[0]
+        if len(variants) > 1:
+            logging.info(f"{compound_id} has {len(variants)} variants, keeping {name!r}")
+        counts = parse_formula(formula)
+        if counts is None:
+            logging.error(f"Cannot parse the formula {formula!r} of {compound_id}")
+        rows.append((compound_id, name, plain_formula(formula), mw, sum(variants.values())))
+        element_counts.append(counts or {})
+    table = pd.DataFrame(rows, columns=TABLE_COLUMNS)
+    table['molar_mass'] = parse_values(table['molar_mass'].tolist())
+    elements = hill_order({element for counts in element_counts for element in counts})
+    counts = np.zeros((len(rows), len(elements)), dtype='int32')
+    column_of = {element: i for i, element in enumerate(elements)}
+    for i, element_count in enumerate(element_counts):
+        for element, n in element_count.items():
+            counts[i, column_of[element]] = n
+    return pd.concat([table, pd.DataFrame(counts, columns=elements)], axis=1)
+
+def write_component_table(json_dirs, output_csv, processes=None):
+    """Extracts the compounds of json_dirs and writes their table to output_csv. Returns the table."""
+    table = component_table(extract_components(json_dirs, processes))
+    table.to_csv(output_csv, index=False)
+    return table
+
+def load_component_table(path):
+    """Reads a component table back with its types: text ids/names/formulas, float64 molar mass, integer counts."""
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {'id': str, 'name': str, 'formula': str, 'molar_mass': 'float64', 'n_sets': 'int64'}
+    dtypes.update({col: 'int32' for col in header if col not in TABLE_COLUMNS})
+    return pd.read_csv(path, dtype=dtypes, keep_default_na=False, na_values={'molar_mass': ['']})
+
+if __name__ == "__main__":
+    # e.g. python components.py density_json_data refindex_json_data meltingtemp_json_data
+    json_dirs = sys.argv[1:] or ['density_json_data', 'refindex_json_data', 'meltingtemp_json_data']
+    timings = {}
+    for processes in sorted({1, cpu_count()}):
+        start = time.perf_counter()
+        table = write_component_table(json_dirs, 'compounds-components.csv', processes)
+        timings[processes] = time.perf_counter() - start
+    print(f"{len(table)} compounds, {len(table.columns) - len(TABLE_COLUMNS)} elements -> compounds-components.csv")
+    print(', '.join(f"{processes} process(es): {seconds:.2f} s" for processes, seconds in timings.items()))
+    if os.path.exists('compounds.csv'):
+        known = pd.read_csv('compounds.csv', dtype=str)
+        id_column = 'id' if 'id' in known.columns else 'compound id'
+        print(f"{table['id'].isin(known[id_column]).sum()} of them are in compounds.csv, "
+              f"{(~table['id'].isin(known[id_column])).sum()} only in the set JSONs")
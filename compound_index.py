@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# One index per compounds CSV path, built on first use and shared by every caller in the process
+_indexes = {}
+
+COMPOUND_SLOTS = (1, 2, 3)
+
+def load_compound_index(compounds_csv_path='compounds.csv'):
+    """
+    Loads the compounds CSV once and returns a DataFrame indexed by compound id with
+    'name' and 'smiles' columns. Accepts either 'id' or 'compound id' as the key column.
+    """
+    index = _indexes.get(compounds_csv_path)
+    if index is not None:
+        return index
+    df = pd.read_csv(compounds_csv_path, dtype=str)
+    id_column = 'id' if 'id' in df.columns else 'compound id'
+    for col in ('name', 'smiles'):
+        if col not in df.columns:
+            df[col] = None
+    # Keep the first row per id, which is what the old .loc[...].values[0] lookups returned
+    index = df.drop_duplicates(id_column).set_index(id_column)[['name', 'smiles']]
+    _indexes[compounds_csv_path] = index
+    return index
+
+def clear_compound_index():
+    """Drops the cached indexes, e.g. after compounds.csv has been regenerated."""
+    _indexes.clear()
+
+def _lookup(compound_ids, column, compounds_csv_path):
+    index = load_compound_index(compounds_csv_path)
+    if isinstance(getattr(compound_ids, 'dtype', None), pd.CategoricalDtype):
+        return _lookup_categorical(compound_ids, index[column])
+    ids = pd.Series(compound_ids, dtype=object)
+    values = ids.map(index[column])
+    return values.astype(object).where(values.notna(), None)
+
+def _lookup_categorical(compound_ids, mapping):
+    """Looks up each distinct id once and returns a categorical Series; unknown ids give NaN."""
+    per_category = pd.Series(compound_ids.cat.categories, dtype=object).map(mapping)
+    value_codes, values = pd.factorize(per_category)
+    # Code -1 (missing id) picks the appended -1, i.e. a missing value
+    codes = np.append(value_codes, -1)[compound_ids.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, values), index=compound_ids.index)
+
+def lookup_smiles(compound_ids, compounds_csv_path='compounds.csv'):
+    """Returns a Series of SMILES strings (None when unknown) aligned with compound_ids; categorical ids give a categorical Series."""
+    return _lookup(compound_ids, 'smiles', compounds_csv_path)
+
+def lookup_names(compound_ids, compounds_csv_path='compounds.csv'):
+    """Returns a Series of compound names (None when unknown) aligned with compound_ids."""
+    return _lookup(compound_ids, 'name', compounds_csv_path)
+
+def add_smiles_columns(df, compounds_csv_path='compounds.csv'):
+    """Fills 'smile N' from 'compound id N' for every compound slot present in df, in place."""
+    for slot in COMPOUND_SLOTS:
+        id_column = f'compound id {slot}'
+        if id_column in df.columns:
+            df[f'smile {slot}'] = lookup_smiles(df[id_column], compounds_csv_path).values
+    return df
@@ -0,0 +1,185 @@
+import os
+import sys
+import csv
+import time
+from collections import OrderedDict
+import pandas as pd
+import json_backend
+from columnar_store import UNCERTAINTY_SUFFIX
+from idset_catalog import load_snapshot, rows_by_setid
+from json_pack import is_pack, open_pack
+from value_parser import parse_value_column
+
+def set_table(full_data):
+    """
+    The measurements of one set JSON as a DataFrame: one float64 column per dhead column, plus
+    '<column> uncertainty' for the columns that give one. Cells that are not numbers are NaN.
+    """
+    names = [item[0] for item in full_data.get('dhead', [])]
+    columns = list(zip(*full_data.get('data', []))) or [()] * len(names)
+    table = {}
+    for name, cells in zip(names, columns):
+        values, uncertainties = parse_value_column(cells)
+        table[name] = values
+        if (uncertainties == uncertainties).any():
+            table[name + UNCERTAINTY_SUFFIX] = uncertainties
+    return pd.DataFrame(table)
+
+def csv_set_table(csv_path):
+    """set_table for a per-set CSV written by json_to_csv: the columns between setid and the metadata."""
+    with open(csv_path, 'r', newline='') as cf:
+        reader = csv.reader(cf)
+        header = next(reader, [])
+        rows = list(reader)
+    end = header.index('reference') if 'reference' in header else len(header)
+    names = header[1:end]
+    columns = list(zip(*rows)) or [()] * len(header)
+    return pd.DataFrame({name: parse_value_column(cells)[0] for name, cells in zip(names, columns[1:end])})
+
+class ILThermoDataset:
+    """
+    Lazy view of one property's sets. The setids and their idset metadata are read up front
+    (idset JSON, else metadata CSV, else the file names); a set's measurements are parsed only
+    when it is accessed, and the cache_size most recently used tables are kept in an LRU cache.
+    Sets are read from json_dir (a directory or a json_pack pack) or, without one, from csv_dir.
+
+        density = ILThermoDataset.for_property('density')
+        density.info('TOrQb')['ref'], density['TOrQb']['Temperature, K'].max()
+    """
+
+    def __init__(self, json_dir=None, csv_dir=None, idset_path=None, metadata_csv=None, cache_size=256):
+        self.json_dir = json_dir if json_dir and os.path.exists(json_dir) else None
+        self.csv_dir = csv_dir if csv_dir and os.path.isdir(csv_dir) else None
+        self.idset_path = idset_path
+        self.metadata_csv = metadata_csv
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+        self._files = None
+        self._rows = self._load_rows()
+
+    @classmethod
+    def for_property(cls, name, cache_size=256):
+        """The dataset at the pipeline's paths of a property, by code ('JkYu') or file name ('density')."""
+        from pipeline import PROPERTIES, property_spec
+
+        code = next((code for code, spec in PROPERTIES.items() if name in (spec['filename'], spec['idset'])), name)
+        spec = property_spec(code)
+        # Without the pipeline's CSVs, fall back on the checked-in ones
+        csv_dir = spec['csv_dir'] if os.path.isdir(spec['csv_dir']) else f"{spec['filename']}_csv_data"
+        return cls(spec['json_dir'], csv_dir, spec['idset_path'], spec['metadata_csv'], cache_size)
+
+    def _load_rows(self):
+        """{setid: metadata row}, without touching the measurements."""
+        if self.idset_path and os.path.exists(self.idset_path):
+            return rows_by_setid(load_snapshot(self.idset_path))
+        if self.metadata_csv and os.path.exists(self.metadata_csv):
+            with open(self.metadata_csv, 'r', newline='') as cf:
+                return {row['setid']: row for row in csv.DictReader(cf)}
+        return {setid: {'setid': setid} for setid in self._set_files()}
+
+    def _set_files(self):
+        """{setid: file path} of the downloaded sets, listed on first use (names only)."""
+        if self._files is None:
+            if self.json_dir and is_pack(self.json_dir):
+                self._files = {setid: None for setid in open_pack(self.json_dir)}
+            else:
+                folder, extension = (self.json_dir, '.json') if self.json_dir else (self.csv_dir, '.csv')
+                names = os.listdir(folder) if folder else []
+                self._files = {name[:-len(extension)][-5:]: os.path.join(folder, name)
+                               for name in sorted(names) if name.endswith(extension)}
+        return self._files
+
+    @property
+    def setids(self):
+        """The setids of the property, in idset order, including sets that are not downloaded."""
+        return list(self._rows)
+
+    def available(self):
+        """The setids whose measurements are on disk."""
+        files = self._set_files()
+        return [setid for setid in self._rows if setid in files]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __contains__(self, setid):
+        return setid in self._rows
+
+    def info(self, setid):
+        """The metadata row of a set (reference, property, phases, compounds, point count for an idset)."""
+        return self._rows[setid]
+
+    def metadata(self):
+        """All metadata rows as a DataFrame indexed by setid."""
+        return pd.DataFrame.from_dict(self._rows, orient='index').drop(columns='setid', errors='ignore')
+
+    def _parse(self, setid):
+        files = self._set_files()
+        if setid not in files:
+            raise KeyError(f"set {setid} is not on disk")
+        if self.json_dir and is_pack(self.json_dir):
+            return set_table(open_pack(self.json_dir).get(setid))
+        if self.json_dir:
+            return set_table(json_backend.load_file(files[setid]))
+        return csv_set_table(files[setid])
+
+    def __getitem__(self, setid):
+        """
+        The measurements of a set (see set_table), parsed on first access and then served from the
+        cache. Each call returns a copy, so changing it does not change what later calls get.
+        """
+        table = self._cache.get(setid)
+        if table is not None:
+            self._cache.move_to_end(setid)
+            self.stats['hits'] += 1
+            return table.copy()
+        self.stats['misses'] += 1
+        table = self._parse(setid)
+        if self.cache_size > 0:
+            self._cache[setid] = table
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return table.copy()
+        return table
+
+    def get(self, setid, default=None):
+        try:
+            return self[setid]
+        except KeyError:
+            return default
+
+    def iter_sets(self, setids=None):
+        """Yields (setid, table) for setids (default: every available set) without filling the cache."""
+        for setid in self.available() if setids is None else setids:
+            yield setid, self._cache[setid].copy() if setid in self._cache else self._parse(setid)
+
+    def cache_info(self):
+        return {**self.stats, 'size': len(self._cache), 'maxsize': self.cache_size}
+
+    def clear_cache(self):
+        self._cache.clear()
+
+if __name__ == "__main__":
+    # e.g. python dataset.py density: time to the first sets, lazily and with a full load
+    name = sys.argv[1] if len(sys.argv) > 1 else 'density'
+    start = time.perf_counter()
+    dataset = ILThermoDataset.for_property(name)
+    opened = time.perf_counter() - start
+    sample = dataset.available()[:10]
+    start = time.perf_counter()
+    for setid in sample:
+        dataset[setid]
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for setid in sample:
+        dataset[setid]
+    cached = time.perf_counter() - start
+    print(f"{name}: {len(dataset)} setids, {len(dataset.available())} on disk; opened in {opened:.3f} s")
+    print(f"10 sets: {first * 1000:.1f} ms parsed, {cached * 1000:.2f} ms cached ({dataset.cache_info()})")
+    start = time.perf_counter()
+    n_rows = sum(len(table) for _, table in dataset.iter_sets())
+    print(f"parsing every set instead: {time.perf_counter() - start:.2f} s ({n_rows} rows)")
@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import logging
+import metrics
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from compound_index import add_smiles_columns
+
+# Text columns that are read and written as strings on both sides of the join
+METADATA_DTYPES = {
+    'setid': str,
+    'reference': str,
+    'property': str,
+    'phases': str,
+    'compound id 1': str,
+    'compound id 2': str,
+    'compound id 3': str,
+    'compound name 1': str,
+    'compound name 2': str,
+    'compound name 3': str
+}
+
+# Text columns that repeat for every row of a set and are dictionary-encoded in compact tables
+SMILES_COLUMNS = ['smile 1', 'smile 2', 'smile 3']
+
+def categorical_dtypes(dtype_dict):
+    """The dtype_dict with its string columns read as categories, so each distinct value is stored once."""
+    return {col: 'category' if dtype is str else dtype for col, dtype in dtype_dict.items()}
+
+def downcast_floats(df):
+    """
+    Stores the float64 columns of df as float32 where every value prints the same at float32
+    precision, so the CSV written afterwards does not change. Other columns are kept, in place.
+    """
+    for col in df.columns:
+        if df[col].dtype != np.float64:
+            continue
+        values = df[col].to_numpy()
+        compact = values.astype(np.float32)
+        if np.array_equal(compact.astype(str).astype(np.float64), values, equal_nan=True):
+            df[col] = compact
+    return df
+
+def unify_categories(frames):
+    """Gives the categorical columns of frames the same categories, so pd.concat keeps them categorical."""
+    columns = {col for frame in frames for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)}
+    for col in columns:
+        parts = [frame[col] for frame in frames if col in frame.columns]
+        if not all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            continue
+        categories = union_categoricals(parts).categories
+        for frame in frames:
+            if col in frame.columns:
+                frame[col] = frame[col].cat.set_categories(categories)
+    return frames
+
+def compact_measurements(df, text_columns=None):
+    """
+    Dictionary-encodes the repeated text columns of a measurement table (metadata and SMILES by
+    default) and downcasts its float columns where that is lossless. Returns df, changed in place.
+    """
+    text_columns = text_columns or list(METADATA_DTYPES) + SMILES_COLUMNS
+    for col in text_columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return downcast_floats(df)
+
+def read_measurements(paths, dtype_dict=METADATA_DTYPES, compact=True):
+    """
+    Reads measurement CSVs (density_data1.csv, ...) into one table keyed by (path, row). With
+    compact=True the text columns of dtype_dict are parsed straight into categories and the
+    float columns are downcast, instead of holding one Python string per cell.
+    """
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path, dtype=categorical_dtypes(dtype_dict) if compact else dtype_dict)
+        frames.append(compact_measurements(df) if compact else df)
+    if not frames:
+        return pd.DataFrame()
+    if compact:
+        unify_categories(frames)
+    return pd.concat(frames, keys=list(paths), names=['shard', None])
+
+def load_setid_metadata(output_csv_path, dtype_dict=METADATA_DTYPES):
+    """Reads a setid metadata table (density_output.csv, refindex_output.csv, ...) indexed by setid."""
+    output_df = pd.read_csv(output_csv_path, dtype=dtype_dict)
+    return output_df.drop_duplicates('setid', keep='last').set_index('setid')
+
+def enrich_with_metadata(measurements, metadata):
+    """
+    Overwrites the metadata columns of a measurement table with the values of its setid
+    in one aligned assignment. Rows whose setid has no metadata are left untouched.
+    """
+    columns = [col for col in metadata.columns if col in measurements.columns]
+    if not columns:
+        return measurements
+    matched = measurements['setid'].isin(metadata.index).to_numpy()
+    aligned = metadata[columns].reindex(measurements['setid'][matched])
+    for col in columns:
+        values = aligned[col]
+        categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        if categorical and matched.all():
+            # Compact tables: only the codes are aligned, the strings stay in the categories
+            measurements[col] = values.array
+            continue
+        values = values.astype(object).where(values.notna(), None).to_numpy()
+        if matched.all():
+            measurements[col] = values
+        else:
+            measurements[col] = measurements[col].astype(object)
+            measurements.loc[matched, col] = values
+            if categorical:
+                measurements[col] = measurements[col].astype('category')
+    return measurements
+
+def enrich_shards(output_csv_path, shard_paths, dtype_dict=METADATA_DTYPES, compounds_csv_path='compounds.csv', compact=True):
+    """
+    Joins the setid metadata onto every measurement shard (density_data1.csv, ...) at once,
+    fills the SMILES columns and writes each shard back with its own columns. With compact=True
+    the join runs on dictionary-encoded text columns; the CSVs written are the same.
+    """
+    with metrics.stage('enrich', files=len(shard_paths)) as record:
+        _enrich_shards(output_csv_path, shard_paths, dtype_dict, compounds_csv_path, compact, record)
+
+def _enrich_shards(output_csv_path, shard_paths, dtype_dict, compounds_csv_path, compact, record):
+    metadata = load_setid_metadata(output_csv_path, dtype_dict)
+    if compact:
+        metadata = compact_measurements(metadata, list(dtype_dict))
+    columns = {path: list(pd.read_csv(path, nrows=0).columns) for path in shard_paths}
+    if not shard_paths:
+        return
+    combined = read_measurements(shard_paths, dtype_dict, compact)
+    record['bytes_read'] += sum(os.path.getsize(path) for path in shard_paths)
+    enrich_with_metadata(combined, metadata)
+
+    try:
+        add_smiles_columns(combined, compounds_csv_path)
+    except Exception as m:
+        logging.error(f'{m}')
+        record['errors'] += 1
+    record['rows'] = len(combined)
+
+    for path in shard_paths:
+        shard_columns = columns[path] + [col for col in combined.columns
+                                         if col.startswith('smile ') and col not in columns[path]
+                                         and f'compound id {col[6:]}' in columns[path]]
+        combined.loc[path, shard_columns].to_csv(path, index=False)
+        record['bytes_written'] += os.path.getsize(path)
+
+def memory_benchmark(paths, dtype_dict=METADATA_DTYPES, compounds_csv_path='compounds.csv'):
+    """
+    Reads the measurement CSVs in paths and fills their SMILES columns, once with string columns
+    and once compact, and prints the table size (deep memory_usage) and the time of each.
+    """
+    results = {}
+    for mode, compact in (('strings', False), ('compact', True)):
+        start = time.perf_counter()
+        df = read_measurements(paths, dtype_dict, compact)
+        add_smiles_columns(df, compounds_csv_path)
+        seconds = time.perf_counter() - start
+        results[mode] = {'rows': len(df), 'table_mb': df.memory_usage(deep=True).sum() / (1024 * 1024), 'seconds': seconds}
+        del df
+        print(f"{mode:>8}: {results[mode]['rows']} rows, table {results[mode]['table_mb']:.1f} MB, {seconds:.2f} s")
+    return results
+
+if __name__ == "__main__":
+    # e.g. python enrichment.py density_data1.csv
+    memory_benchmark(sys.argv[1:] or ['density_data1.csv'])
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import tempfile
+
+CACHE_DIR = '.http_cache'
+
+# How each request was answered: 304 from the server, 200 with the cached bytes, 200 with new bytes, first download
+OUTCOMES = ('not_modified', 'unchanged', 'changed', 'new')
+
+def hit_ratio(stats):
+    """Share of requests answered with the cached body, by a 304 or by an identical 200."""
+    return (stats['not_modified'] + stats['unchanged']) / stats['requests'] if stats['requests'] else 0.0
+
+class HttpCache:
+    """
+    On-disk cache of GET responses keyed by URL. Each entry keeps the validators (ETag,
+    Last-Modified, SHA-256 of the body) and the body, either in the cache or, for responses
+    the caller saves anyway, in the caller's file. Safe to share between fetch threads.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, **{outcome: 0 for outcome in OUTCOMES}, 'bytes_downloaded': 0, 'bytes_from_cache': 0}
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        folder = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(folder, f'{key}.json'), os.path.join(folder, f'{key}.body')
+
+    def lookup(self, url, body_path=None):
+        """
+        Returns (entry, body) of a cached URL, or (None, None). With body_path the body is that
+        file; it is returned without an entry when the file no longer matches the validators.
+        """
+        entry_path, cached_path = self._paths(url)
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        try:
+            with open(body_path or cached_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None, None
+        if entry is not None and hashlib.sha256(body).hexdigest() != entry.get('sha256'):
+            # A torn write or an edited file, its validators no longer apply
+            entry = None
+        if entry is None and body_path is None:
+            return None, None
+        return entry, body
+
+    def _write(self, path, data):
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(path + suffix, 'wb') as f:
+            f.write(data)
+        os.replace(path + suffix, path)
+
+    def store(self, url, headers, body, body_path=None):
+        """Records the validators of url. Without body_path the body is kept in the cache as well."""
+        entry_path, cached_path = self._paths(url)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        entry = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified'),
+                 'sha256': hashlib.sha256(body).hexdigest(), 'size': len(body), 'stored': time.time()}
+        if body_path is None:
+            self._write(cached_path, body)
+        elif os.path.exists(cached_path):
+            # Left over from before the body lived in the caller's file
+            os.remove(cached_path)
+        self._write(entry_path, json.dumps(entry).encode('utf-8'))
+
+    def evict(self, url):
+        """Drops the cache entry of url, e.g. when its body turned out to be unusable."""
+        for path in self._paths(url):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, session, url, timeout=60, body_path=None, encode=None):
+        """
+        GETs url through the cache and returns (body, outcome). A cached URL is revalidated
+        with If-None-Match / If-Modified-Since when it has validators; a server that ignores
+        them answers 200, and the body's hash then tells whether it changed.
+        encode(raw) turns a downloaded body into the bytes that are kept. With body_path those
+        bytes are saved there instead of in the cache, and only when they are new or changed.
+        """
+        entry, cached = self.lookup(url, body_path)
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            outcome, body, downloaded = 'not_modified', cached, 0
+        else:
+            response.raise_for_status()
+            downloaded = len(response.content)
+            body = encode(response.content) if encode is not None else response.content
+            if cached is None:
+                outcome = 'new'
+            elif body == cached:
+                outcome = 'unchanged'
+            else:
+                outcome = 'changed'
+            if body_path is not None and outcome != 'unchanged':
+                self._write(body_path, body)
+            if outcome != 'unchanged' or entry is None or entry.get('etag') != response.headers.get('ETag') \
+                    or entry.get('last_modified') != response.headers.get('Last-Modified'):
+                self.store(url, response.headers, body, body_path)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats[outcome] += 1
+            self.stats['bytes_downloaded'] += downloaded
+            self.stats['bytes_from_cache'] += len(body) if outcome == 'not_modified' else 0
+        return body, outcome
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+def stats_since(cache, before):
+    """The cache counters accumulated since before (a snapshot()), with the hit ratio."""
+    stats = {key: value - before.get(key, 0) for key, value in cache.snapshot().items()}
+    stats['hit_ratio'] = hit_ratio(stats)
+    return stats
+
+def fetch(session, url, timeout=60, cache=None):
+    """GETs url and returns the body bytes, through cache when one is given. Raises on HTTP errors."""
+    if cache is not None:
+        return cache.get(session, url, timeout)[0]
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+_default_cache = None
+
+def default_cache():
+    """The process-wide cache in .http_cache, created on first use."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HttpCache()
+    return _default_cache
+
+if __name__ == "__main__":
+    # e.g. python http_cache.py refindex_json_data 20: a cold and a warm refresh of the folder's first sets from ILThermo
+    from install_all_jsons import fetch_and_save_data_concurrent
+
+    json_dir = sys.argv[1] if len(sys.argv) > 1 else 'refindex_json_data'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    setids = sorted(name[:-len('.json')].split('_')[-1] for name in os.listdir(json_dir) if name.endswith('.json'))[:count]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = HttpCache(os.path.join(tmp, 'cache'))
+        for run in ('cold', 'warm'):
+            summary = fetch_and_save_data_concurrent('set', setids, os.path.join(tmp, 'sets'), cache=cache)
+            stats = summary['cache']
+            print(f"{run}: {summary['seconds']:.2f} s, hit ratio {stats['hit_ratio']:.0%}, "
+                  f"{stats['bytes_downloaded'] / (1024 * 1024):.2f} MB transferred, {summary['bytes'] / (1024 * 1024):.2f} MB written")
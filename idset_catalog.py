@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import hashlib
+
+HISTORY_DIR = os.path.join('idsets', 'history')
+
+# Idset fields whose change means the set's data itself changed, so its JSON is downloaded again;
+# changes to the other fields (reference, compound names) only need the metadata rebuilt
+DATA_FIELDS = ('prp', 'phases', 'cmp1', 'cmp2', 'cmp3', 'np')
+
+def idset_path(property_name):
+    """The current idset of a property, e.g. idsets/density-idset.json."""
+    return os.path.join('idsets', f'{property_name}-idset.json')
+
+def history_dir(property_name):
+    return os.path.join(HISTORY_DIR, property_name)
+
+def _snapshot_order(filename):
+    # 20240101T000000Z.json, then 20240101T000000Z-1.json for a second snapshot within the same second
+    stamp, _, n = filename[:-len('.json')].partition('-')
+    return stamp, int(n or 0)
+
+def list_snapshots(property_name):
+    """The snapshot paths of a property, oldest first."""
+    folder = history_dir(property_name)
+    if not os.path.isdir(folder):
+        return []
+    names = sorted((f for f in os.listdir(folder) if f.endswith('.json')), key=_snapshot_order)
+    return [os.path.join(folder, f) for f in names]
+
+def catalog():
+    """{property name: snapshot paths, oldest first} for every property with a history."""
+    if not os.path.isdir(HISTORY_DIR):
+        return {}
+    return {name: list_snapshots(name) for name in sorted(os.listdir(HISTORY_DIR))}
+
+def _digest(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_snapshot(path):
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+def save_snapshot(property_name, data, timestamp=None):
+    """
+    Stores an idset response as idsets/history/<property_name>/<UTC timestamp>.json and as the
+    current idsets/<property_name>-idset.json. A response identical to the latest snapshot is
+    not stored again. Returns the path of the snapshot that holds data.
+    """
+    snapshots = list_snapshots(property_name)
+    if snapshots and _digest(load_snapshot(snapshots[-1])) == _digest(data):
+        path = snapshots[-1]
+    else:
+        stamp = timestamp or time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        path = os.path.join(history_dir(property_name), f'{stamp}.json')
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(history_dir(property_name), f'{stamp}-{n}.json')
+            n += 1
+        os.makedirs(history_dir(property_name), exist_ok=True)
+        with open(path, 'w') as json_file:
+            json.dump(data, json_file)
+    with open(idset_path(property_name), 'w') as json_file:
+        json.dump(data, json_file)
+    return path
+
+def ensure_baseline(property_name):
+    """Adopts an idset downloaded before the catalog existed as the first snapshot, so the next refresh has something to diff against."""
+    if not list_snapshots(property_name) and os.path.exists(idset_path(property_name)):
+        stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(os.path.getmtime(idset_path(property_name))))
+        save_snapshot(property_name, load_snapshot(idset_path(property_name)), stamp)
+
+def rows_by_setid(data):
+    """{setid: {field: value}} of an idset response, keyed by its header."""
+    header = data.get('header') or ['setid', 'ref', 'prp', 'phases', 'cmp1', 'cmp2', 'cmp3', 'np', 'nm1', 'nm2', 'nm3']
+    return {row[0]: dict(zip(header, row)) for row in data.get('res', [])}
+
+def diff_idsets(old, new):
+    """
+    Compares two idset responses. Returns added and removed setids, changed setids with the
+    fields that differ ({setid: [fields]}), and refetch: the changed setids whose data fields changed.
+    """
+    old_rows, new_rows = rows_by_setid(old), rows_by_setid(new)
+    changed = {}
+    for setid in new_rows.keys() & old_rows.keys():
+        fields = [field for field in new_rows[setid] if new_rows[setid][field] != old_rows[setid].get(field)]
+        if fields:
+            changed[setid] = fields
+    return {
+        'added': sorted(new_rows.keys() - old_rows.keys()),
+        'removed': sorted(old_rows.keys() - new_rows.keys()),
+        'changed': dict(sorted(changed.items())),
+        'refetch': sorted(setid for setid, fields in changed.items() if any(field in DATA_FIELDS for field in fields)),
+    }
+
+def diff_latest(property_name):
+    """The diff between the last two snapshots of a property; everything counts as added when there is only one."""
+    snapshots = list_snapshots(property_name)
+    if not snapshots:
+        return None
+    old = load_snapshot(snapshots[-2]) if len(snapshots) > 1 else {}
+    return diff_idsets(old, load_snapshot(snapshots[-1]))
+
+def summarize(delta):
+    return (f"{len(delta['added'])} added, {len(delta['removed'])} removed, {len(delta['changed'])} changed "
+            f"({len(delta['refetch'])} to refetch)")
+
+if __name__ == "__main__":
+    # e.g. python idset_catalog.py density
+    for name in sys.argv[1:] or list(catalog()):
+        delta = diff_latest(name)
+        print(f"{name}: {len(list_snapshots(name))} snapshots" + (f", last refresh: {summarize(delta)}" if delta else ""))
@@ -1,6 +1,14 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
+import time
+import hashlib
+import threading
+import metrics
+import idset_catalog
+import http_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 """ 
 prop_name |prop_id | length | 
@@ -16,46 +24,59 @@ meltingtemp = ['melting-temperature','NmYB']
 url_for_get_all = 'https://ilthermo.boulder.nist.gov/ILT2/ilsearch?cmp=&ncmp=0&year=&auth=&keyw=&prp=' # +query
 url_data_for_setid = 'https://ilthermo.boulder.nist.gov/ILT2/ilset?set=' # +setid
 # urlden json file saxlayir 
-def get_setid_list(list): # e.g input -> dens = []
+def get_setid_list(list, cache=None): # e.g input -> dens = []
+    """
+    Downloads the idset of a property, keeps it as a new snapshot in the idset catalog and
+    returns its diff against the previous snapshot (None if the download failed).
+    With cache (an http_cache.HttpCache) an unchanged idset is revalidated, not downloaded.
+    """
     url = f"{url_for_get_all}{list[1]}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        with open(f'idsets/{list[0]}-idset.json', 'w') as json_file:
-            json.dump(data, json_file)
+    try:
+        with make_session(1) as session:
+            try:
+                data = json.loads(http_cache.fetch(session, url, cache=cache))
+            except ValueError:
+                if cache is None:
+                    raise
+                # A cached body that is not JSON (e.g. an error page served with 200), download it again
+                cache.evict(url)
+                data = json.loads(http_cache.fetch(session, url, cache=cache))
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to retrieve data: {e}")
+        return None
+    except ValueError as e:
+        if cache is not None:
+            # Not kept for the next run to revalidate
+            cache.evict(url)
+        print(f"Failed to parse data: {e}")
+        return None
     else:
-        print(f"Failed to retrieve data: {response.status_code}")
+        idset_catalog.ensure_baseline(list[0])
+        previous = idset_catalog.list_snapshots(list[0])
+        old = idset_catalog.load_snapshot(previous[-1]) if previous else {}
+        idset_catalog.save_snapshot(list[0], data)
+        delta = idset_catalog.diff_idsets(old, data)
+        print(f"{list[0]}: {idset_catalog.summarize(delta)}")
+        return delta
 
 
-get_setid_list(refindex)
-
 density_setids = []
 refindex_setids = []
 meltingtemp_setids = []
 
 def read_idsets_and_combine():
-    for filename in os.listdir('idsets'):
-        if filename == 'density-idset.json':
-            with open(os.path.join('idsets', filename), 'r') as json_file:
-                data = json.load(json_file)
-                for i in range(len(data['res'])):
-                    x = data['res'][i][0]
-                    density_setids.append(x)
-
-        if filename == 'refracrive-index-idset.json':
-            with open(os.path.join('idsets', filename), 'r') as json_file:
-                data = json.load(json_file)
-                for i in range(len(data['res'])):
-                    x = data['res'][i][0]
-                    refindex_setids.append(x)
-
-        if filename == 'melting-temperature-idset.json':
-            with open(os.path.join('idsets', filename), 'r') as json_file:
-                data = json.load(json_file)
-                for i in range(len(data['res'])):
-                    x = data['res'][i][0]
-                    meltingtemp_setids.append(x)
-
+    """
+    Reads the setids of every idsets/<name>-idset.json into {name: setids}. The lists of the
+    three known properties are refilled, not appended to, so calling it again is harmless.
+    """
+    setids = {}
+    for filename in sorted(os.listdir('idsets')):
+        if filename.endswith('-idset.json'):
+            name = filename[:-len('-idset.json')]
+            setids[name] = read_idset_setids(name)
+    for name, target in ((dens[0], density_setids), (refindex[0], refindex_setids), (meltingtemp[0], meltingtemp_setids)):
+        target[:] = setids.get(name, [])
+    return setids
 
 if not os.path.exists('idsets'):
     os.makedirs('idsets')
@@ -70,25 +91,239 @@ def get_folder_size(folder):
             total_size += os.path.getsize(fp)
     return total_size
 
-def fetch_and_save_data(filename,setids, folder_name, start_index=0):
+def fetch_and_save_data(filename,setids, folder_name, start_index=0, cache=None):
     if not os.path.exists(folder_name):
         os.makedirs(folder_name)
     
-    total = len(setids)
-    for setid in tqdm(setids[start_index:], desc=f"Downloading {folder_name} data", unit="file"):
-        url = f"{url_data_for_setid}{setid}"
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            with open(f'{folder_name}/{filename}_setid_{setid}.json', 'w') as json_file:
-                json.dump(data, json_file)
-            folder_size = get_folder_size(folder_name)
-            tqdm.write(f"Current {folder_name} folder size: {folder_size / (1024 * 1024):.2f} MB for {setid}")
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to retrieve data for setid {setid}: {e}")
+    folder_size = get_folder_size(folder_name)
+    with make_session(1) as session:
+        for setid in tqdm(setids[start_index:], desc=f"Downloading {folder_name} data", unit="file"):
+            path = f'{folder_name}/{filename}_setid_{setid}.json'
+            try:
+                save_set(session, setid, path, cache=cache)
+                folder_size += os.path.getsize(path)
+                tqdm.write(f"Current {folder_name} folder size: {folder_size / (1024 * 1024):.2f} MB for {setid}")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Failed to retrieve data for setid {setid}: {e}")
+
+def make_session(max_workers=8):
+    """Creates a requests session whose keep-alive pool holds one connection per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def encode_set(body):
+    """A set's JSON re-encoded the way the fetchers save it."""
+    return json.dumps(json.loads(body)).encode('utf-8')
+
+def fetch_setid(session, setid, base_url=url_data_for_setid, timeout=60, cache=None):
+    """Downloads one set and returns its JSON re-encoded the way fetch_and_save_data writes it."""
+    return encode_set(http_cache.fetch(session, f"{base_url}{setid}", timeout, cache))
+
+def save_set(session, setid, path, base_url=url_data_for_setid, timeout=60, cache=None):
+    """
+    Downloads one set to path and returns (body, bytes written). Through a cache the saved file
+    is the cached body, so an unchanged set is not rewritten and keeps its mtime.
+    """
+    if cache is None:
+        body = fetch_setid(session, setid, base_url, timeout)
+        with open(path, 'wb') as json_file:
+            json_file.write(body)
+        return body, len(body)
+    body, outcome = cache.get(session, f"{base_url}{setid}", timeout, body_path=path, encode=encode_set)
+    return body, len(body) if outcome in ('new', 'changed') else 0
+
+def fetch_and_save_data_concurrent(filename, setids, folder_name, max_workers=8, base_url=url_data_for_setid, timeout=60, on_result=None, cache=None):
+    """
+    Downloads setids with at most max_workers requests in flight over pooled keep-alive
+    connections. Returns a summary with the failed setids and the download throughput.
+    on_result(setid, body, error) is called from the calling thread as each set finishes.
+    With cache (an http_cache.HttpCache) the sets are revalidated, unchanged files are not
+    rewritten, and the summary reports the cache counters and hit ratio.
+    """
+    if not os.path.exists(folder_name):
+        os.makedirs(folder_name)
+
+    with metrics.stage('fetch') as record:
+        summary = _fetch_concurrent(filename, setids, folder_name, max_workers, base_url, timeout, on_result, cache)
+        record.update(files=summary['files'], bytes_written=summary['bytes'], errors=len(summary['failed']),
+                      bytes_read=summary['cache']['bytes_downloaded'] if cache is not None else summary['bytes'])
+    return summary
+
+def _fetch_concurrent(filename, setids, folder_name, max_workers, base_url, timeout, on_result, cache):
+    session = make_session(max_workers)
+    lock = threading.Lock()
+    written = 0
+    failed = []
+    start = time.perf_counter()
+
+    before = cache.snapshot() if cache is not None else None
+
+    def download(setid):
+        nonlocal written
+        # Leaving an unchanged file alone keeps its mtime, so convert_incremental does not rehash it
+        body, size = save_set(session, setid, f'{folder_name}/{filename}_setid_{setid}.json', base_url, timeout, cache)
+        with lock:
+            written += size
+        return body
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download, setid): setid for setid in setids}
+            with tqdm(total=len(futures), desc=f"Downloading {folder_name} data", unit="file") as bar:
+                for future in as_completed(futures):
+                    setid = futures[future]
+                    body, error = None, None
+                    try:
+                        body = future.result()
+                    except (requests.exceptions.RequestException, ValueError, OSError) as e:
+                        error = e
+                        failed.append(setid)
+                        tqdm.write(f"Failed to retrieve data for setid {setid}: {e}")
+                    if on_result is not None:
+                        on_result(setid, body, error)
+                    elapsed = time.perf_counter() - start
+                    bar.set_postfix(MB=f"{written / (1024 * 1024):.2f}", MBps=f"{written / (1024 * 1024) / elapsed:.2f}")
+                    bar.update(1)
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - start
+    files = len(setids) - len(failed)
+    summary = {
+        'files': files,
+        'failed': failed,
+        'bytes': written,
+        'seconds': elapsed,
+        'files_per_s': files / elapsed if elapsed else 0.0,
+        'mb_per_s': written / (1024 * 1024) / elapsed if elapsed else 0.0,
+    }
+    tqdm.write(f"Downloaded {files} {folder_name} files ({written / (1024 * 1024):.2f} MB) in {elapsed:.1f}s: "
+               f"{summary['files_per_s']:.1f} files/s, {summary['mb_per_s']:.2f} MB/s, {len(failed)} failed")
+    if cache is not None:
+        summary['cache'] = http_cache.stats_since(cache, before)
+        tqdm.write(f"HTTP cache: {summary['cache']['hit_ratio']:.0%} hits ({summary['cache']['not_modified']} not modified, "
+                   f"{summary['cache']['unchanged']} unchanged), {summary['cache']['bytes_downloaded'] / (1024 * 1024):.2f} MB transferred")
+    return summary
+
+def manifest_path(folder_name):
+    """Returns the path of the fetch manifest kept next to a download folder."""
+    return f'{folder_name.rstrip("/")}-manifest.json'
+
+def load_manifest(path):
+    """Loads a fetch manifest mapping setid -> {status, size, sha256, error}."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError) as e:
+        print(f"Could not read manifest {path}, starting a new one: {e}")
+        return {}
+
+def save_manifest(path, manifest):
+    """Writes the manifest atomically so an interrupted run never leaves it truncated."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(manifest, json_file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def read_idset_setids(property_name):
+    """Returns the setids listed in idsets/<property_name>-idset.json, in file order."""
+    with open(os.path.join('idsets', f'{property_name}-idset.json'), 'r') as json_file:
+        data = json.load(json_file)
+    return [row[0] for row in data['res']]
+
+def manifest_entry(body, status='ok', error=None):
+    """Builds a manifest record; size and sha256 describe the bytes written to disk."""
+    entry = {'status': status, 'size': None, 'sha256': None, 'error': None}
+    if body is not None:
+        entry['size'] = len(body)
+        entry['sha256'] = hashlib.sha256(body).hexdigest()
+    if error is not None:
+        entry['error'] = str(error)
+    return entry
+
+def plan_fetch(filename, setids, folder_name, manifest):
+    """
+    Splits setids into (todo, skipped). Completed sets whose file is still on disk with
+    the recorded size are skipped; failed, missing and newly listed setids are fetched.
+    Files downloaded before the manifest existed are adopted into it instead of refetched.
+    """
+    todo, skipped = [], []
+    for setid in setids:
+        path = f'{folder_name}/{filename}_setid_{setid}.json'
+        entry = manifest.get(setid)
+        on_disk = os.path.exists(path)
+        if entry is None and on_disk:
+            with open(path, 'rb') as json_file:
+                entry = manifest[setid] = manifest_entry(json_file.read())
+        if entry is not None and entry['status'] == 'ok' and on_disk and os.path.getsize(path) == entry['size']:
+            skipped.append(setid)
+        else:
+            todo.append(setid)
+    return todo, skipped
+
+def remove_sets(filename, setids, folder_name, manifest):
+    """Deletes the files and manifest entries of setids that are no longer listed. Returns how many files were removed."""
+    removed = 0
+    for setid in setids:
+        path = f'{folder_name}/{filename}_setid_{setid}.json'
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+        manifest.pop(setid, None)
+    return removed
+
+def sync_sets(property_name, filename, folder_name, max_workers=8, base_url=url_data_for_setid, timeout=60, save_every=100, delta=None, cache=None):
+    """
+    Brings folder_name up to date with idsets/<property_name>-idset.json using the fetch
+    manifest: only failed, missing and new setids are downloaded. Replaces start_index.
+    With delta (an idset_catalog diff, as returned by get_setid_list) the sets whose data
+    fields changed are downloaded again and the files of removed sets are deleted.
+    cache (an http_cache.HttpCache) is passed on to fetch_and_save_data_concurrent.
+    """
+    path = manifest_path(folder_name)
+    manifest = load_manifest(path)
+    if delta:
+        removed = remove_sets(filename, delta['removed'], folder_name, manifest)
+        for setid in delta['refetch']:
+            # A stale entry is never skipped, even when its old file is still on disk
+            manifest[setid] = {**manifest.get(setid, manifest_entry(None)), 'status': 'stale'}
+        print(f"{property_name}: removed {removed} unlisted sets, {len(delta['refetch'])} marked for refetch")
+    setids = read_idset_setids(property_name)
+    todo, skipped = plan_fetch(filename, setids, folder_name, manifest)
+    retried = sum(1 for setid in todo if setid in manifest)
+    print(f"{property_name}: {len(setids)} listed, {len(skipped)} up to date, "
+          f"{retried} to retry, {len(todo) - retried} new")
+    save_manifest(path, manifest)
+    if not todo:
+        return {'files': 0, 'failed': [], 'skipped': len(skipped)}
+
+    done = 0
+
+    def record(setid, body, error):
+        nonlocal done
+        manifest[setid] = manifest_entry(body, 'failed' if error else 'ok', error)
+        done += 1
+        if done % save_every == 0:
+            save_manifest(path, manifest)
+
+    try:
+        summary = fetch_and_save_data_concurrent(filename, todo, folder_name, max_workers, base_url, timeout, on_result=record, cache=cache)
+    finally:
+        save_manifest(path, manifest)
+    summary['skipped'] = len(skipped)
+    return summary
 
-#read_idsets_and_combine()
 filenames = ['density','refindex','meltingtemp']
-#fetch_and_save_data(filenames[0],density_setids, 'density_data', start_index=1610)
-#fetch_and_save_data(filenames[2],meltingtemp_setids, 'meltingtemp_data')
\ No newline at end of file
+
+if __name__ == "__main__":
+    get_setid_list(refindex)
+    #read_idsets_and_combine()
+    #fetch_and_save_data(filenames[0],density_setids, 'density_data', start_index=1610)
+    #fetch_and_save_data_concurrent(filenames[0], density_setids, 'density_data', max_workers=16)
+    #sync_sets(dens[0], filenames[0], 'density_json_data', max_workers=16)
+    #fetch_and_save_data(filenames[2],meltingtemp_setids, 'meltingtemp_data')
@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import metrics
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used without it
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # optional, stdlib json is used without it
+    ujson = None
+
+# Decoders that take the raw bytes of a file, fastest first; only installed ones are listed
+BACKENDS = {}
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+if ujson is not None:
+    BACKENDS['ujson'] = ujson.loads
+BACKENDS['json'] = json.loads
+
+_backend = next(iter(BACKENDS))
+
+def set_backend(name):
+    """Selects the decoder used by loads/load_file ('orjson', 'ujson' or 'json')."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend {name!r} is not installed, available: {', '.join(BACKENDS)}")
+    _backend = name
+
+# ILTHERMO_JSON_BACKEND=json forces a backend, otherwise the fastest installed one is used; an
+# unknown or missing backend fails here instead of on every file
+if os.environ.get('ILTHERMO_JSON_BACKEND'):
+    set_backend(os.environ['ILTHERMO_JSON_BACKEND'])
+
+def get_backend():
+    return _backend
+
+def loads(data):
+    """Decodes JSON bytes or text with the selected backend."""
+    return BACKENDS[_backend](data)
+
+def load_file(path):
+    """Reads and decodes a JSON file in one read with the selected backend."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    metrics.add(bytes_read=len(data))
+    return BACKENDS[_backend](data)
+
+def benchmark(json_dir='density_json_data', backends=None):
+    """Decodes every file of json_dir with each backend and prints files/s and MB/s."""
+    paths = sorted(os.path.join(json_dir, f) for f in os.listdir(json_dir) if f.endswith('.json'))
+    # Read the files once up front so the timings measure decoding only
+    blobs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            blobs.append(f.read())
+    total_mb = sum(len(blob) for blob in blobs) / (1024 * 1024)
+    print(f"{json_dir}: {len(blobs)} files, {total_mb:.1f} MB")
+    results = {}
+    for name in backends or BACKENDS:
+        decode = BACKENDS[name]
+        start = time.perf_counter()
+        for blob in blobs:
+            decode(blob)
+        elapsed = time.perf_counter() - start
+        results[name] = {'seconds': elapsed, 'files_per_s': len(blobs) / elapsed, 'mb_per_s': total_mb / elapsed}
+        print(f"{name:>8}: {elapsed:.2f} s, {len(blobs) / elapsed:.0f} files/s, {total_mb / elapsed:.1f} MB/s")
+    return results
+
+if __name__ == "__main__":
+    # e.g. python json_backend.py density_json_data refindex_json_data
+    for json_dir in sys.argv[1:] or ['density_json_data']:
+        benchmark(json_dir)
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import mmap
+import json_backend
+from tqdm import tqdm
+
+# Open readers, one per pack path, shared by every caller in the process
+_readers = {}
+
+def pack_path_for(json_dir):
+    """The pack of a *_json_data directory: density_json_data -> density_json_data.jsonl."""
+    return f'{json_dir.rstrip("/")}.jsonl'
+
+def index_path_for(pack_path):
+    """The setid -> [offset, length, file name] index kept next to a pack."""
+    return f'{pack_path}.idx.json'
+
+def set_id_of(json_file):
+    """The setid of a set file name, e.g. density_setid_AAIuX.json -> AAIuX."""
+    return os.path.splitext(os.path.basename(json_file))[0].split('_')[-1]
+
+def load_index(pack_path):
+    index_path = index_path_for(pack_path)
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, 'r') as f:
+        return json.load(f)
+
+def save_index(pack_path, index):
+    index_path = index_path_for(pack_path)
+    with open(f'{index_path}.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(f'{index_path}.tmp', index_path)
+
+def _record(body):
+    """One JSON Lines record: the set's JSON on a single line."""
+    body = body.strip()
+    if b'\n' in body:
+        body = json.dumps(json.loads(body)).encode('utf-8')
+    return body + b'\n'
+
+def pack_dir(json_dir, pack_path=None):
+    """
+    Appends the sets of json_dir to a JSON Lines pack. Sets already packed with identical
+    content are skipped; a changed set is appended again and the index points at the new
+    record. Sets whose files are gone from json_dir are dropped from the index (their old
+    records stay in the pack file but are no longer read). Returns the number of records appended.
+    """
+    pack_path = pack_path or pack_path_for(json_dir)
+    index = load_index(pack_path)
+    clear_pack_readers()
+    json_files = sorted(f for f in os.listdir(json_dir) if f.endswith('.json'))
+    listed = {set_id_of(json_file) for json_file in json_files}
+    removed = [setid for setid in index if setid not in listed]
+    for setid in removed:
+        del index[setid]
+    if removed:
+        tqdm.write(f"Dropped {len(removed)} sets that are no longer in {json_dir} from {pack_path}")
+    appended = 0
+    with open(pack_path, 'ab+') as pack:
+        packed = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ) if pack.seek(0, os.SEEK_END) else None
+        try:
+            for json_file in tqdm(json_files, desc=f"Packing {json_dir}"):
+                with open(os.path.join(json_dir, json_file), 'rb') as f:
+                    record = _record(f.read())
+                setid = set_id_of(json_file)
+                entry = index.get(setid)
+                if entry is not None and packed is not None and entry[1] == len(record) - 1 \
+                        and packed[entry[0]:entry[0] + entry[1]] == record[:-1]:
+                    continue
+                offset = pack.seek(0, os.SEEK_END)
+                pack.write(record)
+                index[setid] = [offset, len(record) - 1, json_file]
+                appended += 1
+        finally:
+            if packed is not None:
+                packed.close()
+    save_index(pack_path, index)
+    return appended
+
+class PackReader:
+    """Random access to the sets of a pack through a read-only memory map."""
+
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self.index = load_index(pack_path)
+        self._file = open(pack_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __contains__(self, setid):
+        return setid in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        """Setids in pack order, so a full pass reads the file front to back."""
+        return iter(sorted(self.index, key=lambda setid: self.index[setid][0]))
+
+    def raw(self, setid):
+        """The JSON bytes of one set, sliced from the map without reading other records."""
+        offset, length, _ = self.index[setid]
+        return self._map[offset:offset + length]
+
+    def get(self, setid):
+        return json_backend.loads(self.raw(setid))
+
+    def file_names(self):
+        """The original file names in pack order, for the converters that take json_files."""
+        return [self.index[setid][2] for setid in self]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_pack(path):
+    return os.path.isfile(path) and os.path.exists(index_path_for(path))
+
+def open_pack(pack_path):
+    """Returns the shared reader of a pack, opening it on first use."""
+    reader = _readers.get(pack_path)
+    if reader is None:
+        reader = _readers[pack_path] = PackReader(pack_path)
+    return reader
+
+def clear_pack_readers():
+    """Closes the shared readers, e.g. before a pack is appended to."""
+    for reader in _readers.values():
+        reader.close()
+    _readers.clear()
+
+if __name__ == "__main__":
+    # e.g. python json_pack.py density_json_data refindex_json_data meltingtemp_json_data
+    for json_dir in sys.argv[1:] or ['density_json_data', 'refindex_json_data', 'meltingtemp_json_data']:
+        print(f"{json_dir}: appended {pack_dir(json_dir)} sets to {pack_path_for(json_dir)}")
@@ -1,14 +1,17 @@
 import json
 import csv
 import os
+import hashlib
+import json_backend
+import metrics
+from columnar_store import csv_dir_to_store
 
 # Function to convert JSON to CSV
 def json_to_csv(json_file, csv_file, additional_data):
     all_data = []
     headers = None
     
-    with open(json_file, 'r') as jf:
-        data = json.load(jf)
+    data = json_backend.load_file(json_file)
     
     # Extracting the relevant data from the JSON structure
     if 'data' in data and isinstance(data['data'], list):
@@ -37,6 +40,7 @@ def json_to_csv(json_file, csv_file, additional_data):
         writer = csv.writer(cf)
         writer.writerow(headers)
         writer.writerows(all_data)
+    metrics.add(files=1, rows=len(all_data), bytes_written=os.path.getsize(csv_file))
 
 # Load additional data from output.csv
 def load_additional_data(csv_file):
@@ -52,16 +56,117 @@ def load_additional_data(csv_file):
                     additional_data[key][setid] = value
     return additional_data
 
-# Process each JSON file in the density_data folder and save to a separate CSV file
-density_data_folder = 'meltingtemp_json_data'
-output_folder = 'meltingtemp_csv_data'
-additional_data_file = '/home/narmak/Desktop/ilthermo/meltpoint-output.csv'
+def set_id_of(json_file):
+    """The setid json_to_csv writes for a file: the last five characters of its name."""
+    return os.path.basename(json_file)[-10:-5]
 
-os.makedirs(output_folder, exist_ok=True)
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-additional_data = load_additional_data(additional_data_file)
+def metadata_row_digest(additional_data, setid):
+    """Digest of the metadata columns json_to_csv appends for one setid."""
+    row = [[col, additional_data[col].get(setid, '')] for col in additional_data]
+    return hashlib.sha256(json.dumps(row).encode('utf-8')).hexdigest()
 
-json_files = [os.path.join(density_data_folder, filename) for filename in os.listdir(density_data_folder) if filename.endswith('.json')]
-for json_file in json_files:
-    output_csv_file = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(json_file))[0]}.csv")
-    json_to_csv(json_file, output_csv_file, additional_data)
+def state_path_for(output_folder):
+    """The per-set digest file kept next to a CSV folder."""
+    return f'{output_folder.rstrip("/")}-state.json'
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r') as f:
+        return json.load(f)
+
+def save_state(state_path, state):
+    with open(f'{state_path}.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(f'{state_path}.tmp', state_path)
+
+def convert_incremental(json_folder, output_folder, additional_data_file, state_path=None):
+    """
+    Reconverts only the sets whose JSON or metadata row changed since the last run and removes
+    the CSVs of sets whose JSON is gone. A JSON whose mtime and size are unchanged is not
+    re-hashed. The per-set digests are kept in <output_folder>-state.json.
+    Returns (changed setids, removed setids).
+    """
+    state_path = state_path or state_path_for(output_folder)
+    state = load_state(state_path)
+    os.makedirs(output_folder, exist_ok=True)
+    additional_data = load_additional_data(additional_data_file)
+
+    with metrics.stage('convert'):
+        changed, removed = _convert_changed(json_folder, output_folder, additional_data, state)
+    save_state(state_path, state)
+    return changed, removed
+
+def _convert_changed(json_folder, output_folder, additional_data, state):
+    changed, seen = [], set()
+    json_files = sorted(f for f in os.listdir(json_folder) if f.endswith('.json'))
+    for filename in json_files:
+        json_file = os.path.join(json_folder, filename)
+        csv_file = os.path.join(output_folder, f'{os.path.splitext(filename)[0]}.csv')
+        setid = set_id_of(json_file)
+        seen.add(setid)
+        stat = os.stat(json_file)
+        entry = state.get(setid, {})
+        if entry.get('mtime') == stat.st_mtime and entry.get('size') == stat.st_size:
+            json_digest = entry['sha256']
+        else:
+            json_digest = file_sha256(json_file)
+        metadata_digest = metadata_row_digest(additional_data, setid)
+        if entry.get('sha256') != json_digest or entry.get('metadata') != metadata_digest or not os.path.exists(csv_file):
+            json_to_csv(json_file, csv_file, additional_data)
+            changed.append(setid)
+        state[setid] = {'csv': os.path.basename(csv_file), 'mtime': stat.st_mtime, 'size': stat.st_size,
+                        'sha256': json_digest, 'metadata': metadata_digest}
+
+    removed = [setid for setid in state if setid not in seen]
+    for setid in removed:
+        csv_file = os.path.join(output_folder, state.pop(setid)['csv'])
+        if os.path.exists(csv_file):
+            os.remove(csv_file)
+    return changed, removed
+
+def patch_merged_csv(merged_file, output_folder, changed, removed, state_path=None):
+    """
+    Updates a merged CSV without rebuilding it: rows of changed and removed sets are dropped
+    and the changed sets' rows are appended in the merged file's columns.
+    """
+    state = load_state(state_path or state_path_for(output_folder))
+    stale = set(changed) | set(removed)
+    tmp_file = f'{merged_file}.tmp'
+    with open(merged_file, 'r', newline='') as mf, open(tmp_file, 'w', newline='') as tf:
+        reader = csv.reader(mf)
+        writer = csv.writer(tf)
+        headers = next(reader)
+        writer.writerow(headers)
+        setid_index = headers.index('setid')
+        writer.writerows(row for row in reader if row[setid_index] not in stale)
+        for setid in changed:
+            with open(os.path.join(output_folder, state[setid]['csv']), 'r', newline='') as cf:
+                writer.writerows([row.get(col, '') for col in headers] for row in csv.DictReader(cf))
+    os.replace(tmp_file, merged_file)
+
+if __name__ == "__main__":
+    # Process each JSON file in the density_data folder and save to a separate CSV file
+    density_data_folder = 'meltingtemp_json_data'
+    output_folder = 'meltingtemp_csv_data'
+    additional_data_file = 'meltpoint-output.csv'
+    # Set to e.g. 'ilthermo_store' to also write the converted sets to the typed Parquet store
+    store_root = None
+    # Merged table that is patched with the reconverted sets, if it has been built already
+    merged_file = 'meltingtemp-data.csv'
+
+    # Only sets whose JSON or metadata row changed since the last run are reconverted
+    changed, removed = convert_incremental(density_data_folder, output_folder, additional_data_file)
+    print(f"Reconverted {len(changed)} sets, removed {len(removed)}")
+    if os.path.exists(merged_file) and (changed or removed):
+        patch_merged_csv(merged_file, output_folder, changed, removed)
+
+    if store_root:
+        csv_dir_to_store(output_folder, store_root, 'Normal melting temperature')
@@ -5,10 +5,47 @@ from tqdm import tqdm
 import logging
 from multiprocessing import Pool, cpu_count
 import csv
+import re
+import gc
+from contextlib import contextmanager
+from itertools import islice
+import json_backend
+import metrics
+from json_pack import is_pack, open_pack
+from compound_index import lookup_smiles
+from enrichment import METADATA_DTYPES, enrich_shards, read_measurements
+from columnar_store import csv_files_to_store
+from schema_registry import SchemaRegistry, convert_group, signature_of
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
+# Define all required columns
+REQUIRED_COLUMNS = [
+    'setid', 
+    'Temperature, K',
+    'Pressure, kPa', 
+    'Specific density, kg/m³',
+    'reference',
+    'property',
+    'phases',
+    'compound id 1',
+    'compound name 1',
+    'smile 1',
+    'compound id 2', 
+    'compound name 2',
+    'smile 2',
+    'compound id 3',
+    'compound name 3',
+    'smile 3'
+]
+
+# Columns reduced to their bare float value
+NUMERIC_COLUMNS = ['Temperature, K', 'Pressure, kPa']
+
+# Raw ILThermo column names that are renamed in the output
+COLUMN_RENAMES = {'Specific density, kg/m<SUP>3</SUP>': 'Specific density, kg/m³'}
+
 def read_density_id_set(column=None):
     """Reads the density ID set JSON file and optionally extracts a specific column."""
     try:
@@ -24,14 +61,15 @@ def read_density_id_set(column=None):
 def read_json_file(filepath, column=None):
     """Reads a JSON file from a given filepath and optionally extracts a specific column."""
     try:
-        with open(filepath, 'r') as file:
-            data = json.load(file)
-        if column:
-            return [item.get(column, None) for item in data]
-        return data
-    except Exception as e:
+        data = json_backend.load_file(filepath)
+    except (OSError, ValueError) as e:
+        # A missing, unreadable or malformed file; anything else (a broken backend) is raised
         logging.error(f"Error reading JSON file {filepath}: {e}")
+        metrics.add(errors=1)
         return {}
+    if column:
+        return [item.get(column, None) for item in data]
+    return data
         
 def clean_numeric_value(value):
     """Clean numeric values by extracting only the number."""
@@ -58,196 +96,361 @@ def clean_temperature_value(value):
 
 def get_smiles_for_compound_ids(compound_ids, compounds_csv_path):
     """Get SMILES strings for a list of compound IDs using the compounds CSV file."""
-    df_smiles = pd.read_csv(compounds_csv_path)
-    smiles_list = []
-    for compound_id in compound_ids:
-        smile = df_smiles.loc[df_smiles['id'] == compound_id, 'smiles']
-        if not smile.empty:
-            smiles_list.append(smile.values[0])
-        else:
-            smiles_list.append(None)
-    return smiles_list
+    return lookup_smiles(compound_ids, compounds_csv_path).tolist()
 
-def process_json_files_to_csv(json_files, output_file, column_mappings, valid_set_ids=None, smiles_mapping=None):
+def process_json_files_to_csv(json_files, output_file, column_mappings, valid_set_ids=None, smiles_mapping=None,
+                              data_dir='density_data'):
     """Processes a list of JSON files, merges their data, and saves to a CSV file."""
-    merged_data = []
-    merged_header = None
-
-    # Define all required columns
-    required_columns = [
-        'setid', 
-        'Temperature, K',
-        'Pressure, kPa', 
-        'Specific density, kg/m³',
-        'reference',
-        'property',
-        'phases',
-        'compound id 1',
-        'compound name 1',
-        'smile 1',
-        'compound id 2', 
-        'compound name 2',
-        'smile 2',
-        'compound id 3',
-        'compound name 3',
-        'smile 3'
-    ]
-
-    for json_file in tqdm(json_files, desc=f"Processing JSON files for {output_file}"):
+    rows = iter_cleaned_rows(tqdm(json_files, desc=f"Processing JSON files for {output_file}"),
+                             column_mappings, REQUIRED_COLUMNS, valid_set_ids, data_dir)
+    df_filtered = pd.DataFrame(list(rows), columns=REQUIRED_COLUMNS)
+    df_filtered = df_filtered.where(pd.notnull(df_filtered), None)
+    df_filtered.to_csv(output_file, index=False)
+
+def read_packed_set(pack_path, set_id):
+    """Reads one set from a json_pack pack, returning {} like read_json_file on errors."""
+    try:
+        return open_pack(pack_path).get(set_id)
+    except Exception as e:
+        logging.error(f"Error reading set {set_id} from {pack_path}: {e}")
+        metrics.add(errors=1)
+        return {}
+
+def list_json_files(data_dir):
+    """The set file names of a directory, or of a json_pack pack in pack order."""
+    if is_pack(data_dir):
+        return open_pack(data_dir).file_names()
+    return sorted(f for f in os.listdir(data_dir) if f.endswith('.json'))
+
+def iter_json_sets(json_files, valid_set_ids=None, data_dir='density_data', unreadable=None):
+    """
+    Yields (set_id, full_data) one file at a time, skipping setids not in valid_set_ids.
+    data_dir may also be a pack written by json_pack, e.g. 'density_json_data.jsonl'.
+    A set that cannot be read or decoded is yielded as {}; with unreadable (a dict) it is
+    also recorded there as {json_file: error} instead of being logged.
+    """
+    packed = is_pack(data_dir)
+    for json_file in json_files:
         set_id = os.path.splitext(json_file)[0].split('_')[-1]
-        
-        # Skip if setid is not in valid_setids
         if valid_set_ids and set_id not in valid_set_ids:
             continue
-            
-        full_data = read_json_file(os.path.join('density_data', json_file))
-        
-        header = ['setid'] + [column_mappings.get(item[0], item[0]) for item in full_data.get('dhead', [])]
-
-        data = []
-        for row in full_data.get('data', []):
-            cleaned_row = [set_id]
-            for val, item in zip(row, full_data.get('dhead', [])):
-                column_name = column_mappings.get(item[0], item[0])
-                if column_name == 'Temperature, K':
-                    cleaned_val = clean_temperature_value(val)
-                elif column_name == 'Pressure, kPa':
-                    cleaned_val = clean_temperature_value(val)
-                elif isinstance(val, list) and len(val) == 2:
-                    cleaned_val = f"{val[0]}±{val[1]}"
-                else:
-                    cleaned_val = val
-                cleaned_row.append(cleaned_val)
+        if unreadable is None:
+            yield set_id, read_packed_set(data_dir, set_id) if packed else read_json_file(os.path.join(data_dir, json_file))
+            continue
+        try:
+            full_data = open_pack(data_dir).get(set_id) if packed else json_backend.load_file(os.path.join(data_dir, json_file))
+        except Exception as e:
+            unreadable[json_file] = f'{type(e).__name__}: {e}'
+            full_data = {}
+        yield set_id, full_data
 
-            data.append(cleaned_row)
-        
-        if merged_header is None:
-            merged_header = header
-        else:
-            for col in header:
-                if col not in merged_header:
-                    merged_header.append(col)
-            
-            for row in data:
-                while len(row) < len(merged_header):
-                    row.append(None)
-
-        merged_data.extend(data)
-    
-    df_merged = pd.DataFrame(merged_data, columns=merged_header)
-    
-    # Clean numeric values for temperature and pressure
-
-    
-    # Rename the specific density column
-    df_merged.rename(columns={'Specific density, kg/m<SUP>3</SUP>': 'Specific density, kg/m³'}, inplace=True)
-    
-    # Add missing columns with None values
-    for col in required_columns:
-        if col not in df_merged.columns:
-            df_merged[col] = None
-    
-    # Ensure Temperature and Pressure columns are not null
-    df_merged['Temperature, K'] = df_merged['Temperature, K'].apply(lambda x: clean_numeric_value(x) if pd.notna(x) else None)
-    df_merged['Pressure, kPa'] = df_merged['Pressure, kPa'].apply(lambda x: clean_numeric_value(x) if pd.notna(x) else None)
-    
-    # Ensure all JSON files provide values for the specified four columns
-    for col in ['Temperature, K', 'Pressure, kPa', 'Specific density, kg/m³', 'reference']:
-        if col not in df_merged.columns:
-            df_merged[col] = None
-    
-    # Add SMILES columns based on compound IDs
- 
-    
-    # Keep only the required columns
-    df_filtered = df_merged[required_columns]
-    df_filtered = df_filtered.where(pd.notnull(df_filtered), None)
-    df_filtered.to_csv(output_file, index=False)
+def set_header(full_data, column_mappings):
+    """Returns the output column names of a set's dhead block."""
+    names = [column_mappings.get(item[0], item[0]) for item in full_data.get('dhead', [])]
+    return [COLUMN_RENAMES.get(name, name) for name in names]
 
-def update_density_csv_with_metadata(output_csv_path, density_data_csv_path):
+def new_schema_registry(column_mappings):
+    """A schema registry that maps and renames dhead columns the way set_header does."""
+    return SchemaRegistry(column_mappings, COLUMN_RENAMES, NUMERIC_COLUMNS)
+
+# The "dhead" key of a set file; its value is decoded on its own by read_dhead
+DHEAD_KEY = re.compile(rb'"dhead"\s*:\s*')
+
+# Bytes after the key decoded at first; a longer dhead is decoded from the rest of the file
+DHEAD_WINDOW = 4096
+
+_dhead_decoder = json.JSONDecoder()
+
+def read_dhead(json_file, data_dir='density_data'):
     """
-    Update density_data CSV files with reference and other metadata from output.csv,
-    matching by setid.
+    The dhead block of one set file, decoded from the raw bytes without parsing the rest of the
+    set. A key inside a string value would be escaped, so the first match is the set's own key.
+    Returns [] like read_json_file when the file cannot be read.
     """
     try:
-        # Read output.csv into a dictionary for faster lookups
-        output_df = pd.read_csv(output_csv_path)
-        output_dict = output_df.set_index('setid').to_dict('index')
-        
-        # Read the density data file with string dtypes for text columns
-        dtype_dict = {
-            'setid': str,
-            'reference': str,
-            'property': str,
-            'phases': str,
-            'compound id 1': str,
-            'compound id 1': str,
-            'compound id 2': str,
-            'compound id 3': str,
-            'compound name 1': str,
-            'compound name 2': str,
-            'compound name 3': str
-        }
-        density_df = pd.read_csv(density_data_csv_path, dtype=dtype_dict)
-        
-        # Update density data with metadata from output.csv
-        for index, row in density_df.iterrows():
-            set_id = row['setid']
-            if set_id in output_dict:
-                metadata = output_dict[set_id]
-                # Update each column with proper type handling
-                for col, value in metadata.items():
-                    if col in density_df.columns:
-                        if pd.isna(value):
-                            density_df.at[index, col] = None
-                        else:
-                            density_df.at[index, col] = str(value) if col in dtype_dict else value
-        
-        # Save updated density data
-
+        if is_pack(data_dir):
+            raw = open_pack(data_dir).raw(os.path.splitext(json_file)[0].split('_')[-1])
+        else:
+            with open(os.path.join(data_dir, json_file), 'rb') as f:
+                raw = f.read()
+        match = DHEAD_KEY.search(raw)
+        if match is None:
+            return []
         try:
-            df_smiles = pd.read_csv('compounds.csv')
-            compound_id_1 = density_df['compound id 1']
-            compound_id_2 = density_df['compound id 2']
-            compound_id_3 = density_df['compound id 3']
-
-            comp1smiles = []
-            for i in compound_id_1:
-                smile = df_smiles.loc[df_smiles['id'] == i, 'smiles']
-                if not smile.empty:
-                    comp1smiles.append(smile.values[0])
-                else:
-                    comp1smiles.append(None)
-            density_df['smile 1'] = comp1smiles
+            return _dhead_decoder.raw_decode(raw[match.end():match.end() + DHEAD_WINDOW].decode('utf-8', 'ignore'))[0]
+        except ValueError:
+            return _dhead_decoder.raw_decode(raw[match.end():].decode('utf-8'))[0]
+    except Exception as e:
+        logging.error(f"Error reading the dhead of {json_file}: {e}")
+        metrics.add(errors=1)
+        return []
 
+def scan_union_header(json_files, column_mappings, valid_set_ids=None, data_dir='density_data'):
+    """
+    First pass: the union of all dhead columns in first-seen order. Only the dhead block of
+    each set is decoded (read_dhead), and each distinct dhead is mapped once.
+    """
+    registry = new_schema_registry(column_mappings)
+    for json_file in json_files:
+        set_id = os.path.splitext(json_file)[0].split('_')[-1]
+        if valid_set_ids and set_id not in valid_set_ids:
+            continue
+        registry.header(signature_of({'dhead': read_dhead(json_file, data_dir)}))
+    return ['setid'] + [col for col in registry.union_header() if col != 'setid']
 
-            comp2smiles = []
-            for i in compound_id_2:
-                smile = df_smiles.loc[df_smiles['id'] == i, 'smiles']
-                if not smile.empty:
-                    comp2smiles.append(smile.values[0])
-                else:
-                    comp2smiles.append(None)
+# Sets read before their layout groups are converted; bounds the memory of the streaming passes
+BATCH_SIZE = 64
 
-            density_df['smile 2'] = comp2smiles
+def convert_batch(batch, registry, output_columns):
+    """
+    Converts a batch of (set_id, full_data) with one convert_group call per layout key.
+    Returns one row iterator per set, in batch order. output_columns is a tuple.
+    """
+    groups = {}
+    for i, (set_id, full_data) in enumerate(batch):
+        rows = full_data.get('data', [])
+        signature = signature_of(full_data)
+        # Rows shorter or longer than the dhead are cut to the narrowest, as zip(*rows) does
+        width = min(map(len, rows), default=0)
+        key, sources = registry.layout(signature[:width], output_columns)
+        groups.setdefault(key, []).append((i, (set_id, rows, sources)))
+    placed = [None] * len(batch)
+    for key, members in groups.items():
+        converted = convert_group(key, [member for _, member in members], output_columns, registry.numeric_columns)
+        for (i, _), rows in zip(members, converted):
+            placed[i] = rows
+    return placed
+
+@contextmanager
+def gc_paused():
+    """Pauses the cyclic garbage collector, which otherwise rescans every decoded set of a batch."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
-            comp3smiles = []
-            for i in compound_id_3:
-                smile = df_smiles.loc[df_smiles['id'] == i, 'smiles']
-                if not smile.empty:
-                    comp3smiles.append(smile.values[0])
+def iter_cleaned_sets(json_files, column_mappings, output_columns, valid_set_ids=None, data_dir='density_data',
+                      registry=None, batch_size=BATCH_SIZE, unreadable=None):
+    """
+    Yields the cleaned rows of each set (a list of rows laid out in output_columns). Sets are read
+    batch_size at a time and converted in bulk per layout through registry (a new one by default).
+    unreadable is passed on to iter_json_sets.
+    """
+    registry = registry or new_schema_registry(column_mappings)
+    output_columns = tuple(output_columns)
+    sets = iter_json_sets(json_files, valid_set_ids, data_dir, unreadable)
+    while True:
+        # Decoded JSON holds no reference cycles, so the collector has nothing to find in it
+        with gc_paused():
+            batch = list(islice(sets, batch_size))
+            converted = convert_batch(batch, registry, output_columns) if batch else None
+        if not batch:
+            break
+        for rows in converted:
+            yield list(rows)
+
+def iter_cleaned_rows(json_files, column_mappings, output_columns, valid_set_ids=None, data_dir='density_data',
+                      registry=None, batch_size=BATCH_SIZE):
+    """Second pass: yields cleaned rows laid out in output_columns, a batch of sets in memory at a time."""
+    for rows in iter_cleaned_sets(json_files, column_mappings, output_columns, valid_set_ids, data_dir,
+                                  registry, batch_size):
+        yield from rows
+
+def process_json_files_to_csv_streaming(json_files, output_file, column_mappings, valid_set_ids=None, all_columns=True, data_dir='density_data'):
+    """
+    Streaming version of process_json_files_to_csv: rows are written a set at a time as they
+    are cleaned, so memory stays flat no matter how many sets are processed. A first pass over the
+    dhead blocks computes the union header, and the columns of every set beyond the required ones
+    are written after them. all_columns=False writes the required columns only.
+    """
+    output_columns = list(REQUIRED_COLUMNS)
+    if all_columns:
+        union_header = scan_union_header(json_files, column_mappings, valid_set_ids, data_dir)
+        output_columns += [col for col in union_header if col not in output_columns]
+
+    with metrics.stage('convert', files=len(json_files)) as record:
+        sets = iter_cleaned_sets(tqdm(json_files, desc=f"Streaming JSON files to {output_file}"),
+                                 column_mappings, output_columns, valid_set_ids, data_dir)
+        with open(output_file, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file, lineterminator='\n')
+            writer.writerow(output_columns)
+            for rows in sets:
+                writer.writerows(rows)
+                record['rows'] += len(rows)
+        record['bytes_written'] = os.path.getsize(output_file)
+
+def set_sizes(json_files, data_dir='density_data'):
+    """{json_file: bytes} of the sets, from the file sizes or, for a json_pack pack, from its index."""
+    if is_pack(data_dir):
+        index = open_pack(data_dir).index
+        return {f: index[os.path.splitext(f)[0].split('_')[-1]][1] for f in json_files}
+    return {f: os.path.getsize(os.path.join(data_dir, f)) for f in json_files}
+
+def order_by_size(json_files, valid_set_ids=None, data_dir='density_data'):
+    """Returns the files to convert, largest first, so the big density sets do not end up last."""
+    scheduled = [f for f in json_files
+                 if not valid_set_ids or os.path.splitext(f)[0].split('_')[-1] in valid_set_ids]
+    sizes = set_sizes(scheduled, data_dir)
+    return sorted(scheduled, key=sizes.get, reverse=True)
+
+# Per-process state of the scheduled conversion workers, set by _init_shard_worker
+_worker = {}
+
+# Bytes of JSON handed to a worker at a time: enough small sets to share layouts, while the
+# largest sets still go out one by one, first
+CHUNK_BYTES = 256 * 1024
+
+def _init_shard_worker(shard_dir, column_mappings, data_dir):
+    _worker.update(shard_path=os.path.join(shard_dir, f'worker-{os.getpid()}.csv'),
+                   column_mappings=column_mappings, data_dir=data_dir,
+                   registry=new_schema_registry(column_mappings))
+
+def convert_to_worker_shard(json_files):
+    """
+    Appends the cleaned rows of a chunk of sets to this worker's shard, converting them in bulk.
+    Returns [(json_file, status, rows written or error)] with status 'ok', 'unreadable' (the file
+    could not be read or decoded, nothing written) or 'failed'. After a conversion error the chunk
+    is retried one set at a time, so only the failing sets are reported as failed.
+    """
+    unreadable = {}
+    try:
+        converted = list(iter_cleaned_sets(json_files, _worker['column_mappings'], REQUIRED_COLUMNS,
+                                           data_dir=_worker['data_dir'], registry=_worker['registry'],
+                                           batch_size=len(json_files), unreadable=unreadable))
+        new_shard = not os.path.exists(_worker['shard_path'])
+        with open(_worker['shard_path'], 'a', newline='') as csv_file:
+            writer = csv.writer(csv_file, lineterminator='\n')
+            if new_shard:
+                writer.writerow(REQUIRED_COLUMNS)
+            for rows in converted:
+                writer.writerows(rows)
+        return [(json_file, 'unreadable', unreadable[json_file]) if json_file in unreadable else (json_file, 'ok', len(rows))
+                for json_file, rows in zip(json_files, converted)]
+    except Exception as e:
+        if len(json_files) > 1:
+            return [result for json_file in json_files for result in convert_to_worker_shard([json_file])]
+        logging.error(f"Error converting {json_files[0]}: {e}")
+        return [(json_files[0], 'failed', f'{type(e).__name__}: {e}')]
+
+def chunk_by_size(scheduled, data_dir, chunk_bytes=CHUNK_BYTES):
+    """Splits the size-ordered files into chunks of about chunk_bytes; a large set makes a chunk on its own."""
+    sizes = set_sizes(scheduled, data_dir)
+    chunks, chunk, size = [], [], 0
+    for json_file in scheduled:
+        chunk.append(json_file)
+        size += sizes[json_file]
+        if size >= chunk_bytes:
+            chunks.append(chunk)
+            chunk, size = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def remove_numbered_outputs(output_prefix='density_data'):
+    """Removes <output_prefix>1.csv, <output_prefix>2.csv, ... left over from an earlier run."""
+    numbered = re.compile(re.escape(output_prefix) + r'\d+\.csv$')
+    for f in os.listdir('.'):
+        if numbered.match(f):
+            os.remove(f)
+
+def merge_worker_shards(shard_dir, output_prefix='density_data'):
+    """
+    Moves the worker shards to <output_prefix>1.csv, <output_prefix>2.csv, ... and removes
+    numbered outputs left over from earlier runs. Returns the output paths.
+    """
+    remove_numbered_outputs(output_prefix)
+    shard_paths = sorted(os.path.join(shard_dir, f) for f in os.listdir(shard_dir) if f.endswith('.csv'))
+    output_paths = []
+    for i, shard_path in enumerate(shard_paths, start=1):
+        output_path = f'{output_prefix}{i}.csv'
+        os.replace(shard_path, output_path)
+        output_paths.append(output_path)
+    os.rmdir(shard_dir)
+    return output_paths
+
+def convert_json_files_scheduled(json_files, column_mappings, valid_set_ids=None, data_dir='density_data',
+                                 output_prefix='density_data', processes=None):
+    """
+    Converts the sets on all cores: files are handed out in chunks of about CHUNK_BYTES,
+    largest first, and each worker converts a chunk in bulk and appends it to its own shard. Sets that fail in a worker are converted again
+    in this process before the shards are merged, so no set is lost. Files that cannot be read or
+    decoded are logged and counted as errors instead; they would fail the same way again.
+    """
+    with metrics.stage('convert') as record:
+        output_paths = _convert_scheduled(json_files, column_mappings, valid_set_ids, data_dir, output_prefix, processes, record)
+    return output_paths
+
+def _convert_scheduled(json_files, column_mappings, valid_set_ids, data_dir, output_prefix, processes, record):
+    scheduled = order_by_size(json_files, valid_set_ids, data_dir)
+    shard_dir = f'{output_prefix}_shards'
+    os.makedirs(shard_dir, exist_ok=True)
+    for f in os.listdir(shard_dir):
+        os.remove(os.path.join(shard_dir, f))
+    failed, total_rows = [], 0
+    with Pool(processes or cpu_count(), initializer=_init_shard_worker,
+              initargs=(shard_dir, column_mappings, data_dir)) as pool, \
+            tqdm(total=len(scheduled), desc=f"Converting {data_dir}") as progress:
+        for results in pool.imap_unordered(convert_to_worker_shard, chunk_by_size(scheduled, data_dir), chunksize=1):
+            for json_file, status, value in results:
+                if status == 'ok':
+                    total_rows += value
+                elif status == 'unreadable':
+                    # Reading the same bytes again would fail the same way, so it is not retried
+                    logging.error(f"Cannot read {json_file}: {value}")
+                    record['errors'] += 1
                 else:
-                    comp3smiles.append(None)
+                    failed.append(json_file)
+            progress.update(len(results))
+
+    if failed:
+        _init_shard_worker(shard_dir, column_mappings, data_dir)
+        for json_file in failed:
+            _, status, value = convert_to_worker_shard([json_file])[0]
+            if status == 'ok':
+                total_rows += value
+            else:
+                logging.error(f"Giving up on {json_file}: {value}")
+                record['errors'] += 1
+    output_paths = merge_worker_shards(shard_dir, output_prefix)
+    # Workers are separate processes, so the counts are collected from their results
+    record.update(files=len(scheduled), rows=total_rows,
+                  bytes_read=sum(set_sizes(scheduled, data_dir).values()),
+                  bytes_written=sum(os.path.getsize(path) for path in output_paths))
+    logging.info(f"Converted {len(scheduled)} sets ({total_rows} rows) into {len(output_paths)} shards")
+    return output_paths
 
-            density_df['smile 3'] = comp3smiles
-            density_df['smile 1'] = comp1smiles
-        except Exception as m:
-            logging.error(f'{m}')
-        
-        density_df.to_csv(density_data_csv_path, index=False)
+def update_density_csv_with_metadata(output_csv_path, density_data_csv_path):
+    """
+    Update density_data CSV files with reference and other metadata from output.csv,
+    matching by setid.
+    """
+    update_density_shards_with_metadata(output_csv_path, [density_data_csv_path])
+
+def update_density_shards_with_metadata(output_csv_path, density_data_csv_paths, compact=True):
+    """
+    Update all density_data shards with metadata from output.csv in one columnar join
+    on setid, keeping the text columns as strings. With compact=True the join runs on
+    dictionary-encoded columns, which roughly halves the peak memory on the density corpus.
+    """
+    try:
+        enrich_shards(output_csv_path, density_data_csv_paths, dtype_dict=METADATA_DTYPES, compact=compact)
+    except Exception as e:
+        logging.error(f"Error updating {', '.join(density_data_csv_paths)} with data from {output_csv_path}: {e}")
 
+def load_density_table(density_data_csv_paths, compact=True):
+    """
+    Loads the enriched density_data shards into one table. With compact=True the reference,
+    phases, compound id/name and SMILES columns are categorical and the temperature and
+    pressure columns float32 where that is lossless.
+    """
+    try:
+        return read_measurements(density_data_csv_paths, METADATA_DTYPES, compact)
     except Exception as e:
-        logging.error(f"Error updating {density_data_csv_path} with data from output.csv: {e}")
+        logging.error(f"Error loading {', '.join(density_data_csv_paths)}: {e}")
+        return pd.DataFrame()
 
 def create_smiles_dataframe(compounds_csv_path):
     """Create a DataFrame from the compounds CSV file containing 'id' and 'smiles' columns."""
@@ -259,7 +462,12 @@ def create_smiles_dataframe(compounds_csv_path):
         return pd.DataFrame()
 
 
-def main():
+def main(streaming=False, store_root=None, processes=None):
+    # metrics.json is written only when every stage finished; a report left by an earlier run is
+    # removed first, so a failed run does not leave it looking like this run's
+    metrics.reset_metrics()
+    if os.path.exists('metrics.json'):
+        os.remove('metrics.json')
     try:
         # Get valid setids from output.csv
         valid_set_ids = set()
@@ -274,10 +482,6 @@ def main():
         density_data_dir = 'density_data'
         json_files = [f for f in os.listdir(density_data_dir) if f.endswith('.json')]
 
-        # Split the JSON files into ten parts
-        tenth = len(json_files) // 10
-        json_files_parts = [json_files[i*tenth:(i+1)*tenth] for i in range(10)]
-
         column_mappings = {
             'ref': 'reference',
             'prp': 'property',
@@ -289,19 +493,28 @@ def main():
             'nm3': 'compound name 3'
         }
 
-        # Use multiprocessing to process the JSON files in parallel with valid_setids and smiles_mapping
-        with Pool(cpu_count()) as pool:
-            pool.starmap(process_json_files_to_csv, 
-                [(part, f'density_data{i+1}.csv', column_mappings, valid_set_ids) 
-                 for i, part in enumerate(json_files_parts)])
+        if streaming:
+            # One process and flat memory: every set goes through the streaming converter into
+            # density_data1.csv, with the same columns as the scheduled shards
+            remove_numbered_outputs('density_data')
+            density_data_paths = ['density_data1.csv']
+            process_json_files_to_csv_streaming(json_files, density_data_paths[0], column_mappings, valid_set_ids,
+                                                all_columns=False, data_dir=density_data_dir)
+        else:
+            # Convert the JSON files on all cores, largest sets first, one shard per worker
+            density_data_paths = convert_json_files_scheduled(json_files, column_mappings, valid_set_ids,
+                                                              density_data_dir, processes=processes)
+
+        # Update all density_data files with metadata from output.csv in one pass
+        update_density_shards_with_metadata('output.csv', density_data_paths)
+        logging.info(f"Updated {len(density_data_paths)} density_data files with metadata from output.csv")
 
-        # Update all density_data files with metadata from output.csv
-        for i in range(1, 11):  # Process all 10 density_data files
-            density_data_path = f'density_data{i}.csv'
-            if os.path.exists(density_data_path):
-                update_density_csv_with_metadata('output.csv', density_data_path)
-                logging.info(f"Updated {density_data_path} with metadata from output.csv")
+        # Optionally also write the enriched shards to the typed Parquet store
+        if store_root:
+            n_sets = csv_files_to_store(density_data_paths, store_root, 'Density')
+            logging.info(f"Wrote {n_sets} density sets to {store_root}")
 
+        metrics.write_metrics('metrics.json')
     except Exception as e:
         logging.error(f"Error processing density data files: {e}")
 
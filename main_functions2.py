@@ -5,6 +5,9 @@ from tqdm import tqdm
 import logging
 from multiprocessing import Pool, cpu_count
 import csv
+import json_backend
+from compound_index import lookup_smiles
+from enrichment import METADATA_DTYPES, enrich_shards
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -24,14 +27,14 @@ def read_density_id_set(column=None):
 def read_json_file(filepath, column=None):
     """Reads a JSON file from a given filepath and optionally extracts a specific column."""
     try:
-        with open(filepath, 'r') as file:
-            data = json.load(file)
-        if column:
-            return [item.get(column, None) for item in data]
-        return data
-    except Exception as e:
+        data = json_backend.load_file(filepath)
+    except (OSError, ValueError) as e:
+        # A missing, unreadable or malformed file; anything else (a broken backend) is raised
         logging.error(f"Error reading JSON file {filepath}: {e}")
         return {}
+    if column:
+        return [item.get(column, None) for item in data]
+    return data
         
 def clean_numeric_value(value):
     """Clean numeric values by extracting only the number."""
@@ -58,15 +61,7 @@ def clean_temperature_value(value):
 
 def get_smiles_for_compound_ids(compound_ids, compounds_csv_path):
     """Get SMILES strings for a list of compound IDs using the compounds CSV file."""
-    df_smiles = pd.read_csv(compounds_csv_path)
-    smiles_list = []
-    for compound_id in compound_ids:
-        smile = df_smiles.loc[df_smiles['id'] == compound_id, 'smiles']
-        if not smile.empty:
-            smiles_list.append(smile.values[0])
-        else:
-            smiles_list.append(None)
-    return smiles_list
+    return lookup_smiles(compound_ids, compounds_csv_path).tolist()
 
 def process_json_files_to_csv(json_files, output_file, column_mappings, valid_set_ids=None, smiles_mapping=None):
     """Processes a list of JSON files, merges their data, and saves to a CSV file."""
@@ -169,87 +164,17 @@ def update_density_csv_with_metadata(output_csv_path, density_data_csv_path):
     Update density_data CSV files with reference and other metadata from output.csv,
     matching by setid.
     """
-    try:
-        # Read output.csv into a dictionary for faster lookups
-        output_df = pd.read_csv(output_csv_path)
-        output_dict = output_df.set_index('setid').to_dict('index')
-        
-        # Read the density data file with string dtypes for text columns
-        dtype_dict = {
-            'setid': str,
-            'reference': str,
-            'property': str,
-            'phases': str,
-            'compound id 1': str,
-            'smile 1':str,
-            'compound name 1': str,
-            'compound id 2': str,
-            'smile 2':str,
-            'compound name 2': str,
-            'compound id 3': str,
-            'smile 3':str,
-            'compound name 3': str
-        }
-        density_df = pd.read_csv(density_data_csv_path, dtype=dtype_dict)
-        
-        # Update density data with metadata from output.csv
-        for index, row in density_df.iterrows():
-            set_id = row['setid']
-            if set_id in output_dict:
-                metadata = output_dict[set_id]
-                # Update each column with proper type handling
-                for col, value in metadata.items():
-                    if col in density_df.columns:
-                        if pd.isna(value):
-                            density_df.at[index, col] = None
-                        else:
-                            density_df.at[index, col] = str(value) if col in dtype_dict else value
-        
-        # Save updated density data
-
-        try:
-            df_smiles = pd.read_csv('compounds.csv')
-            compound_id_1 = density_df['compound id 1']
-            compound_id_2 = density_df['compound id 2']
-            compound_id_3 = density_df['compound id 3']
-
-            comp1smiles = []
-            for i in compound_id_1:
-                smile = df_smiles.loc[df_smiles['id'] == i, 'smiles']
-                if not smile.empty:
-                    comp1smiles.append(smile.values[0])
-                else:
-                    comp1smiles.append(None)
-            density_df['smile 1'] = comp1smiles
-
-
-            comp2smiles = []
-            for i in compound_id_2:
-                smile = df_smiles.loc[df_smiles['id'] == i, 'smiles']
-                if not smile.empty:
-                    comp2smiles.append(smile.values[0])
-                else:
-                    comp2smiles.append(None)
-
-            density_df['smile 2'] = comp2smiles
-
-            comp3smiles = []
-            for i in compound_id_3:
-                smile = df_smiles.loc[df_smiles['id'] == i, 'smiles']
-                if not smile.empty:
-                    comp3smiles.append(smile.values[0])
-                else:
-                    comp3smiles.append(None)
-
-            density_df['smile 3'] = comp3smiles
-            density_df['smile 1'] = comp1smiles
-        except Exception as m:
-            logging.error(f'{m}')
-        
-        density_df.to_csv(density_data_csv_path, index=False)
+    update_density_shards_with_metadata(output_csv_path, [density_data_csv_path])
 
+def update_density_shards_with_metadata(output_csv_path, density_data_csv_paths):
+    """
+    Update all density_data shards with metadata from output.csv in one columnar join
+    on setid, keeping the text columns as strings.
+    """
+    try:
+        enrich_shards(output_csv_path, density_data_csv_paths, dtype_dict={**METADATA_DTYPES, 'smile 1': str, 'smile 2': str, 'smile 3': str})
     except Exception as e:
-        logging.error(f"Error updating {density_data_csv_path} with data from output.csv: {e}")
+        logging.error(f"Error updating {', '.join(density_data_csv_paths)} with data from {output_csv_path}: {e}")
 
 def create_smiles_dataframe(compounds_csv_path):
     """Create a DataFrame from the compounds CSV file containing 'id' and 'smiles' columns."""
@@ -297,12 +222,11 @@ def main():
                 [(part, f'density_data{i+1}.csv', column_mappings, valid_set_ids) 
                  for i, part in enumerate(json_files_parts)])
 
-        # Update all density_data files with metadata from output.csv
-        for i in range(1, 11):  # Process all 10 density_data files
-            density_data_path = f'density_data{i}.csv'
-            if os.path.exists(density_data_path):
-                update_density_csv_with_metadata('density_output.csv', density_data_path)
-                logging.info(f"Updated {density_data_path} with metadata from output.csv")
+        # Update all density_data files with metadata from output.csv in one pass
+        density_data_paths = [f'density_data{i}.csv' for i in range(1, 11)]
+        density_data_paths = [path for path in density_data_paths if os.path.exists(path)]
+        update_density_shards_with_metadata('density_output.csv', density_data_paths)
+        logging.info(f"Updated {len(density_data_paths)} density_data files with metadata from density_output.csv")
 
     except Exception as e:
         logging.error(f"Error processing density data files: {e}")
@@ -1,36 +1,115 @@
 import os
-import pandas as pd
+import csv
+import time
+import metrics
+from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
 
-def merge_csv_files(folder_path, output_file='meltingtemp-data.csv', chunksize=10000):
-    csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
-    required_columns = [
-        'setid', 'Normal melting temperature, K',
-        'reference', 'propertiy', 'phases', 'compound id 1', 'smile 1', 'compound name 1',
-        'compound id 2', 'smile 2', 'compound name 2', 'compound id 3', 'smile 3', 'compound name 3'
-    ]
-    
-    # First pass to collect all column headers
-    for file in csv_files:
-        df = pd.read_csv(os.path.join(folder_path, file), nrows=0)
-        all_columns = set(df.columns).intersection(required_columns)
-    
-    all_columns = list(all_columns)
-    
-    with open(output_file, 'w') as outfile:
-        for i, file in enumerate(tqdm(csv_files, desc="Processing CSV files")):
-            try:
-                for chunk in pd.read_csv(os.path.join(folder_path, file), chunksize=chunksize, on_bad_lines='skip'):
-                    chunk = chunk[[col for col in required_columns if col in chunk.columns]]  # Keep only required columns that exist
-                    chunk.to_csv(outfile, index=False, header=(i == 0 and chunk.index[0] == 0))
-            except pd.errors.ParserError as e:
-                print(f"Error parsing {file}: {e}")
-    
+# Columns kept by the melting point merge
+MELTINGTEMP_COLUMNS = [
+    'setid', 'Normal melting temperature, K',
+    'reference', 'propertiy', 'phases', 'compound id 1', 'smile 1', 'compound name 1',
+    'compound id 2', 'smile 2', 'compound name 2', 'compound id 3', 'smile 3', 'compound name 3'
+]
+
+def read_header(path):
+    """Returns (header row, error) of a CSV file: ([], None) for an empty file, (None, error) if it cannot be read."""
+    try:
+        with open(path, 'r', newline='') as f:
+            return next(csv.reader(f), []), None
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        return None, str(e)
+
+def read_rows(task):
+    """
+    Worker: reads one per-set CSV and lays its rows out in the merged columns. Rows whose field
+    count does not match the header are skipped. Returns (path, rows, skipped, error).
+    """
+    path, columns = task
     try:
-        return pd.read_csv(output_file, on_bad_lines='skip')
-    except pd.errors.ParserError as e:
-        print(f"Error reading merged file: {e}")
-        return None
+        with open(path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            positions = [header.index(col) if col in header else None for col in columns]
+            rows, skipped = [], 0
+            for row in reader:
+                if len(row) != len(header):
+                    skipped += 1
+                    continue
+                rows.append(['' if pos is None else row[pos] for pos in positions])
+        return path, rows, skipped, None
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        return path, [], 0, str(e)
+
+def merge_schema(headers, required_columns=MELTINGTEMP_COLUMNS):
+    """The merged columns: required_columns present in any file, or the union of all headers in first-seen order."""
+    union = []
+    seen = set()
+    for header in headers:
+        for col in header:
+            if col not in seen:
+                seen.add(col)
+                union.append(col)
+    if required_columns is None:
+        return union
+    return [col for col in required_columns if col in seen]
+
+def merge_csv_files(folder_path, output_file='meltingtemp-data.csv', chunksize=32, required_columns=MELTINGTEMP_COLUMNS, processes=None):
+    """
+    Merges the per-set CSVs of folder_path into output_file. Headers and rows are read in
+    parallel (chunksize files per worker task), the schema is computed once, and a single
+    writer emits the files in sorted name order, so reruns produce identical output. A file
+    that cannot be read is left out and listed in the summary's 'failed'.
+    Returns a summary with the file, row and skipped-row counts and the files/s. (It used to
+    return the merged file read back into a DataFrame; use pd.read_csv(output_file) for that.)
+    """
+    with metrics.stage('merge') as record:
+        summary = _merge(folder_path, output_file, chunksize, required_columns, processes)
+        record.update(files=summary['files'], rows=summary['rows'], errors=len(summary['failed']),
+                      bytes_read=summary['bytes_read'], bytes_written=os.path.getsize(output_file))
+    return summary
 
-merge_csv_files('meltingtemp_csv_data')
+def _merge(folder_path, output_file, chunksize, required_columns, processes):
+    all_files = sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith('.csv'))
+    start = time.perf_counter()
+    rows_written, skipped_rows, failed = 0, 0, []
+    with Pool(processes or cpu_count()) as pool:
+        csv_files, headers = [], []
+        for path, (header, error) in zip(all_files, pool.map(read_header, all_files, chunksize=chunksize)):
+            if error is not None:
+                print(f"Error reading {path}, skipping it: {error}")
+                failed.append(path)
+            else:
+                csv_files.append(path)
+                headers.append(header)
+        columns = merge_schema(headers, required_columns)
+        with open(output_file, 'w', newline='') as outfile:
+            writer = csv.writer(outfile, lineterminator='\n')
+            writer.writerow(columns)
+            results = pool.imap(read_rows, [(path, columns) for path in csv_files], chunksize=chunksize)
+            for path, rows, skipped, error in tqdm(results, total=len(csv_files), desc="Processing CSV files"):
+                if error is not None:
+                    print(f"Error parsing {path}: {error}")
+                    failed.append(path)
+                    continue
+                writer.writerows(rows)
+                rows_written += len(rows)
+                skipped_rows += skipped
+    elapsed = time.perf_counter() - start
+    summary = {
+        'files': len(all_files) - len(failed),
+        'failed': failed,
+        'rows': rows_written,
+        'skipped_rows': skipped_rows,
+        'bytes_read': sum(os.path.getsize(path) for path in csv_files),
+        'seconds': elapsed,
+        'files_per_s': (len(all_files) - len(failed)) / elapsed if elapsed else 0.0,
+    }
+    print(f"Merged {summary['files']} files ({rows_written} rows, {skipped_rows} bad rows skipped) into "
+          f"{output_file} in {elapsed:.1f}s: {summary['files_per_s']:.0f} files/s")
+    if failed:
+        print(f"Skipped {len(failed)} unreadable files: {', '.join(failed)}")
+    return summary
 
+if __name__ == "__main__":
+    merge_csv_files('meltingtemp_csv_data')
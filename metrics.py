@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is then left out
+    resource = None
+
+# ILTHERMO_PROFILE=cprofile or =tracemalloc profiles every stage; set_profiling() does the same
+_profile_mode = os.environ.get('ILTHERMO_PROFILE') or None
+_profile_dir = os.environ.get('ILTHERMO_PROFILE_DIR', 'profiles')
+
+# Finished stage records of this process, and the stack of running ones
+_records = []
+_active = []
+
+COUNTERS = ('files', 'rows', 'bytes_read', 'bytes_written', 'errors')
+
+def set_profiling(mode, profile_dir='profiles'):
+    """Turns per-stage profiling on ('cprofile' or 'tracemalloc') or off (None)."""
+    global _profile_mode, _profile_dir
+    if mode not in (None, 'cprofile', 'tracemalloc'):
+        raise ValueError(f"Unknown profiling mode {mode!r}, use 'cprofile', 'tracemalloc' or None")
+    _profile_mode, _profile_dir = mode, profile_dir
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process over its whole lifetime so far, in MB (None where
+    unavailable). It never goes down, so it is not the peak of any one stage.
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux and the BSDs
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+def add(**counters):
+    """Adds to the counters of the innermost running stage; does nothing outside a stage."""
+    if not _active:
+        return
+    record = _active[-1]
+    for key, value in counters.items():
+        record[key] = record.get(key, 0) + value
+
+def _top_functions(profiler, limit=10):
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{'function': f'{filename}:{line}({name})', 'calls': calls, 'cumulative_s': cumulative}
+            for (filename, line, name), (_, calls, _, cumulative, _) in rows]
+
+@contextmanager
+def stage(name, **counters):
+    """
+    Records one run of a pipeline stage: wall time, files/rows/bytes/error counters (set here
+    or with add() while it runs), rows/s and files/s, the process peak RSS at the end
+    (process_peak_rss_mb) and how far this stage raised it (peak_rss_growth_mb; 0 when the
+    stage stayed below a peak reached earlier in the process).
+    With profiling on, the hot functions or allocation sites are added to the record.
+    """
+    record = {'stage': name, **{key: 0 for key in COUNTERS}, **counters}
+    _active.append(record)
+    profiler = None
+    # Only the outermost stage is profiled, nested stages show up inside its profile
+    if _profile_mode == 'cprofile' and len(_active) == 1:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif _profile_mode == 'tracemalloc' and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        profiler = 'tracemalloc'
+    peak_before = peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record['errors'] += 1
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if profiler == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot()
+            record['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            record['top_allocations'] = [{'site': str(stat.traceback), 'size_kb': stat.size / 1024}
+                                         for stat in snapshot.statistics('lineno')[:10]]
+            tracemalloc.stop()
+        elif profiler is not None:
+            profiler.disable()
+            os.makedirs(_profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(_profile_dir, f'{name}-{len(_records)}.prof'))
+            record['top_functions'] = _top_functions(profiler)
+        record['seconds'] = seconds
+        record['files_per_s'] = record['files'] / seconds if seconds else 0.0
+        record['rows_per_s'] = record['rows'] / seconds if seconds else 0.0
+        record['process_peak_rss_mb'] = peak_rss_mb()
+        record['peak_rss_growth_mb'] = None if peak_before is None else record['process_peak_rss_mb'] - peak_before
+        _active.remove(record)
+        _records.append(record)
+
+def get_metrics():
+    return list(_records)
+
+def reset_metrics():
+    _records.clear()
+
+def write_metrics(path='metrics.json'):
+    """Writes every stage recorded in this process as a JSON list."""
+    with open(path, 'w') as f:
+        json.dump(_records, f, indent=1)
+    return path
@@ -32,6 +32,7 @@ def json_to_csv(json_filepath, csv_filepath):
     df = pd.DataFrame(processed_rows, columns=header)
     df.to_csv(csv_filepath, index=False)
 
-# Save JSON data as CSV
-json_to_csv('idsets/melting-temperature-idset.json', 'meltpoint-output.csv')
+if __name__ == "__main__":
+    # Save JSON data as CSV
+    json_to_csv('idsets/melting-temperature-idset.json', 'meltpoint-output.csv')
 
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+import metrics
+import http_cache
+import pandas as pd
+import output_creator
+from json_to_csv import convert_incremental, state_path_for
+from merge_csv_files import merge_csv_files
+from compound_index import add_smiles_columns, COMPOUND_SLOTS
+from install_all_jsons import get_setid_list, sync_sets
+from sqlite_store import load_property
+from star_schema import export_star_schema
+from components import write_component_table
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+# Paths of the properties that have been processed so far, keyed by ILThermo property code
+PROPERTIES = {
+    'JkYu': {'idset': 'density', 'filename': 'density'},
+    'bNnk': {'idset': 'refracrive-index', 'filename': 'refindex'},
+    'NmYB': {'idset': 'melting-temperature', 'filename': 'meltingtemp'},
+}
+
+# Layout of the setid metadata tables
+METADATA_COLUMNS = ['setid', 'reference', 'property', 'phases'] + [
+    col for slot in COMPOUND_SLOTS for col in (f'compound id {slot}', f'smile {slot}', f'compound name {slot}')]
+
+# Bump a stage's version when its code changes so cached outputs are rebuilt
+STAGE_VERSIONS = {'metadata': 1, 'convert': 2, 'merge': 1, 'export': 2, 'components': 1}
+
+CACHE_DIR = '.pipeline_cache'
+
+def property_spec(code):
+    """Returns the file layout of a property code; unknown codes get paths named after the code."""
+    spec = {'idset': code, 'filename': code}
+    spec.update(PROPERTIES.get(code, {}))
+    spec['code'] = code
+    # The pipeline's own metadata table; the checked-in density_output.csv, refrindex-output.csv
+    # and meltpoint-output.csv are read by other scripts with their own header and are left alone
+    spec['metadata_csv'] = f"{spec['filename']}-metadata.csv"
+    spec['idset_path'] = os.path.join('idsets', f"{spec['idset']}-idset.json")
+    spec['json_dir'] = f"{spec['filename']}_json_data"
+    # Likewise the conversion and merge outputs: the checked-in <filename>_csv_data folders and
+    # <filename>-data.csv were written with other headers and phases and are not overwritten
+    spec['csv_dir'] = os.path.join(CACHE_DIR, spec['filename'], 'csv')
+    spec['merged_csv'] = f"{spec['filename']}-pipeline-data.csv"
+    spec['star_dir'] = f"{spec['filename']}_star"
+    spec['components_csv'] = f"{spec['filename']}-components.csv"
+    return spec
+
+def file_digest(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def content_digest(path):
+    """
+    Digest of a stage input or output; None if missing. A file is hashed by content. A directory
+    (thousands of set files) is keyed on the names, sizes and modification times of its files,
+    so checking it costs a stat per file instead of reading the whole corpus on every run.
+    """
+    if os.path.isfile(path):
+        return file_digest(path)
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.sha256()
+    for folder, subfolders, names in os.walk(path):
+        subfolders.sort()
+        for name in sorted(names):
+            file_path = os.path.join(folder, name)
+            stat = os.stat(file_path)
+            digest.update(f'{os.path.relpath(file_path, path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+def load_cache(code):
+    path = os.path.join(CACHE_DIR, f'{code}.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def metrics_path_for(code):
+    """Where run_pipeline writes the stage metrics of its last run, e.g. .pipeline_cache/NmYB-metrics.json."""
+    return os.path.join(CACHE_DIR, f'{code}-metrics.json')
+
+def save_cache(code, cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f'{code}.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+def run_stage(cache, name, inputs, output, build, params=None, force=False):
+    """
+    Runs build() unless the stage's key (its version, params and the content digests of its
+    inputs) and the digest of its output match the cache. Returns True if the stage ran.
+    """
+    key_source = {'version': STAGE_VERSIONS[name], 'params': params,
+                  'inputs': {path: content_digest(path) for path in inputs}}
+    key = hashlib.sha256(json.dumps(key_source, sort_keys=True).encode('utf-8')).hexdigest()
+    entry = cache.get(name, {})
+    if not force and entry.get('key') == key and entry.get('output') == content_digest(output):
+        logging.info(f"{name}: cached, skipping")
+        return False
+    logging.info(f"{name}: running")
+    build()
+    cache[name] = {'key': key, 'output': content_digest(output)}
+    return True
+
+def build_metadata_csv(idset_path, metadata_csv, compounds_csv_path='compounds.csv'):
+    """Writes the setid metadata table of an idset with the SMILES of its compounds."""
+    output_creator.json_to_csv(idset_path, metadata_csv)
+    df = pd.read_csv(metadata_csv, dtype=str)
+    add_smiles_columns(df, compounds_csv_path)
+    df.reindex(columns=METADATA_COLUMNS).to_csv(metadata_csv, index=False)
+
+def convert_sets(json_dir, csv_dir, metadata_csv, force=False):
+    """Converts the set JSONs to per-set CSVs with their metadata row appended; only changed sets are reconverted."""
+    if force and os.path.exists(state_path_for(csv_dir)):
+        os.remove(state_path_for(csv_dir))
+    changed, removed = convert_incremental(json_dir, csv_dir, metadata_csv)
+    logging.info(f"convert: {len(changed)} sets reconverted, {len(removed)} removed")
+
+def run_pipeline(code, fetch=False, force=False, max_workers=8, db_path=None, layout='wide'):
+    """
+    Runs idset -> metadata CSV -> per-set conversion (joined with the metadata) -> merge for
+    one property code, and extracts the compound table of the sets' components blocks.
+    Stages whose inputs are unchanged since the last run are skipped.
+    A fetch snapshots the idset in idset_catalog and only downloads the added sets and the
+    sets whose data changed; removed sets are deleted and so drop out of the conversion.
+    With layout='star' the conversion and merge are replaced by the measurements/conditions/sets/compounds
+    export of star_schema, from which the wide CSVs can be rebuilt with write_wide_csvs.
+    With db_path the sets are also bulk-loaded into that SQLite database. The metrics of
+    the stages that ran are written to .pipeline_cache/<code>-metrics.json.
+    """
+    spec = property_spec(code)
+    metrics.reset_metrics()
+    delta = None
+    if fetch or not os.path.exists(spec['idset_path']):
+        delta = get_setid_list([spec['idset'], code], cache=http_cache.default_cache())
+    if fetch or not os.path.isdir(spec['json_dir']):
+        sync_sets(spec['idset'], spec['filename'], spec['json_dir'], max_workers=max_workers, delta=delta,
+                  cache=http_cache.default_cache())
+
+    cache = load_cache(code)
+    try:
+        run_stage(cache, 'metadata', [spec['idset_path'], 'compounds.csv'], spec['metadata_csv'],
+                  lambda: build_metadata_csv(spec['idset_path'], spec['metadata_csv']), force=force)
+        run_stage(cache, 'components', [spec['json_dir']], spec['components_csv'],
+                  lambda: write_component_table([spec['json_dir']], spec['components_csv']), force=force)
+        if layout == 'star':
+            run_stage(cache, 'export', [spec['json_dir'], spec['metadata_csv'], 'compounds.csv'], spec['star_dir'],
+                      lambda: export_star_schema(spec['json_dir'], spec['metadata_csv'], spec['star_dir']), force=force)
+        else:
+            run_stage(cache, 'convert', [spec['json_dir'], spec['metadata_csv']], spec['csv_dir'],
+                      lambda: convert_sets(spec['json_dir'], spec['csv_dir'], spec['metadata_csv'], force), force=force)
+            run_stage(cache, 'merge', [spec['csv_dir']], spec['merged_csv'],
+                      lambda: merge_csv_files(spec['csv_dir'], spec['merged_csv'], required_columns=None), force=force)
+        if db_path:
+            load_property(db_path, spec['json_dir'], spec['metadata_csv'])
+    finally:
+        save_cache(code, cache)
+        # Written after the last stage, so the SQLite load is recorded too
+        metrics.write_metrics(metrics_path_for(code))
+    return spec
+
+if __name__ == "__main__":
+    # e.g. python pipeline.py NmYB bNnk
+    for code in sys.argv[1:] or ['NmYB']:
+        run_pipeline(code)
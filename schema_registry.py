@@ -0,0 +1,130 @@
+import sys
+from functools import lru_cache
+from operator import itemgetter
+import numpy as np
+from value_parser import parse_values
+
+def signature_of(full_data):
+    """The raw dhead column names of a set, e.g. ('Temperature, K', 'Pressure, kPa', ...)."""
+    return tuple(item[0] for item in full_data.get('dhead', []))
+
+class SchemaRegistry:
+    """
+    Output layout of every distinct dhead signature, computed the first time the signature is
+    seen: the mapped and renamed column names, and where each of them goes in the output
+    columns. Sets whose signatures land in the same output positions (the same columns in
+    another order, or differing only in columns that are not written) share a layout key
+    and are converted together by convert_group.
+    """
+
+    def __init__(self, column_mappings, renames=None, numeric_columns=()):
+        self.column_mappings = column_mappings
+        self.renames = renames or {}
+        self.numeric_columns = set(numeric_columns)
+        self.headers = {}
+        self.layouts = {}
+        self.indexes = {}
+
+    def header(self, signature):
+        """The output column names of a signature."""
+        header = self.headers.get(signature)
+        if header is None:
+            names = [self.column_mappings.get(name, name) for name in signature]
+            header = self.headers[signature] = [self.renames.get(name, name) for name in names]
+        return header
+
+    def union_header(self):
+        """The columns of all registered signatures in first-seen order."""
+        seen = {}
+        for header in self.headers.values():
+            seen.update(dict.fromkeys(header))
+        return list(seen)
+
+    def layout(self, signature, output_columns):
+        """
+        (key, sources) of a signature in output_columns (a tuple): key holds the output positions
+        the signature fills, in increasing order, and sources the dhead index each one is read from.
+        """
+        layout = self.layouts.get((signature, output_columns))
+        if layout is None:
+            index = self.indexes.get(output_columns)
+            if index is None:
+                index = self.indexes[output_columns] = {col: i for i, col in enumerate(output_columns)}
+            placed = {}
+            for source, col in enumerate(self.header(signature)):
+                # A later duplicate of a column name wins, as when the cells are placed one by one
+                if col in index:
+                    placed[index[col]] = source
+            key = tuple(sorted(placed))
+            layout = self.layouts[(signature, output_columns)] = (key, tuple(placed[pos] for pos in key))
+        return layout
+
+def _numeric_cells(cells):
+    values = parse_values(cells)
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+def _text_cells(cells):
+    return [f"{cell[0]}±{cell[1]}" if type(cell) is list and len(cell) == 2 else cell for cell in cells]
+
+@lru_cache(maxsize=None)
+def _row_builder(positions, width):
+    """A function laying a tuple of cells out in width columns at positions, None elsewhere."""
+    if len(positions) * 4 >= width:
+        # Most columns are filled: one itemgetter call per row, the missing ones read a trailing None
+        source = dict(zip(positions, range(len(positions))))
+        indices = [source.get(pos, len(positions)) for pos in range(width)]
+        if width == 1:
+            # itemgetter with a single index returns the cell itself, not a 1-tuple
+            index = indices[0]
+            return lambda cells: ((cells + (None,))[index],)
+        getter = itemgetter(*indices)
+        return lambda cells: getter(cells + (None,))
+
+    # A few columns out of many (the all_columns output): scatter them into a row of Nones
+    def build(cells):
+        row = [None] * width
+        for pos, cell in zip(positions, cells):
+            row[pos] = cell
+        return row
+    return build
+
+def convert_group(key, sets, output_columns, numeric_columns):
+    """
+    Converts sets that share a layout key in bulk. sets holds (set_id, data rows, sources) with
+    sources from SchemaRegistry.layout. Each set is transposed once and its columns appended to
+    the group's; each numeric column is then parsed in a single call for the whole group.
+    Returns one iterator per set over its rows, laid out in output_columns with setid first.
+    """
+    counts = [len(rows) for _, rows, _ in sets]
+    columns = [[set_id for (set_id, _, _), n in zip(sets, counts) for _ in range(n)]] + [[] for _ in key]
+    for _, rows, sources in sets:
+        transposed = list(zip(*rows))
+        for cells, source in zip(columns[1:], sources):
+            cells.extend(transposed[source])
+    for i, pos in enumerate(key, start=1):
+        columns[i] = (_numeric_cells if output_columns[pos] in numeric_columns else _text_cells)(columns[i])
+    # A dhead column named like the first output column replaces the setid, as it did cell by cell
+    if key[:1] == (0,):
+        positions, columns = key, columns[1:]
+    else:
+        positions = (0,) + key
+    build = _row_builder(positions, len(output_columns))
+    # Rows are built as they are consumed, so a batch of wide sets is never laid out all at once
+    starts = np.cumsum([0] + counts).tolist()
+    return [map(build, zip(*(cells[start:stop] for cells in columns))) for start, stop in zip(starts, starts[1:])]
+
+if __name__ == "__main__":
+    # e.g. python schema_registry.py density_json_data: how many layouts the conversion works with
+    from main_functions import REQUIRED_COLUMNS, iter_json_sets, list_json_files, new_schema_registry
+
+    json_dir = sys.argv[1] if len(sys.argv) > 1 else 'density_json_data'
+    registry = new_schema_registry({})
+    signatures = {}
+    for _, full_data in iter_json_sets(list_json_files(json_dir), data_dir=json_dir):
+        signature = signature_of(full_data)
+        signatures[signature] = signatures.get(signature, 0) + 1
+    keys = {registry.layout(signature, tuple(REQUIRED_COLUMNS))[0] for signature in signatures}
+    print(f"{sum(signatures.values())} sets, {len(signatures)} dhead signatures, {len(keys)} layouts in the required columns")
+    print(f"most common signature ({max(signatures.values())} sets): {max(signatures, key=signatures.get)}")
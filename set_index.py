@@ -0,0 +1,128 @@
+import json
+import pickle
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from compound_index import COMPOUND_SLOTS
+from main_functions import iter_json_sets, list_json_files
+from value_parser import parse_values
+
+TEMPERATURE_COLUMN = 'Temperature, K'
+PRESSURE_COLUMN = 'Pressure, kPa'
+
+def mixture_key(compound_ids):
+    """Order-independent key of a system: ('AADYJk', 'AAjkLa') for water + AAjkLa in any slot order."""
+    return tuple(sorted(compound_id for compound_id in compound_ids if compound_id))
+
+def set_compounds_from_metadata(metadata_csv):
+    """Returns {setid: [compound ids]} from a metadata table such as density_output.csv."""
+    columns = ['setid'] + [f'compound id {slot}' for slot in COMPOUND_SLOTS]
+    df = pd.read_csv(metadata_csv, dtype=str, usecols=lambda col: col in columns)
+    df = df.reindex(columns=columns)
+    return {row[0]: [compound_id for compound_id in row[1:] if isinstance(compound_id, str)]
+            for row in df.itertuples(index=False, name=None)}
+
+def set_compounds_from_idset(idset_path):
+    """Returns {setid: [compound ids]} from an idset JSON (rows: setid, ref, prp, phases, cmp1, cmp2, cmp3, ...)."""
+    with open(idset_path, 'r') as json_file:
+        data = json.load(json_file)
+    return {row[0]: [compound_id for compound_id in row[4:7] if compound_id] for row in data['res']}
+
+def set_conditions(json_dir):
+    """
+    Returns {setid: (temperatures, pressures)}: float64 arrays with one entry per point, sorted by
+    temperature (points without one last). Each pressure stays with its point, NaN where missing.
+    """
+    json_files = list_json_files(json_dir)
+    conditions = {}
+    for set_id, full_data in tqdm(iter_json_sets(json_files, data_dir=json_dir), total=len(json_files),
+                                  desc=f"Indexing {json_dir}"):
+        header = [item[0] for item in full_data.get('dhead', [])]
+        columns = list(zip(*full_data.get('data', [])))
+        n_points = len(columns[0]) if columns else 0
+        temperatures, pressures = [parse_values(columns[header.index(name)]) if name in header and columns
+                                   else np.full(n_points, np.nan) for name in (TEMPERATURE_COLUMN, PRESSURE_COLUMN)]
+        order = np.argsort(temperatures, kind='stable')
+        conditions[set_id] = (temperatures[order], pressures[order])
+    return conditions
+
+def build_set_index(metadata_csv=None, idset_path=None, json_dirs=()):
+    """
+    Builds the inverted index: compound id -> setids, mixture key -> setids and, for the sets
+    in json_dirs, the sorted temperature and pressure arrays used by the range lookups.
+    Compounds come from metadata_csv and/or idset_path.
+    """
+    set_compounds = {}
+    if idset_path:
+        set_compounds.update(set_compounds_from_idset(idset_path))
+    if metadata_csv:
+        set_compounds.update(set_compounds_from_metadata(metadata_csv))
+
+    compounds, mixtures = {}, {}
+    for setid, compound_ids in set_compounds.items():
+        for compound_id in set(compound_ids):
+            compounds.setdefault(compound_id, []).append(setid)
+        mixtures.setdefault(mixture_key(compound_ids), []).append(setid)
+    for setids in list(compounds.values()) + list(mixtures.values()):
+        setids.sort()
+
+    conditions = {}
+    for json_dir in json_dirs:
+        conditions.update(set_conditions(json_dir))
+    return {'compounds': compounds, 'mixtures': mixtures, 'conditions': conditions}
+
+def save_set_index(index, path):
+    with open(path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_set_index(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def sets_with_compound(index, compound_id):
+    """Every setid whose system contains compound_id."""
+    return index['compounds'].get(compound_id, [])
+
+def sets_with_mixture(index, compound_ids):
+    """Every setid of exactly this system, whatever the slot order, e.g. ['AAjkLa', 'AADYJk']."""
+    return index['mixtures'].get(mixture_key(compound_ids), [])
+
+def range_slice(values, low=None, high=None):
+    """(start, stop) of the values in [low, high] of a sorted array (NaN last), by binary search."""
+    valid = len(values) - int(np.count_nonzero(np.isnan(values)))
+    start = 0 if low is None else int(np.searchsorted(values[:valid], low, side='left'))
+    stop = valid if high is None else int(np.searchsorted(values[:valid], high, side='right'))
+    return start, max(stop, start)
+
+def sets_in_range(index, setids, t_min=None, t_max=None, p_min=None, p_max=None):
+    """
+    Keeps the setids with at least one point whose temperature is in [t_min, t_max] and whose
+    pressure is in [p_min, p_max]; both ranges are checked on the same point. A bound left as
+    None is open. Sets without condition arrays are dropped.
+    """
+    matched = []
+    for setid in setids:
+        if setid not in index['conditions']:
+            continue
+        temperatures, pressures = index['conditions'][setid]
+        start, stop = 0, len(temperatures)
+        if t_min is not None or t_max is not None:
+            # The points in the temperature range are a slice of the sorted arrays
+            start, stop = range_slice(temperatures, t_min, t_max)
+            if start >= stop:
+                continue
+        if p_min is not None or p_max is not None:
+            candidates = pressures[start:stop]
+            inside = ~np.isnan(candidates)
+            if p_min is not None:
+                inside &= candidates >= p_min
+            if p_max is not None:
+                inside &= candidates <= p_max
+            if not inside.any():
+                continue
+        matched.append(setid)
+    return matched
+
+if __name__ == "__main__":
+    index = build_set_index('density_output.csv', json_dirs=['density_json_data'])
+    save_set_index(index, 'density-set-index.pkl')
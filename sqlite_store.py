@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import logging
+from contextlib import closing
+import pandas as pd
+from tqdm import tqdm
+import metrics
+from compound_index import load_compound_index, COMPOUND_SLOTS
+from enrichment import load_setid_metadata, METADATA_DTYPES
+from main_functions import iter_json_sets, list_json_files
+from value_parser import parse_value_column
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compounds (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    smiles TEXT
+);
+CREATE TABLE IF NOT EXISTS sets (
+    setid TEXT PRIMARY KEY,
+    property TEXT,
+    quantity TEXT,
+    reference TEXT,
+    phases TEXT
+);
+CREATE TABLE IF NOT EXISTS set_compounds (
+    setid TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    compound_id TEXT NOT NULL,
+    PRIMARY KEY (setid, slot)
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    setid TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    temperature REAL,
+    pressure REAL,
+    value REAL,
+    uncertainty REAL,
+    PRIMARY KEY (setid, row)
+);
+CREATE TABLE IF NOT EXISTS conditions (
+    setid TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    uncertainty REAL,
+    PRIMARY KEY (setid, row, name)
+);
+"""
+
+# Created after a bulk load so inserts do not maintain them row by row
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_sets_property ON sets (property);
+CREATE INDEX IF NOT EXISTS idx_set_compounds_compound ON set_compounds (compound_id, setid);
+CREATE INDEX IF NOT EXISTS idx_measurements_temperature ON measurements (temperature);
+"""
+
+# Bound parameters per statement on SQLite builds before 3.32 (SQLITE_MAX_VARIABLE_NUMBER)
+MAX_VARIABLES = 999
+
+TEMPERATURE_COLUMN = 'Temperature, K'
+PRESSURE_COLUMN = 'Pressure, kPa'
+
+def connect(db_path):
+    """Opens (and creates if needed) the measurement database."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def load_compounds(conn, compounds_csv_path='compounds.csv'):
+    """Replaces the compounds table with compounds.csv."""
+    index = load_compound_index(compounds_csv_path)
+    with conn:
+        conn.execute("DELETE FROM compounds")
+        conn.executemany("INSERT INTO compounds (id, name, smiles) VALUES (?, ?, ?)",
+                         index.reset_index().itertuples(index=False, name=None))
+    return len(index)
+
+def _optional(value):
+    return None if value is None or value != value else value
+
+def set_records(set_id, full_data, metadata):
+    """
+    Splits one set into its sets/set_compounds/measurements/conditions rows. The last dhead
+    column is the measured property; temperature and pressure get their own columns and
+    every other column (compositions, ...) goes to conditions.
+    """
+    header = [item[0] for item in full_data.get('dhead', [])]
+    columns = list(zip(*full_data.get('data', [])))
+    if not header or not columns:
+        return None
+    parsed = [tuple(array.tolist() for array in parse_value_column(cells)) for cells in columns]
+    n_rows = len(columns[0])
+
+    def column_values(name):
+        if name in header:
+            return parsed[header.index(name)][0]
+        return [None] * n_rows
+
+    meta = metadata.get(set_id, {})
+    set_row = (set_id, _optional(meta.get('property')), header[-1],
+               _optional(meta.get('reference')), _optional(meta.get('phases')))
+    compounds = [(set_id, slot, meta.get(f'compound id {slot}')) for slot in COMPOUND_SLOTS
+                 if not pd.isna(meta.get(f'compound id {slot}'))]
+
+    temperatures = column_values(TEMPERATURE_COLUMN)
+    pressures = column_values(PRESSURE_COLUMN)
+    values, uncertainties = parsed[-1]
+    measurements = [(set_id, row, _optional(temperatures[row]), _optional(pressures[row]),
+                     _optional(values[row]), _optional(uncertainties[row])) for row in range(n_rows)]
+    conditions = [(set_id, row, name, _optional(parsed[i][0][row]), _optional(parsed[i][1][row]))
+                  for i, name in enumerate(header[:-1]) if name not in (TEMPERATURE_COLUMN, PRESSURE_COLUMN)
+                  for row in range(n_rows)]
+    return set_row, compounds, measurements, conditions
+
+def _insert_batch(conn, batch):
+    setids = [records[0][0] for records in batch]
+    with conn:
+        # Only sets loaded before need deleting; every table is keyed by setid first. The lookup
+        # is split so no statement binds more than MAX_VARIABLES setids, whatever the batch size
+        reloaded = []
+        for start in range(0, len(setids), MAX_VARIABLES):
+            chunk = setids[start:start + MAX_VARIABLES]
+            reloaded += conn.execute(f"SELECT setid FROM sets WHERE setid IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+        for table in ('sets', 'set_compounds', 'measurements', 'conditions'):
+            conn.executemany(f"DELETE FROM {table} WHERE setid = ?", reloaded)
+        conn.executemany("INSERT INTO sets VALUES (?, ?, ?, ?, ?)", [records[0] for records in batch])
+        conn.executemany("INSERT INTO set_compounds VALUES (?, ?, ?)", [row for records in batch for row in records[1]])
+        measurements = [row for records in batch for row in records[2]]
+        conn.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?)", measurements)
+        conn.executemany("INSERT INTO conditions VALUES (?, ?, ?, ?, ?)", [row for records in batch for row in records[3]])
+    metrics.add(rows=len(measurements))
+
+def load_sets(conn, json_dir, metadata_csv, batch_size=500):
+    """
+    Bulk-loads every set JSON of json_dir with its metadata row, batch_size sets per
+    transaction. Sets that are already in the database are replaced. Returns the set count.
+    """
+    metadata = load_setid_metadata(metadata_csv, {**METADATA_DTYPES, 'propertiy': str})
+    metadata = metadata.rename(columns={'propertiy': 'property'}).to_dict('index')
+    json_files = list_json_files(json_dir)
+    conn.execute("PRAGMA synchronous = OFF")
+    loaded, batch = 0, []
+    for set_id, full_data in tqdm(iter_json_sets(json_files, data_dir=json_dir), total=len(json_files),
+                                  desc=f"Loading {json_dir}"):
+        records = set_records(set_id, full_data, metadata)
+        if records is None:
+            logging.error(f"No data in set {set_id}, skipping")
+            continue
+        batch.append(records)
+        if len(batch) >= batch_size:
+            _insert_batch(conn, batch)
+            loaded += len(batch)
+            batch = []
+    if batch:
+        _insert_batch(conn, batch)
+        loaded += len(batch)
+    conn.execute("PRAGMA synchronous = FULL")
+    return loaded
+
+def create_indexes(conn):
+    with conn:
+        conn.executescript(INDEXES)
+    conn.execute("ANALYZE")
+
+def load_property(db_path, json_dir, metadata_csv, compounds_csv_path='compounds.csv', batch_size=500):
+    """Loads compounds and one property's sets into db_path and (re)creates the indexes."""
+    with metrics.stage('load') as record:
+        conn = connect(db_path)
+        try:
+            load_compounds(conn, compounds_csv_path)
+            n_sets = load_sets(conn, json_dir, metadata_csv, batch_size)
+            create_indexes(conn)
+        finally:
+            conn.close()
+        record.update(files=n_sets, bytes_written=os.path.getsize(db_path))
+    logging.info(f"Loaded {n_sets} sets from {json_dir} into {db_path}")
+    return n_sets
+
+def query_measurements(db_path, compound_id=None, property=None, t_min=None, t_max=None):
+    """
+    Returns the measurements matching every given filter, e.g. all density points of a
+    compound between 290 and 320 K:
+    query_measurements('ilthermo.db', 'AAjkLa', 'Density', 290, 320).
+    """
+    clauses, params = [], []
+    if compound_id is not None:
+        clauses.append("m.setid IN (SELECT setid FROM set_compounds WHERE compound_id = ?)")
+        params.append(compound_id)
+    if property is not None:
+        clauses.append("s.property = ?")
+        params.append(property)
+    if t_min is not None:
+        clauses.append("m.temperature >= ?")
+        params.append(t_min)
+    if t_max is not None:
+        clauses.append("m.temperature <= ?")
+        params.append(t_max)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+        SELECT m.setid, s.property, s.quantity, m.temperature, m.pressure, m.value, m.uncertainty, s.reference
+        FROM measurements m JOIN sets s ON s.setid = m.setid
+        {where}
+        ORDER BY m.setid, m.row
+    """
+    # sqlite3's own context manager only ends the transaction, closing() closes the connection
+    with closing(sqlite3.connect(db_path)) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
@@ -0,0 +1,249 @@
+import os
+import sys
+import csv
+import json
+import logging
+from itertools import groupby
+import pandas as pd
+from tqdm import tqdm
+import metrics
+from compound_index import COMPOUND_SLOTS, load_compound_index
+from json_to_csv import load_additional_data, set_id_of
+from main_functions import iter_json_sets, list_json_files
+from sqlite_store import PRESSURE_COLUMN, TEMPERATURE_COLUMN, set_records
+
+MEASUREMENTS_FILE = 'measurements.csv'
+CONDITIONS_FILE = 'conditions.csv'
+SETS_FILE = 'sets.csv'
+COMPOUNDS_FILE = 'compounds.csv'
+SCHEMA_FILE = 'schema.json'
+
+# The fact tables, laid out like the measurements and conditions tables of sqlite_store
+MEASUREMENT_COLUMNS = ['setid', 'row', 'temperature', 'pressure', 'value', 'uncertainty']
+CONDITION_COLUMNS = ['setid', 'row', 'name', 'value', 'uncertainty']
+FACT_DTYPES = {'setid': str, 'row': 'int32', 'name': 'category', 'temperature': 'float64', 'pressure': 'float64',
+               'value': 'float64', 'uncertainty': 'float64'}
+
+def compound_columns(slot):
+    """The per-compound metadata columns of a slot, which live in the compounds table: column -> attribute."""
+    return {f'smile {slot}': 'smiles', f'compound name {slot}': 'name'}
+
+# Metadata column -> (slot, compounds attribute) for every column moved out of the sets table
+MOVED_COLUMNS = {col: (slot, attribute) for slot in COMPOUND_SLOTS for col, attribute in compound_columns(slot).items()}
+
+def compound_table(compounds, compounds_csv_path='compounds.csv'):
+    """
+    The compounds table {id: {'name', 'smiles'}}: name and SMILES from compounds.csv, falling
+    back to the metadata CSV for ids that compounds.csv does not list.
+    """
+    index = load_compound_index(compounds_csv_path) if os.path.exists(compounds_csv_path) else None
+    table = {}
+    for compound_id in sorted(compounds):
+        entry = dict(compounds[compound_id])
+        if index is not None and compound_id in index.index:
+            for attribute in ('name', 'smiles'):
+                value = index.at[compound_id, attribute]
+                if isinstance(value, str):
+                    entry[attribute] = value
+        table[compound_id] = entry
+    return table
+
+def _compound_value(compounds, compound_id, attribute):
+    compound = compounds.get(compound_id)
+    return compound[attribute] if compound else ''
+
+def overrides_for(metadata, compounds):
+    """
+    The compound cells of a metadata row that the compounds table does not reproduce (e.g. rows
+    shifted by a stray comma), kept with the set so the wide view stays exact.
+    """
+    return {col: metadata[col] for col, (slot, attribute) in MOVED_COLUMNS.items()
+            if col in metadata and metadata[col] != _compound_value(compounds, metadata.get(f'compound id {slot}', ''), attribute)}
+
+def cell_text(value):
+    """A typed cell as the wide view writes it: the shortest repr, '298.15', '1000' or '' when missing."""
+    if value is None or value != value:
+        return ''
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+def _raw_text(item):
+    """The text json_to_csv writes for a data cell."""
+    cell = item[0] if isinstance(item, list) else item
+    return '' if cell is None else str(cell)
+
+def cell_values(columns, measurements, conditions):
+    """
+    The typed cells of one set laid out like its data rows (dhead order), from its measurements
+    rows and {(row, name): value} of its conditions. The last column is the measured value.
+    """
+    last = len(columns) - 1
+    slots = {TEMPERATURE_COLUMN: 2, PRESSURE_COLUMN: 3}
+    return [[row[4] if i == last else row[slots[name]] if name in slots else conditions.get((row[1], name))
+             for i, name in enumerate(columns)] for row in measurements]
+
+def export_star_schema(json_dir, metadata_csv, star_dir, compounds_csv_path='compounds.csv'):
+    """
+    Writes the sets of json_dir as typed tables in star_dir instead of per-set CSVs:
+    measurements.csv (setid, row, temperature, pressure, value and uncertainty of the measured
+    column), conditions.csv (the other state columns, one row per point and column), sets.csv
+    (file name, measured quantity, column order and the set-level metadata) and compounds.csv
+    (id, name, SMILES). Returns the number of sets written.
+    """
+    os.makedirs(star_dir, exist_ok=True)
+    additional_data = load_additional_data(metadata_csv)
+    metadata_columns = list(additional_data)
+    set_columns = [col for col in metadata_columns if col not in MOVED_COLUMNS]
+    json_files = list_json_files(json_dir)
+
+    set_rows, compounds = [], {}
+    with metrics.stage('export', files=len(json_files)) as record:
+        with open(os.path.join(star_dir, MEASUREMENTS_FILE), 'w', newline='') as mf, \
+                open(os.path.join(star_dir, CONDITIONS_FILE), 'w', newline='') as cf:
+            measurements_writer = csv.writer(mf, lineterminator='\n')
+            conditions_writer = csv.writer(cf, lineterminator='\n')
+            measurements_writer.writerow(MEASUREMENT_COLUMNS)
+            conditions_writer.writerow(CONDITION_COLUMNS)
+            loaded = iter_json_sets(json_files, data_dir=json_dir)
+            for json_file, (_, full_data) in tqdm(zip(json_files, loaded), total=len(json_files),
+                                                   desc=f"Exporting {json_dir}"):
+                if not isinstance(full_data.get('data'), list):
+                    logging.error(f"{json_file} does not contain the expected 'data' list")
+                    record['errors'] += 1
+                    continue
+                setid = set_id_of(json_file)
+                columns = [item[0] for item in full_data['dhead']]
+                records = set_records(setid, full_data, {})
+                measurements, conditions = (records[2], records[3]) if records else ([], [])
+                measurements_writer.writerows(measurements)
+                conditions_writer.writerows(conditions)
+                # Cells whose typed value does not print back as the raw text (exponents, text)
+                typed = cell_values(columns, measurements, {(row, name): value for _, row, name, value, _ in conditions})
+                cells = {f'{r}:{i}': _raw_text(item) for r, (raw_row, typed_row) in enumerate(zip(full_data['data'], typed))
+                         for i, (item, value) in enumerate(zip(raw_row, typed_row)) if _raw_text(item) != cell_text(value)}
+                metadata = {col: additional_data[col].get(setid, '') for col in metadata_columns}
+                set_rows.append((setid, os.path.splitext(json_file)[0], columns, metadata, cells))
+                for col, (slot, attribute) in MOVED_COLUMNS.items():
+                    compound_id = metadata.get(f'compound id {slot}')
+                    if compound_id:
+                        entry = compounds.setdefault(compound_id, {'name': '', 'smiles': ''})
+                        entry[attribute] = entry[attribute] or metadata.get(col, '')
+                record['rows'] += len(measurements)
+
+        # sets.csv is written once the compounds table is known, to find the cells it cannot reproduce
+        compounds = compound_table(compounds, compounds_csv_path)
+        with open(os.path.join(star_dir, COMPOUNDS_FILE), 'w', newline='') as cf:
+            writer = csv.writer(cf, lineterminator='\n')
+            writer.writerow(['id', 'name', 'smiles'])
+            writer.writerows([compound_id, entry['name'], entry['smiles']] for compound_id, entry in compounds.items())
+        with open(os.path.join(star_dir, SETS_FILE), 'w', newline='') as sf:
+            writer = csv.writer(sf, lineterminator='\n')
+            writer.writerow(['setid', 'file', 'quantity', 'columns'] + set_columns + ['overrides', 'cells'])
+            for setid, name, columns, metadata, cells in set_rows:
+                overrides = overrides_for(metadata, compounds)
+                writer.writerow([setid, name, columns[-1] if columns else '', json.dumps(columns)]
+                                + [metadata[col] for col in set_columns]
+                                + [json.dumps(overrides) if overrides else '', json.dumps(cells) if cells else ''])
+        with open(os.path.join(star_dir, SCHEMA_FILE), 'w') as f:
+            json.dump({'metadata_columns': metadata_columns}, f, indent=1)
+        record['bytes_written'] = sum(os.path.getsize(os.path.join(star_dir, name))
+                                      for name in (MEASUREMENTS_FILE, CONDITIONS_FILE, SETS_FILE, COMPOUNDS_FILE, SCHEMA_FILE))
+    return len(set_rows)
+
+def load_star_schema(star_dir):
+    """Reads the small tables of an export: (schema, {setid: sets row}, {compound id: compounds row})."""
+    with open(os.path.join(star_dir, SCHEMA_FILE), 'r') as f:
+        schema = json.load(f)
+    with open(os.path.join(star_dir, SETS_FILE), 'r', newline='') as f:
+        sets = {row['setid']: row for row in csv.DictReader(f)}
+    with open(os.path.join(star_dir, COMPOUNDS_FILE), 'r', newline='') as f:
+        compounds = {row['id']: row for row in csv.DictReader(f)}
+    return schema, sets, compounds
+
+def _metadata_value(entry, overrides, compounds, col):
+    if col not in MOVED_COLUMNS:
+        return entry[col]
+    if col in overrides:
+        return overrides[col]
+    slot, attribute = MOVED_COLUMNS[col]
+    return _compound_value(compounds, entry.get(f'compound id {slot}', ''), attribute)
+
+def _float(text):
+    return float(text) if text else None
+
+def _set_groups(path):
+    """Yields (setid, rows) of a fact table, whose rows are stored in sets.csv order."""
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        yield from groupby(reader, key=lambda row: row[0])
+
+def iter_wide_sets(star_dir, setids=None):
+    """
+    The wide per-set view, joined on demand: yields (file name without extension, header, rows)
+    laid out as json_to_csv writes them, for every set or only those in setids.
+    """
+    schema, sets, compounds = load_star_schema(star_dir)
+    measurement_groups = _set_groups(os.path.join(star_dir, MEASUREMENTS_FILE))
+    condition_groups = _set_groups(os.path.join(star_dir, CONDITIONS_FILE))
+    measurement_group, condition_group = next(measurement_groups, None), next(condition_groups, None)
+    # Sets without rows have no group
+    for setid, entry in sets.items():
+        measurements, conditions = [], []
+        if measurement_group is not None and measurement_group[0] == setid:
+            measurements = list(measurement_group[1])
+            measurement_group = next(measurement_groups, None)
+        if condition_group is not None and condition_group[0] == setid:
+            conditions = list(condition_group[1])
+            condition_group = next(condition_groups, None)
+        if setids is not None and setid not in setids:
+            continue
+        columns = json.loads(entry['columns'])
+        measurements = [[setid, int(row[1])] + [_float(text) for text in row[2:]] for row in measurements]
+        conditions = {(int(row[1]), row[2]): _float(row[3]) for row in conditions}
+        cells = json.loads(entry['cells']) if entry['cells'] else {}
+        overrides = json.loads(entry['overrides']) if entry['overrides'] else {}
+        metadata = [_metadata_value(entry, overrides, compounds, col) for col in schema['metadata_columns']]
+        rows = [[setid] + [cells.get(f'{r}:{i}', cell_text(value)) for i, value in enumerate(typed_row)] + metadata
+                for r, typed_row in enumerate(cell_values(columns, measurements, conditions))]
+        yield entry['file'], ['setid'] + columns + schema['metadata_columns'], rows
+
+def write_wide_csvs(star_dir, output_folder, setids=None):
+    """Writes the wide per-set CSVs (the density_csv_data layout) from an export. Returns the number written."""
+    os.makedirs(output_folder, exist_ok=True)
+    written = 0
+    for name, header, rows in iter_wide_sets(star_dir, setids):
+        with open(os.path.join(output_folder, f'{name}.csv'), 'w', newline='') as cf:
+            writer = csv.writer(cf)
+            writer.writerow(header)
+            writer.writerows(rows)
+        written += 1
+    return written
+
+def load_measurements(star_dir, with_conditions=False):
+    """
+    The measurements table with float64 columns and each set's property and measured quantity
+    as categoricals, ready to filter without parsing any cell; with_conditions also returns
+    the conditions table (setid, row, name, value, uncertainty).
+    """
+    _, sets, _ = load_star_schema(star_dir)
+    measurements = pd.read_csv(os.path.join(star_dir, MEASUREMENTS_FILE), dtype=FACT_DTYPES, keep_default_na=False,
+                               na_values=[''])
+    for col in ('property', 'quantity'):
+        measurements[col] = measurements['setid'].map({setid: entry.get(col, '') for setid, entry in sets.items()}).astype('category')
+    if not with_conditions:
+        return measurements
+    conditions = pd.read_csv(os.path.join(star_dir, CONDITIONS_FILE), dtype=FACT_DTYPES, keep_default_na=False,
+                             na_values=[''])
+    return measurements, conditions
+
+def wide_frame(star_dir, setids=None):
+    """The wide view of the requested sets as one DataFrame of strings (union of their columns)."""
+    frames = [pd.DataFrame(rows, columns=header, dtype=str) for _, header, rows in iter_wide_sets(star_dir, setids)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+if __name__ == "__main__":
+    # e.g. python star_schema.py density_json_data density_output.csv density_star
+    json_dir, metadata_csv, star_dir = (sys.argv[1:4] if len(sys.argv) > 3
+                                        else ('density_json_data', 'density_output.csv', 'density_star'))
+    print(f"Exported {export_star_schema(json_dir, metadata_csv, star_dir)} sets to {star_dir}")
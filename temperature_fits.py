@@ -0,0 +1,184 @@
+import os
+import sys
+import csv
+import time
+from math import comb
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from value_parser import parse_values
+
+TEMPERATURE_COLUMN = 'Temperature, K'
+
+# Coefficients are stored for powers of (T - T_REF)
+T_REF = 298.15
+
+def load_set_points(csv_dir, temperature_column=TEMPERATURE_COLUMN):
+    """
+    Reads the temperature and measured value of every row of the per-set CSVs in csv_dir
+    (density_csv_data, refindex_csv_data, ...). The measured value is the last data column,
+    the one before 'reference'. The other data columns (pressure, composition, ...) are kept
+    as a 'conditions' string, so a set measured at several pressures gives one temperature
+    series per pressure. Sets without a temperature column are skipped.
+    """
+    setids, conditions, temperatures, values = [], [], [], []
+    for name in tqdm(sorted(f for f in os.listdir(csv_dir) if f.endswith('.csv')), desc=f"Reading {csv_dir}"):
+        with open(os.path.join(csv_dir, name), 'r', newline='') as cf:
+            reader = csv.reader(cf)
+            header = next(reader, None)
+            if not header or temperature_column not in header or 'reference' not in header:
+                continue
+            t_index = header.index(temperature_column)
+            v_index = header.index('reference') - 1
+            others = [i for i in range(1, v_index) if i != t_index]
+            for row in reader:
+                setids.append(row[0])
+                conditions.append('; '.join(f'{header[i]}={row[i]}' for i in others if row[i]))
+                temperatures.append(row[t_index])
+                values.append(row[v_index])
+    return pd.DataFrame({'setid': setids, 'conditions': conditions,
+                         'temperature': parse_values(temperatures), 'value': parse_values(values)})
+
+def _to_reference_basis(b, mean, scale, t_ref):
+    """Rewrites sum b_k ((T - mean) / scale)^k as sum c_j (T - t_ref)^j, for all groups at once."""
+    delta = mean - t_ref
+    c = np.zeros_like(b)
+    for k in range(b.shape[1]):
+        term = b[:, k] / scale ** k
+        for j in range(k + 1):
+            c[:, j] += term * comb(k, j) * (-delta) ** (k - j)
+    return c
+
+def fit_groups(codes, temperatures, values, degree=1, t_ref=T_REF):
+    """
+    Least-squares polynomial fits of values against temperature for every group code at once.
+    Each group is centred and scaled, its power sums are accumulated with one pass per power,
+    and the normal equations of all groups are solved in one batched call. Groups with fewer
+    than degree + 1 distinct temperatures are left as NaN.
+    Returns a dict of per-group arrays: n, t_min, t_max, coefficients (n_groups x degree+1,
+    for powers of T - t_ref), rmse and max_residual.
+    """
+    if not len(codes):
+        # np.add.reduceat cannot take the start index 0 of an empty array
+        empty = np.empty(0)
+        return {'n': np.zeros(0, dtype=np.int64), 't_min': empty, 't_max': empty,
+                'coefficients': np.empty((0, degree + 1)), 'rmse': empty, 'max_residual': empty}
+    order = np.lexsort((temperatures, codes))
+    codes, t, y = codes[order], temperatures[order], values[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    group_ids = codes[starts]
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    # Position of each row's group in starts
+    row_group = np.cumsum(np.r_[False, codes[1:] != codes[:-1]])
+
+    n = np.diff(np.r_[starts, len(codes)])
+    t_min, t_max = t[starts], t[np.r_[starts[1:], len(codes)] - 1]
+    distinct = np.add.reduceat(np.r_[True, (t[1:] != t[:-1]) | (codes[1:] != codes[:-1])].astype(np.int64), starts)
+    mean = np.add.reduceat(t, starts) / n
+    scale = np.where(t_max > t_min, (t_max - t_min) / 2, 1.0)
+
+    w = (t - mean[row_group]) / scale[row_group]
+    powers = w[:, None] ** np.arange(2 * degree + 1)
+    moments = np.add.reduceat(powers, starts, axis=0)
+    rhs = np.add.reduceat(powers[:, :degree + 1] * y[:, None], starts, axis=0)
+    exponents = np.add.outer(np.arange(degree + 1), np.arange(degree + 1))
+    gram = moments[:, exponents]
+
+    ok = distinct > degree
+    b = np.full((len(starts), degree + 1), np.nan)
+    if ok.any():
+        b[ok] = np.linalg.solve(gram[ok], rhs[ok][..., None])[..., 0]
+    residuals = y - np.einsum('ij,ij->i', powers[:, :degree + 1], b[row_group])
+    rmse = np.sqrt(np.add.reduceat(residuals ** 2, starts) / n)
+    max_residual = np.maximum.reduceat(np.abs(residuals), starts)
+
+    result = {
+        'n': n, 't_min': t_min, 't_max': t_max,
+        'coefficients': _to_reference_basis(b, mean, scale, t_ref),
+        'rmse': np.where(ok, rmse, np.nan), 'max_residual': np.where(ok, max_residual, np.nan),
+    }
+    # Scatter back so that row i of every array belongs to group code i
+    for key, array in result.items():
+        full = np.full((n_groups,) + array.shape[1:], np.nan if array.dtype.kind == 'f' else 0, dtype=array.dtype)
+        full[group_ids] = array
+        result[key] = full
+    return result
+
+def fit_temperature_dependence(points, degree=1, t_ref=T_REF):
+    """
+    Fits value = c0 + c1 (T - t_ref) + ... + c_degree (T - t_ref)^degree for every
+    (setid, conditions) series of points (see load_set_points). Returns the coefficient
+    table: setid, conditions, n_points, t_min, t_max, c0..c<degree>, rmse, max_residual.
+    Series that cannot be fitted (too few distinct temperatures) are left out, and points
+    without a finite temperature and value (e.g. a property with no temperature column)
+    give an empty table.
+    """
+    points = points[np.isfinite(points['temperature']) & np.isfinite(points['value'])]
+    if points.empty:
+        columns = ['setid', 'conditions', 'n_points', 't_min', 't_max'] + [f'c{k}' for k in range(degree + 1)] + ['rmse', 'max_residual']
+        return pd.DataFrame(columns=columns)
+    keys = points['setid'] + '\x00' + points['conditions']
+    codes, uniques = pd.factorize(keys)
+    fits = fit_groups(codes.astype(np.int64), points['temperature'].to_numpy(),
+                      points['value'].to_numpy(), degree, t_ref)
+    setids, conditions = zip(*(key.split('\x00', 1) for key in uniques)) if len(uniques) else ((), ())
+    table = pd.DataFrame({'setid': setids, 'conditions': conditions, 'n_points': fits['n'],
+                          't_min': fits['t_min'], 't_max': fits['t_max']})
+    for k in range(degree + 1):
+        table[f'c{k}'] = fits['coefficients'][:, k]
+    table['rmse'] = fits['rmse']
+    table['max_residual'] = fits['max_residual']
+    return table[table['c0'].notna()].sort_values(['setid', 'conditions']).reset_index(drop=True)
+
+def fit_csv_dir(csv_dir, output_csv, degree=1, t_ref=T_REF):
+    """Fits every set of csv_dir and writes the coefficient table keyed by setid to output_csv."""
+    table = fit_temperature_dependence(load_set_points(csv_dir), degree, t_ref)
+    table.to_csv(output_csv, index=False)
+    return table
+
+def load_fit_table(path):
+    """Reads a coefficient table written by fit_csv_dir (sets without conditions keep an empty string)."""
+    return pd.read_csv(path, dtype={'setid': str, 'conditions': str}, keep_default_na=False)
+
+def evaluate_fit(row, temperatures, t_ref=T_REF):
+    """The fitted values of one coefficient table row at temperatures."""
+    coefficients = []
+    while f'c{len(coefficients)}' in row:
+        coefficients.append(row[f'c{len(coefficients)}'])
+    return np.polynomial.polynomial.polyval(np.asarray(temperatures, dtype='float64') - t_ref, coefficients)
+
+def loop_fit(points, degree=1, t_ref=T_REF):
+    """Reference implementation: np.polyfit in a Python loop over the series, for the benchmark."""
+    rows = []
+    for (setid, conditions), group in points.dropna(subset=['temperature', 'value']).groupby(['setid', 'conditions'], sort=True):
+        if group['temperature'].nunique() <= degree:
+            continue
+        coefficients = np.polyfit(group['temperature'] - t_ref, group['value'], degree)[::-1]
+        rows.append([setid, conditions, *coefficients])
+    return pd.DataFrame(rows, columns=['setid', 'conditions'] + [f'c{k}' for k in range(degree + 1)])
+
+if __name__ == "__main__":
+    # e.g. python temperature_fits.py density_csv_data density-fits.csv 2
+    csv_dir = sys.argv[1] if len(sys.argv) > 1 else 'density_csv_data'
+    output_csv = sys.argv[2] if len(sys.argv) > 2 else f"{csv_dir.replace('_csv_data', '')}-fits.csv"
+    degree = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    points = load_set_points(csv_dir)
+    start = time.perf_counter()
+    table = fit_temperature_dependence(points, degree)
+    batch = time.perf_counter() - start
+    table.to_csv(output_csv, index=False)
+    start = time.perf_counter()
+    reference = loop_fit(points, degree)
+    looped = time.perf_counter() - start
+    # Compare the fitted curves at both ends of each series; coefficients that are zero in
+    # exact arithmetic make a relative comparison of the coefficients themselves meaningless
+    merged = table.merge(reference, on=['setid', 'conditions'], suffixes=('', '_loop'))
+    worst = 0.0
+    for end in ('t_min', 't_max'):
+        x = merged[end].to_numpy() - T_REF
+        batch_values = sum(merged[f'c{k}'].to_numpy() * x ** k for k in range(degree + 1))
+        loop_values = sum(merged[f'c{k}_loop'].to_numpy() * x ** k for k in range(degree + 1))
+        if len(merged):
+            worst = max(worst, float(np.max(np.abs(batch_values - loop_values) / np.maximum(np.abs(loop_values), 1e-12))))
+    print(f"{len(points)} points, {len(table)} series fitted (degree {degree}) -> {output_csv}")
+    print(f"batch {batch:.2f} s, polyfit loop {looped:.2f} s ({looped / batch:.0f}x), largest relative difference {worst:.1e}")
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+def set_json(setid, temperatures=(298.15, 308.15), values=(1000.0, 995.0), components=None):
+    """A small set JSON shaped like the ILThermo ones."""
+    return {
+        'dhead': [['Temperature, K'], ['Pressure, kPa'], ['Specific density, kg/m<SUP>3</SUP>', 'Liquid']],
+        'data': [[[str(t)], ['101.325'], [str(v), '0.5']] for t, v in zip(temperatures, values)],
+        'components': components or [{'idout': 'AAAAA', 'name': 'water', 'mw': '18.015', 'formula': 'H<SUB>2</SUB>O', 'sample': []}],
+        'ref': {'full': f'Reference of {setid}'},
+    }
+
+@pytest.fixture
+def json_dir(tmp_path):
+    """A folder of three set files named the way the fetchers save them."""
+    folder = tmp_path / 'json'
+    folder.mkdir()
+    for i, setid in enumerate(['Aa001', 'Bb002', 'Cc003']):
+        with open(folder / f'density_setid_{setid}.json', 'w') as f:
+            json.dump(set_json(setid, values=(1000.0 + i, 995.0 + i)), f)
+    return folder
+
+@pytest.fixture
+def pipeline_corpus(json_dir, tmp_path, monkeypatch):
+    """The three sets of json_dir laid out as the NmYB property, with the working directory at tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('idsets')
+    header = ['setid', 'ref', 'prp', 'phases', 'cmp1', 'cmp2', 'cmp3', 'np', 'nm1', 'nm2', 'nm3']
+    with open(os.path.join('idsets', 'melting-temperature-idset.json'), 'w') as f:
+        json.dump({'header': header, 'res': [[setid, 'ref', 'Density', 'Liquid', 'AAAAA', '', '', 2, 'water', '', '']
+                                             for setid in ('Aa001', 'Bb002', 'Cc003')]}, f)
+    shutil.copytree(json_dir, 'meltingtemp_json_data')
+    with open('compounds.csv', 'w') as f:
+        f.write('id,name,smiles\nAAAAA,water,O\n')
+    return tmp_path
+
+@pytest.fixture
+def stub_server():
+    """
+    stub_server(json_dir, validators=True) serves the set files of json_dir at /ilset?set=<setid>
+    the way ILThermo does and returns its base_url. With validators the responses carry ETag and
+    Last-Modified and conditional requests get 304; without, every request gets the full 200.
+    The servers are shut down after the test.
+    """
+    servers = []
+
+    def serve(json_dir, validators=True):
+        files = {name[:-len('.json')].split('_')[-1]: os.path.join(json_dir, name)
+                 for name in os.listdir(json_dir) if name.endswith('.json')}
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the fetcher's pooled session expects; headers and body go out without Nagle delays
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = files.get(self.path.rpartition('=')[2])
+                if path is None:
+                    self.send_error(404)
+                    return
+                with open(path, 'rb') as f:
+                    body = f.read()
+                etag = f'"{hashlib.sha256(body).hexdigest()}"'
+                if validators and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if validators:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', formatdate(os.path.getmtime(path), usegmt=True))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}/ilset?set='
+
+    yield serve
+    for server in servers:
+        server.shutdown()
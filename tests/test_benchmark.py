@@ -0,0 +1,29 @@
+import json
+from benchmark import check_regressions, main
+
+def timing(seconds):
+    return {'seconds': seconds, 'files': 10, 'files_per_s': 10 / seconds}
+
+def test_check_regressions_flags_only_slowdowns_beyond_the_tolerance():
+    baseline = {'stages': {'convert': timing(1.0), 'merge': timing(1.0)}}
+    results = {'convert': timing(1.6), 'merge': timing(1.4), 'new_stage': timing(9.0)}
+    failures = check_regressions(results, baseline, 1.5)
+    assert len(failures) == 1 and failures[0].startswith('convert:')
+    assert check_regressions(results, {}, 1.5) == []
+
+def test_main_returns_1_on_a_regression(tmp_path):
+    root, first, second = tmp_path / 'corpus', tmp_path / 'first.json', tmp_path / 'second.json'
+    args = ['--root', str(root), '--sets', '20', '--repeat', '1']
+    assert main(args + ['--output', str(first)]) == 0
+    with open(first) as f:
+        report = json.load(f)
+    assert report['stages'] and all(stage['seconds'] > 0 for stage in report['stages'].values())
+
+    # A baseline 100 times faster than this run makes every stage a regression
+    for stage in report['stages'].values():
+        stage['seconds'] /= 100
+    baseline = tmp_path / 'baseline.json'
+    with open(baseline, 'w') as f:
+        json.dump(report, f)
+    assert main(args + ['--output', str(second), '--baseline', str(baseline)]) == 1
+    assert main(args + ['--output', str(second), '--baseline', str(baseline), '--tolerance', '1e6']) == 0
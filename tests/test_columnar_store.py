@@ -0,0 +1,65 @@
+import os
+import pandas as pd
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+from columnar_store import read_store, write_store
+
+DENSITY = 'Specific density, kg/m<SUP>3</SUP>'
+
+def measurements(setid, values, temperatures=(298.15, 308.15), **extra):
+    """Rows shaped like the density_dataN.csv shards, with value±uncertainty cells."""
+    return pd.DataFrame({
+        'setid': setid,
+        'Temperature, K': [str(t) for t in temperatures],
+        DENSITY: [f'{v}±0.5' for v in values],
+        'reference': f'Reference of {setid}',
+        'propertiy': 'Density',
+        'compound id 1': 'AAAAA',
+        **extra,
+    })
+
+def common_schema(store_root):
+    return pq.read_schema(os.path.join(store_root, '_common_metadata'))
+
+def test_round_trip_with_property_and_setid_filters(tmp_path):
+    root = str(tmp_path / 'store')
+    assert write_store(pd.concat([measurements('Aa001', (1000.0, 995.0)), measurements('Bb002', (900.0, 890.0))]), root) == 2
+    refindex = pd.DataFrame({'setid': 'Cc003', 'Temperature, K': ['298.15'], 'Refractive index n': ['1.42']})
+    write_store(refindex, root, 'Refractive index')
+
+    density = read_store(root, filters=[('property', '=', 'Density')])
+    assert sorted(density['setid'].unique()) == ['Aa001', 'Bb002']
+    assert density[DENSITY].dtype == 'float64' and density[DENSITY + ' uncertainty'].eq(0.5).all()
+    assert isinstance(density['reference'].dtype, pd.CategoricalDtype)
+
+    one = read_store(root, columns=['setid', 'Temperature, K', DENSITY], filters=[('setid', '=', 'Bb002')])
+    assert list(one.columns) == ['setid', 'Temperature, K', DENSITY]
+    assert sorted(one[DENSITY]) == [890.0, 900.0]
+    assert read_store(root, filters=[('property', '=', 'Refractive index')])['Refractive index n'].tolist() == [1.42]
+
+def test_rewriting_a_changed_set_replaces_its_rows(tmp_path):
+    root = str(tmp_path / 'store')
+    write_store(pd.concat([measurements('Aa001', (1000.0, 995.0)), measurements('Bb002', (900.0, 890.0))]), root)
+    write_store(measurements('Aa001', (1001.0, 996.0, 991.0), temperatures=(298.15, 308.15, 318.15)), root)
+    table = read_store(root, filters=[('setid', '=', 'Aa001')])
+    assert sorted(table[DENSITY]) == [991.0, 996.0, 1001.0]
+    assert len(read_store(root, filters=[('setid', '=', 'Bb002')])) == 2
+
+def test_common_metadata_follows_a_widening_schema(tmp_path):
+    root = str(tmp_path / 'store')
+    write_store(measurements('Aa001', (1000.0, 995.0)), root)
+    assert 'Pressure, kPa' not in common_schema(root).names
+    write_store(measurements('Bb002', (900.0, 890.0), **{'Pressure, kPa': ['101.325', '200.0'], 'compound id 2': 'BBBBB'}), root)
+
+    schema = common_schema(root)
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.endswith('.parquet'):
+                # Every file's columns are in the dataset schema, with the same type
+                for field in pq.read_schema(os.path.join(folder, name)):
+                    assert schema.field(field.name).type == field.type
+    table = read_store(root).set_index('setid')
+    assert table.loc['Bb002', 'Pressure, kPa'].tolist() == [101.325, 200.0]
+    assert table.loc['Aa001', 'Pressure, kPa'].isna().all()
+    assert table.loc['Bb002', 'compound id 2'].tolist() == ['BBBBB', 'BBBBB']
@@ -0,0 +1,14 @@
+import components
+from components import component_table, extract_components
+
+def test_extract_lists_each_directory_once(json_dir, monkeypatch):
+    listed = []
+    list_json_files = components.list_json_files
+    monkeypatch.setattr(components, 'list_json_files', lambda folder: listed.append(folder) or list_json_files(folder))
+    found = extract_components([str(json_dir)], processes=1, chunk_size=1)
+    assert listed == [str(json_dir)]
+    assert found == {'AAAAA': {('water', '18.015', 'H<SUB>2</SUB>O'): 3}}
+
+    table = component_table(found)
+    assert table.loc[0, 'formula'] == 'H2O' and table.loc[0, 'n_sets'] == 3
+    assert (table.loc[0, 'H'], table.loc[0, 'O']) == (2, 1)
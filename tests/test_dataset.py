@@ -0,0 +1,14 @@
+from dataset import ILThermoDataset
+
+def test_cached_tables_are_not_changed_through_returned_copies(json_dir):
+    dataset = ILThermoDataset(json_dir=str(json_dir), cache_size=2)
+    first = dataset['Aa001']
+    first['Temperature, K'] = 0.0
+    first.drop(columns='Pressure, kPa', inplace=True)
+    again = dataset['Aa001']
+    assert list(again['Temperature, K']) == [298.15, 308.15] and 'Pressure, kPa' in again
+    assert dataset.cache_info()['hits'] == 1
+
+    for setid, table in dataset.iter_sets(['Aa001']):
+        table['Temperature, K'] = 0.0
+    assert list(dataset['Aa001']['Temperature, K']) == [298.15, 308.15]
@@ -0,0 +1,106 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from compound_index import clear_compound_index, lookup_smiles
+from enrichment import enrich_shards, enrich_with_metadata, load_setid_metadata, read_measurements
+
+METADATA_COLUMNS = ['setid', 'reference', 'property', 'phases', 'compound id 1', 'compound name 1',
+                    'compound id 2', 'compound name 2']
+COMPOUNDS = {f'C{i:03d}': f'SMILES{i}' for i in range(20)}
+
+@pytest.fixture(autouse=True)
+def fresh_compound_index():
+    clear_compound_index()
+    yield
+    clear_compound_index()
+
+@pytest.fixture
+def corpus(tmp_path):
+    """200 synthetic sets split over two shards, their metadata table and compounds.csv."""
+    rng = random.Random(0)
+    metadata = []
+    for i in range(200):
+        first, second = rng.sample(sorted(COMPOUNDS), 2)
+        metadata.append([f'S{i:04d}', f'Author {i % 7} (20{i % 20:02d})', 'Density', 'Liquid',
+                         first, f'name of {first}', second if i % 3 else '', f'name of {second}' if i % 3 else ''])
+    metadata = pd.DataFrame(metadata, columns=METADATA_COLUMNS)
+    output_csv = tmp_path / 'output.csv'
+    metadata.to_csv(output_csv, index=False)
+    pd.DataFrame({'id': list(COMPOUNDS), 'smiles': list(COMPOUNDS.values())}).to_csv(tmp_path / 'compounds.csv', index=False)
+
+    shards = []
+    for n, setids in enumerate((metadata['setid'][:120], metadata['setid'][120:]), start=1):
+        rows = [[setid, 290.0 + k, 1000.5 - k / 4] + [''] * (len(METADATA_COLUMNS) - 1)
+                for setid in setids for k in range(rng.randint(1, 4))]
+        shard = pd.DataFrame(rows, columns=['setid', 'Temperature, K', 'density'] + METADATA_COLUMNS[1:])
+        path = tmp_path / f'density_data{n}.csv'
+        shard.to_csv(path, index=False)
+        shards.append(str(path))
+    return str(output_csv), shards, metadata, str(tmp_path / 'compounds.csv')
+
+def expected_shard(path, metadata):
+    """The row-by-row result: each row takes the metadata and SMILES of its setid."""
+    shard = pd.read_csv(path, dtype=str, keep_default_na=False)
+    rows = metadata.set_index('setid')
+    for col in METADATA_COLUMNS[1:]:
+        shard[col] = [rows.at[setid, col] for setid in shard['setid']]
+    for slot in (1, 2):
+        shard[f'smile {slot}'] = [COMPOUNDS.get(i, '') for i in shard[f'compound id {slot}']]
+    return shard
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_enrich_shards_matches_row_by_row(corpus, compact):
+    output_csv, shards, metadata, compounds_csv = corpus
+    expected = {path: expected_shard(path, metadata) for path in shards}
+    enrich_shards(output_csv, shards, compounds_csv_path=compounds_csv, compact=compact)
+    for path in shards:
+        written = pd.read_csv(path, dtype=str, keep_default_na=False)
+        pd.testing.assert_frame_equal(written, expected[path][written.columns], check_dtype=False)
+        assert list(written.columns[-2:]) == ['smile 1', 'smile 2']
+
+def test_enrich_leaves_unknown_setids_alone(corpus):
+    output_csv, _, _, _ = corpus
+    metadata = load_setid_metadata(output_csv)
+    measurements = pd.DataFrame({'setid': ['S0001', 'missing', 'S0001'], 'reference': ['old', 'kept', 'old']})
+    enrich_with_metadata(measurements, metadata)
+    assert measurements['reference'].tolist() == [metadata.at['S0001', 'reference'], 'kept', metadata.at['S0001', 'reference']]
+
+def test_compact_and_string_modes_write_identical_csvs(corpus, tmp_path):
+    output_csv, shards, _, compounds_csv = corpus
+    originals = {}
+    for path in shards:
+        with open(path, 'rb') as f:
+            originals[path] = f.read()
+    written = {}
+    for compact in (False, True):
+        for path, body in originals.items():
+            with open(path, 'wb') as f:
+                f.write(body)
+        enrich_shards(output_csv, shards, compounds_csv_path=compounds_csv, compact=compact)
+        for path in shards:
+            with open(path, 'rb') as f:
+                written[(path, compact)] = f.read()
+    for path in shards:
+        assert written[(path, True)] == written[(path, False)]
+
+def test_categorical_lookup_matches_object_lookup(corpus):
+    _, _, _, compounds_csv = corpus
+    ids = pd.Series(['C001', 'unknown', None, 'C001', 'C019', 'C002'])
+    plain = lookup_smiles(ids, compounds_csv)
+    compact = lookup_smiles(ids.astype('category'), compounds_csv)
+    assert isinstance(compact.dtype, pd.CategoricalDtype)
+    assert compact.astype(object).where(compact.notna(), None).tolist() == plain.tolist()
+    assert plain.tolist() == ['SMILES1', None, None, 'SMILES1', 'SMILES19', 'SMILES2']
+
+def test_read_measurements_compact(corpus):
+    _, shards, _, _ = corpus
+    strings = read_measurements(shards, compact=False)
+    compact = read_measurements(shards, compact=True)
+    # The shards' categories are unified, so the concatenated columns stay categorical
+    assert isinstance(compact['setid'].dtype, pd.CategoricalDtype)
+    assert compact['Temperature, K'].dtype == np.float32
+    # Downcasting is lossless: every value prints as it did at float64
+    assert compact['density'].astype(str).tolist() == strings['density'].astype(str).tolist()
+    assert compact['setid'].astype(str).tolist() == strings['setid'].tolist()
+    assert compact.memory_usage(deep=True).sum() < strings.memory_usage(deep=True).sum()
@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+import pytest
+import http_cache
+import install_all_jsons
+from install_all_jsons import fetch_and_save_data_concurrent, get_setid_list
+
+SETIDS = ['Aa001', 'Bb002', 'Cc003']
+
+def mtimes(folder):
+    return {name: os.stat(os.path.join(folder, name)).st_mtime_ns for name in os.listdir(folder)}
+
+def cached_files(cache_dir, suffix):
+    return [name for _, _, names in os.walk(cache_dir) for name in names if name.endswith(suffix)]
+
+@pytest.fixture
+def fetcher(json_dir, tmp_path, stub_server):
+    """fetcher(validators) returns a function that fetches SETIDS from a stub server into tmp_path/out through one cache."""
+    def make(validators=True):
+        base_url = stub_server(str(json_dir), validators)
+        cache = http_cache.HttpCache(str(tmp_path / 'cache'))
+        return lambda: fetch_and_save_data_concurrent('density', SETIDS, str(tmp_path / 'out'), max_workers=2, base_url=base_url, cache=cache)
+
+    return make
+
+def test_revalidation_keeps_files_and_stores_no_second_body(fetcher, tmp_path):
+    fetch = fetcher()
+    first = fetch()
+    assert first['cache']['new'] == 3 and first['bytes'] > 0
+    before = mtimes(tmp_path / 'out')
+
+    second = fetch()
+    assert second['cache']['not_modified'] == 3 and second['cache']['bytes_downloaded'] == 0
+    assert second['bytes'] == 0 and second['files'] == 3
+    assert mtimes(tmp_path / 'out') == before
+    # The saved set files are the cached bodies
+    assert len(cached_files(tmp_path / 'cache', '.json')) == 3
+    assert cached_files(tmp_path / 'cache', '.body') == []
+
+def test_server_without_validators_is_compared_by_hash(fetcher, json_dir, tmp_path):
+    fetch = fetcher(validators=False)
+    fetch()
+    before = mtimes(tmp_path / 'out')
+    second = fetch()
+    assert second['cache']['unchanged'] == 3 and second['bytes'] == 0
+    assert mtimes(tmp_path / 'out') == before
+
+    with open(json_dir / 'density_setid_Bb002.json') as f:
+        data = json.load(f)
+    data['data'][0][2][0] = '999.0'
+    with open(json_dir / 'density_setid_Bb002.json', 'w') as f:
+        json.dump(data, f)
+    third = fetch()
+    assert third['cache']['changed'] == 1 and third['cache']['unchanged'] == 2
+    with open(tmp_path / 'out' / 'density_setid_Bb002.json') as f:
+        assert json.load(f) == data
+
+def test_edited_file_is_refetched_not_served_from_validators(fetcher, tmp_path):
+    fetch = fetcher()
+    fetch()
+    path = tmp_path / 'out' / 'density_setid_Aa001.json'
+    with open(path) as f:
+        original = json.load(f)
+    with open(path, 'w') as f:
+        f.write('{"data": []}')
+    summary = fetch()
+    assert summary['cache']['changed'] == 1 and summary['cache']['not_modified'] == 2
+    with open(path) as f:
+        assert json.load(f) == original
+
+def test_idset_body_that_is_not_json_is_evicted_and_refetched(tmp_path, monkeypatch, stub_server):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('idsets')
+    served = tmp_path / 'served'
+    served.mkdir()
+    body = json.dumps({'header': ['setid'], 'res': [['Aa001'], ['Bb002']]}).encode('utf-8')
+    with open(served / 'idset_JkYu.json', 'wb') as f:
+        f.write(body)
+    monkeypatch.setattr(install_all_jsons, 'url_for_get_all', stub_server(str(served)).replace('set=', 'prp='))
+    cache = http_cache.HttpCache(str(tmp_path / 'cache'))
+    # An error page cached under the idset's current ETag, so the server answers 304 to it
+    cache.store(f'{install_all_jsons.url_for_get_all}JkYu', {'ETag': f'"{hashlib.sha256(body).hexdigest()}"'}, b'<html>Busy</html>')
+    delta = get_setid_list(['density', 'JkYu'], cache=cache)
+    assert delta['added'] == ['Aa001', 'Bb002']
+    assert cache.snapshot()['not_modified'] == 1 and cache.snapshot()['new'] == 1
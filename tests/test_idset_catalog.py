@@ -0,0 +1,63 @@
+import os
+import time
+import json
+import pytest
+from idset_catalog import diff_idsets, diff_latest, ensure_baseline, idset_path, list_snapshots, save_snapshot
+
+HEADER = ['setid', 'ref', 'prp', 'phases', 'cmp1', 'cmp2', 'cmp3', 'np', 'nm1', 'nm2', 'nm3']
+
+def idset(*rows):
+    return {'header': HEADER, 'res': [list(row) for row in rows]}
+
+def row(setid, ref='Smith 2001', points=10, name='water'):
+    return [setid, ref, 'JkYu', 'Liquid', 'AAAAA', '', '', points, name, '', '']
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """The catalog paths are relative to the working directory."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('idsets')
+
+def test_diff_idsets_sorts_changes_into_metadata_and_data():
+    old = idset(row('Aa001'), row('Bb002'), row('Cc003'), row('Dd004'))
+    new = idset(row('Aa001'), row('Bb002', ref='Smith 2002', name='H2O'), row('Cc003', points=12), row('Ee005'))
+    delta = diff_idsets(old, new)
+    assert delta['added'] == ['Ee005']
+    assert delta['removed'] == ['Dd004']
+    assert delta['changed'] == {'Bb002': ['ref', 'nm1'], 'Cc003': ['np']}
+    # A new reference or compound name only needs the metadata rebuilt
+    assert delta['refetch'] == ['Cc003']
+
+def test_diff_idsets_without_header_uses_the_default_columns():
+    old = {'res': [row('Aa001')]}
+    new = {'res': [row('Aa001', points=11)]}
+    assert diff_idsets(old, new)['refetch'] == ['Aa001']
+    assert diff_idsets({}, new)['added'] == ['Aa001']
+
+def test_save_snapshot_stores_only_new_responses():
+    first = save_snapshot('density', idset(row('Aa001')), '20240101T000000Z')
+    assert save_snapshot('density', idset(row('Aa001')), '20240102T000000Z') == first
+    second = save_snapshot('density', idset(row('Aa001'), row('Bb002')), '20240101T000000Z')
+    assert second.endswith('20240101T000000Z-1.json')
+    assert list_snapshots('density') == [first, second]
+    with open(idset_path('density')) as f:
+        assert [r[0] for r in json.load(f)['res']] == ['Aa001', 'Bb002']
+
+def test_diff_latest_compares_the_last_two_snapshots():
+    assert diff_latest('density') is None
+    save_snapshot('density', idset(row('Aa001')), '20240101T000000Z')
+    assert diff_latest('density')['added'] == ['Aa001']
+    save_snapshot('density', idset(row('Aa001', points=11), row('Bb002')), '20240102T000000Z')
+    delta = diff_latest('density')
+    assert delta['added'] == ['Bb002'] and delta['refetch'] == ['Aa001']
+
+def test_ensure_baseline_adopts_an_existing_idset_once():
+    with open(idset_path('density'), 'w') as f:
+        json.dump(idset(row('Aa001')), f)
+    stamp = time.mktime((2023, 5, 1, 12, 0, 0, 0, 0, -1))
+    os.utime(idset_path('density'), (stamp, stamp))
+    ensure_baseline('density')
+    ensure_baseline('density')
+    snapshots = list_snapshots('density')
+    assert len(snapshots) == 1 and os.path.basename(snapshots[0]).startswith('2023050')
+    assert diff_latest('density')['added'] == ['Aa001']
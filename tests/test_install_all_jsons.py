@@ -0,0 +1,24 @@
+import os
+import json
+from install_all_jsons import fetch_and_save_data_concurrent
+
+def test_concurrent_fetch_against_stub(json_dir, tmp_path, stub_server):
+    base_url = stub_server(str(json_dir), validators=False)
+    out = tmp_path / 'out'
+    results = {}
+    summary = fetch_and_save_data_concurrent('density', ['Aa001', 'Bb002', 'Cc003', 'Zz999'], str(out), max_workers=2,
+                                             base_url=base_url, on_result=lambda setid, body, error: results.update({setid: error}))
+    assert summary['files'] == 3 and summary['failed'] == ['Zz999']
+    assert results['Zz999'] is not None and results['Aa001'] is None
+    for setid in ('Aa001', 'Bb002', 'Cc003'):
+        with open(out / f'density_setid_{setid}.json') as f, open(json_dir / f'density_setid_{setid}.json') as g:
+            assert json.load(f) == json.load(g)
+
+def test_write_error_fails_only_that_set(json_dir, tmp_path, stub_server):
+    out = tmp_path / 'out'
+    # A directory where the file should go makes the write raise IsADirectoryError
+    os.makedirs(out / 'density_setid_Bb002.json')
+    summary = fetch_and_save_data_concurrent('density', ['Aa001', 'Bb002', 'Cc003'], str(out), max_workers=2,
+                                             base_url=stub_server(str(json_dir), validators=False))
+    assert summary['failed'] == ['Bb002']
+    assert summary['files'] == 2 and os.path.isfile(out / 'density_setid_Cc003.json')
@@ -0,0 +1,27 @@
+import os
+import sys
+import subprocess
+import pytest
+import json_backend
+from main_functions import read_json_file
+from conftest import REPO
+
+def test_unknown_backend_in_the_environment_fails_at_import():
+    result = subprocess.run([sys.executable, '-c', 'import json_backend'], cwd=REPO, capture_output=True, text=True,
+                            env={**os.environ, 'ILTHERMO_JSON_BACKEND': 'simplejson'})
+    assert result.returncode != 0
+    assert "JSON backend 'simplejson' is not installed, available:" in result.stderr
+    assert ', '.join(json_backend.BACKENDS) in result.stderr
+
+def test_read_json_file_only_hides_file_errors(json_dir, monkeypatch):
+    (json_dir / 'broken.json').write_text('{"data": [')
+    assert read_json_file(str(json_dir / 'broken.json')) == {}
+    assert read_json_file(str(json_dir / 'missing.json')) == {}
+    assert read_json_file(str(json_dir / 'density_setid_Aa001.json'))['dhead']
+
+    def broken_backend(data):
+        raise RuntimeError('decoder crashed')
+
+    monkeypatch.setitem(json_backend.BACKENDS, json_backend.get_backend(), broken_backend)
+    with pytest.raises(RuntimeError):
+        read_json_file(str(json_dir / 'density_setid_Aa001.json'))
@@ -0,0 +1,36 @@
+import os
+import csv
+from json_pack import clear_pack_readers, open_pack, pack_dir
+from main_functions import convert_json_files_scheduled, list_json_files, order_by_size
+
+def read_rows(paths):
+    rows = []
+    for path in paths:
+        with open(path, newline='') as f:
+            rows += list(csv.reader(f))[1:]
+    return sorted(rows)
+
+def test_scheduled_conversion_reads_a_pack(json_dir, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pack = str(tmp_path / 'density.jsonl')
+    pack_dir(str(json_dir), pack)
+    try:
+        packed_files = list_json_files(pack)
+        assert order_by_size(packed_files, data_dir=pack) == order_by_size(sorted(os.listdir(json_dir)), data_dir=str(json_dir))
+        from_pack = read_rows(convert_json_files_scheduled(packed_files, {}, data_dir=pack, output_prefix='packed', processes=1))
+        from_dir = read_rows(convert_json_files_scheduled(sorted(os.listdir(json_dir)), {}, data_dir=str(json_dir),
+                                                          output_prefix='plain', processes=1))
+    finally:
+        clear_pack_readers()
+    assert from_pack == from_dir and len(from_pack) == 6
+
+def test_repacking_drops_deleted_sets(json_dir, tmp_path):
+    pack = str(tmp_path / 'density.jsonl')
+    assert pack_dir(str(json_dir), pack) == 3
+    os.remove(json_dir / 'density_setid_Bb002.json')
+    assert pack_dir(str(json_dir), pack) == 0
+    try:
+        assert sorted(open_pack(pack)) == ['Aa001', 'Cc003']
+        assert list_json_files(pack) == ['density_setid_Aa001.json', 'density_setid_Cc003.json']
+    finally:
+        clear_pack_readers()
@@ -0,0 +1,61 @@
+import os
+import json
+import pandas as pd
+import pytest
+from conftest import set_json
+from json_to_csv import convert_incremental, patch_merged_csv, state_path_for
+from merge_csv_files import merge_csv_files
+
+DENSITY = 'Specific density, kg/m<SUP>3</SUP>'
+
+@pytest.fixture
+def corpus(json_dir, tmp_path):
+    """json_dir converted once into tmp_path/csv and merged into tmp_path/merged.csv."""
+    metadata = tmp_path / 'metadata.csv'
+    pd.DataFrame({'setid': ['Aa001', 'Bb002', 'Cc003'], 'reference': ['A', 'B', 'C']}).to_csv(metadata, index=False)
+    csv_dir, merged = str(tmp_path / 'csv'), str(tmp_path / 'merged.csv')
+    changed, removed = convert_incremental(str(json_dir), csv_dir, str(metadata))
+    assert changed == ['Aa001', 'Bb002', 'Cc003'] and removed == []
+    merge_csv_files(csv_dir, merged, required_columns=None, processes=1)
+    return json_dir, csv_dir, str(metadata), merged
+
+def mtimes(folder):
+    return {name: os.stat(os.path.join(folder, name)).st_mtime_ns for name in sorted(os.listdir(folder))}
+
+def test_unchanged_corpus_is_skipped(corpus):
+    json_dir, csv_dir, metadata, _ = corpus
+    before = mtimes(csv_dir)
+    assert convert_incremental(str(json_dir), csv_dir, metadata) == ([], [])
+    assert mtimes(csv_dir) == before
+    assert os.path.exists(state_path_for(csv_dir))
+
+def test_changed_set_is_reconverted_and_patched_into_the_merged_csv(corpus):
+    json_dir, csv_dir, metadata, merged = corpus
+    with open(json_dir / 'density_setid_Bb002.json', 'w') as f:
+        json.dump(set_json('Bb002', temperatures=(298.15, 308.15, 318.15), values=(1234.5, 1230.0, 1225.5)), f)
+    changed, removed = convert_incremental(str(json_dir), csv_dir, metadata)
+    assert changed == ['Bb002'] and removed == []
+    patch_merged_csv(merged, csv_dir, changed, removed)
+
+    table = pd.read_csv(merged)
+    assert sorted(table['setid']) == ['Aa001', 'Aa001', 'Bb002', 'Bb002', 'Bb002', 'Cc003', 'Cc003']
+    assert table.loc[table['setid'] == 'Bb002', DENSITY].tolist() == [1234.5, 1230.0, 1225.5]
+    assert table.loc[table['setid'] == 'Aa001', DENSITY].tolist() == [1000.0, 995.0]
+    assert set(table.loc[table['setid'] == 'Bb002', 'reference']) == {'B'}
+
+def test_metadata_change_reconverts_only_that_set(corpus):
+    json_dir, csv_dir, metadata, _ = corpus
+    pd.DataFrame({'setid': ['Aa001', 'Bb002', 'Cc003'], 'reference': ['A', 'B (corrected)', 'C']}).to_csv(metadata, index=False)
+    assert convert_incremental(str(json_dir), csv_dir, metadata) == (['Bb002'], [])
+    assert set(pd.read_csv(os.path.join(csv_dir, 'density_setid_Bb002.csv'))['reference']) == {'B (corrected)'}
+
+def test_removed_set_is_dropped_from_the_folder_and_the_merged_csv(corpus):
+    json_dir, csv_dir, metadata, merged = corpus
+    os.remove(json_dir / 'density_setid_Cc003.json')
+    changed, removed = convert_incremental(str(json_dir), csv_dir, metadata)
+    assert changed == [] and removed == ['Cc003']
+    assert not os.path.exists(os.path.join(csv_dir, 'density_setid_Cc003.csv'))
+    patch_merged_csv(merged, csv_dir, changed, removed)
+    assert sorted(pd.read_csv(merged)['setid'].unique()) == ['Aa001', 'Bb002']
+    with open(state_path_for(csv_dir)) as f:
+        assert 'Cc003' not in json.load(f)
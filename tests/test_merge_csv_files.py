@@ -0,0 +1,29 @@
+import csv
+from types import SimpleNamespace
+import merge_csv_files as merge_module
+from merge_csv_files import merge_csv_files
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+def test_unreadable_shard_is_skipped_and_reported(tmp_path, monkeypatch):
+    folder = tmp_path / 'csv'
+    folder.mkdir()
+    write_csv(folder / 'a.csv', [['setid', 'Temperature, K'], ['Aa001', '298.15']])
+    write_csv(folder / 'c.csv', [['setid', 'Pressure, kPa'], ['Cc003', '100']])
+    (folder / 'b.csv').write_bytes(b'setid,\xff\xfe value\nBb002,1\n')
+    # A directory named like a CSV cannot be opened as a file
+    (folder / 'd.csv').mkdir()
+
+    output = tmp_path / 'merged.csv'
+    # The merge takes 2 s by this clock
+    clock = iter([10.0, 12.0])
+    monkeypatch.setattr(merge_module, 'time', SimpleNamespace(perf_counter=lambda: next(clock)))
+    summary = merge_csv_files(str(folder), str(output), required_columns=None, processes=1)
+    assert sorted(summary['failed']) == [str(folder / 'b.csv'), str(folder / 'd.csv')]
+    assert summary['files'] == 2 and summary['rows'] == 2
+    # Only the merged files count towards the throughput
+    assert summary['files_per_s'] == 1.0
+    with open(output, newline='') as f:
+        assert list(csv.reader(f)) == [['setid', 'Temperature, K', 'Pressure, kPa'], ['Aa001', '298.15', ''], ['Cc003', '', '100']]
@@ -0,0 +1,52 @@
+import os
+import json
+import shutil
+from types import SimpleNamespace
+import metrics
+from benchmark import generate_corpus
+from main_functions import main
+from pipeline import metrics_path_for, run_pipeline
+
+def stub_maxrss(monkeypatch, readings, platform='linux'):
+    """Makes getrusage report the ru_maxrss readings in turn."""
+    readings = iter(readings)
+    monkeypatch.setattr(metrics, 'resource', SimpleNamespace(
+        RUSAGE_SELF=0, getrusage=lambda who: SimpleNamespace(ru_maxrss=next(readings))))
+    monkeypatch.setattr(metrics, 'sys', SimpleNamespace(platform=platform))
+
+def test_stage_records_its_own_growth_of_the_peak(monkeypatch):
+    # ru_maxrss in KB: the first stage raises the process peak from 100 to 300 MB, the second stays below it
+    stub_maxrss(monkeypatch, [100 * 1024, 300 * 1024, 300 * 1024, 300 * 1024])
+    metrics.reset_metrics()
+    with metrics.stage('grow'):
+        pass
+    with metrics.stage('small'):
+        pass
+    grow, small = metrics.get_metrics()
+    assert (grow['process_peak_rss_mb'], grow['peak_rss_growth_mb']) == (300, 200)
+    assert (small['process_peak_rss_mb'], small['peak_rss_growth_mb']) == (300, 0)
+    assert 'peak_rss_mb' not in grow
+
+def test_peak_rss_is_read_as_bytes_on_macos(monkeypatch):
+    stub_maxrss(monkeypatch, [512 * 1024 * 1024], platform='darwin')
+    assert metrics.peak_rss_mb() == 512
+    monkeypatch.setattr(metrics, 'resource', None)
+    assert metrics.peak_rss_mb() is None
+
+def test_main_writes_metrics_only_when_it_finishes(tmp_path, monkeypatch):
+    generate_corpus(str(tmp_path), n_sets=20)
+    monkeypatch.chdir(tmp_path)
+    main(processes=1)
+    with open('metrics.json') as f:
+        assert 'convert' in {record['stage'] for record in json.load(f)}
+
+    # A failing run removes the earlier report instead of leaving it or a partial one
+    shutil.rmtree('density_data')
+    main(processes=1)
+    assert not os.path.exists('metrics.json')
+
+def test_pipeline_metrics_include_the_sqlite_load(pipeline_corpus):
+    run_pipeline('NmYB', db_path='ilthermo.db')
+    with open(metrics_path_for('NmYB')) as f:
+        stages = {record['stage']: record for record in json.load(f)}
+    assert stages['load']['files'] == 3 and stages['load']['rows'] == 6
@@ -0,0 +1,51 @@
+import os
+import json
+import pandas as pd
+import pipeline
+from pipeline import content_digest, property_spec, run_pipeline
+
+def test_directory_digest_follows_names_sizes_and_mtimes(json_dir):
+    digest = content_digest(str(json_dir))
+    assert content_digest(str(json_dir)) == digest
+    path = json_dir / 'density_setid_Aa001.json'
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert content_digest(str(json_dir)) != digest
+    assert content_digest(str(json_dir / 'missing')) is None
+
+def test_metadata_stage_does_not_target_the_checked_in_tables():
+    for code, checked_in in (('JkYu', 'density_output.csv'), ('bNnk', 'refrindex-output.csv'), ('NmYB', 'meltpoint-output.csv')):
+        assert property_spec(code)['metadata_csv'] != checked_in
+
+def set_csv_mtimes(csv_dir):
+    return {name: os.stat(os.path.join(csv_dir, name)).st_mtime_ns for name in sorted(os.listdir(csv_dir)) if name.endswith('.csv')}
+
+def test_run_pipeline_skips_unchanged_stages_and_reruns_after_a_change(pipeline_corpus, monkeypatch):
+    ran = {}
+    run_stage = pipeline.run_stage
+    monkeypatch.setattr(pipeline, 'run_stage', lambda cache, name, *args, **kwargs:
+                        ran.__setitem__(name, run_stage(cache, name, *args, **kwargs)))
+    spec = run_pipeline('NmYB')
+    assert ran == {'metadata': True, 'components': True, 'convert': True, 'merge': True}
+    merged = pd.read_csv(spec['merged_csv'])
+    assert sorted(merged['setid'].unique()) == ['Aa001', 'Bb002', 'Cc003'] and len(merged) == 6
+    # Nothing is written over the checked-in per-set CSVs and merged tables
+    assert not os.path.exists('meltingtemp_csv_data') and not os.path.exists('meltingtemp-data.csv')
+    before = set_csv_mtimes(spec['csv_dir'])
+
+    run_pipeline('NmYB')
+    assert not any(ran.values())
+
+    path = os.path.join(spec['json_dir'], 'density_setid_Bb002.json')
+    with open(path) as f:
+        data = json.load(f)
+    data['data'][0][2][0] = '1234.5'
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    run_pipeline('NmYB')
+    assert ran == {'metadata': False, 'components': True, 'convert': True, 'merge': True}
+    after = set_csv_mtimes(spec['csv_dir'])
+    assert [name for name in after if after[name] != before[name]] == [name for name in after if 'Bb002' in name]
+    merged = pd.read_csv(spec['merged_csv']).set_index('setid')
+    assert merged.loc['Bb002', 'Specific density, kg/m<SUP>3</SUP>'].tolist() == [1234.5, 996.0]
+    assert merged.loc['Aa001', 'Specific density, kg/m<SUP>3</SUP>'].tolist() == [1000.0, 995.0]
@@ -0,0 +1,21 @@
+import csv
+import logging
+import metrics
+from main_functions import convert_json_files_scheduled
+
+def test_unreadable_set_is_reported_and_not_retried(json_dir, tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)
+    with open(json_dir / 'density_setid_Bb002.json', 'w') as f:
+        f.write('{"dhead": [["Temperature, K"]], "data": [[["298')
+    metrics.reset_metrics()
+    with caplog.at_level(logging.ERROR):
+        paths = convert_json_files_scheduled(sorted(p.name for p in json_dir.iterdir()), {}, data_dir=str(json_dir), processes=1)
+
+    setids = []
+    for path in paths:
+        with open(path, newline='') as f:
+            setids += [row['setid'] for row in csv.DictReader(f)]
+    assert sorted(set(setids)) == ['Aa001', 'Cc003'] and len(setids) == 4
+    assert any('Cannot read density_setid_Bb002.json' in message for message in caplog.messages)
+    assert not any('Giving up' in message for message in caplog.messages)
+    assert metrics.get_metrics()[-1]['errors'] == 1
@@ -0,0 +1,18 @@
+from schema_registry import SchemaRegistry, _row_builder, convert_group
+
+SIGNATURE = ('Temperature, K', 'Pressure, kPa')
+ROWS = [[['298.15'], ['101.325']], [['308.15'], ['101.325']]]
+
+def convert(output_columns):
+    registry = SchemaRegistry({}, numeric_columns=SIGNATURE)
+    key, sources = registry.layout(SIGNATURE, output_columns)
+    return [list(rows) for rows in convert_group(key, [('Aa001', ROWS, sources)], output_columns, registry.numeric_columns)]
+
+def test_rows_are_laid_out_in_the_output_columns():
+    assert convert(('setid', 'Pressure, kPa', 'Temperature, K', 'Viscosity, Pa*s')) == \
+        [[('Aa001', 101.325, 298.15, None), ('Aa001', 101.325, 308.15, None)]]
+
+def test_single_column_layouts_give_one_cell_rows():
+    assert convert(('setid',)) == [[('Aa001',), ('Aa001',)]]
+    assert _row_builder((0,), 1)(('Aa001',)) == ('Aa001',)
+    assert list(_row_builder((), 1)(())) == [None]
@@ -0,0 +1,29 @@
+import json
+import numpy as np
+from set_index import build_set_index, range_slice, sets_in_range, sets_with_compound
+from conftest import set_json
+
+def test_range_filter_needs_one_point_inside_both_ranges(json_dir, tmp_path):
+    # Bb002 has 300 K at 5000 kPa and 400 K at 100 kPa: each range is met, but never by one point
+    data = set_json('Bb002', temperatures=(300.0, 400.0))
+    data['data'][0][1] = ['5000']
+    with open(json_dir / 'density_setid_Bb002.json', 'w') as f:
+        json.dump(data, f)
+    idset = tmp_path / 'idset.json'
+    with open(idset, 'w') as f:
+        json.dump({'res': [[setid, '', '', '', 'AAAAA', '', ''] for setid in ('Aa001', 'Bb002', 'Cc003')]}, f)
+
+    index = build_set_index(idset_path=str(idset), json_dirs=[str(json_dir)])
+    setids = sets_with_compound(index, 'AAAAA')
+    assert sets_in_range(index, setids, 290, 310, 100, 102) == ['Aa001', 'Cc003']
+    assert sets_in_range(index, setids, 290, 310) == ['Aa001', 'Bb002', 'Cc003']
+    assert sets_in_range(index, setids, p_min=4000) == ['Bb002']
+    assert sets_in_range(index, setids, t_min=350, p_max=200) == ['Bb002']
+
+def test_range_slice_skips_the_trailing_nans():
+    values = np.array([290.0, 298.15, 298.15, 310.0, np.nan, np.nan])
+    assert range_slice(values) == (0, 4)
+    assert range_slice(values, 298.15, 298.15) == (1, 3)
+    assert range_slice(values, low=300.0) == (3, 4)
+    start, stop = range_slice(values, 320.0, 330.0)
+    assert start == stop
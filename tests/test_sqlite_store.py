@@ -0,0 +1,38 @@
+import sqlite3
+import pandas as pd
+import sqlite_store
+from sqlite_store import load_property, query_measurements
+
+def write_metadata(path):
+    pd.DataFrame({'setid': ['Aa001', 'Bb002', 'Cc003'], 'reference': ['r1', 'r2', 'r3'], 'property': ['Density'] * 3,
+                  'phases': ['Liquid'] * 3, 'compound id 1': ['AAAAA'] * 3}).to_csv(path, index=False)
+    pd.DataFrame({'id': ['AAAAA'], 'name': ['water'], 'smiles': ['O']}).to_csv(path.parent / 'compounds.csv', index=False)
+
+def test_reload_in_batches_wider_than_the_variable_limit(json_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, 'MAX_VARIABLES', 2)
+    write_metadata(tmp_path / 'output.csv')
+    db_path = str(tmp_path / 'ilthermo.db')
+    for _ in range(2):
+        assert load_property(db_path, str(json_dir), str(tmp_path / 'output.csv'), str(tmp_path / 'compounds.csv'), batch_size=5) == 3
+    points = query_measurements(db_path, 'AAAAA', 'Density', 290, 300)
+    assert sorted(points['setid']) == ['Aa001', 'Bb002', 'Cc003']
+    assert points['value'].tolist() == [1000.0, 1001.0, 1002.0]
+
+def test_query_closes_its_connection(json_dir, tmp_path, monkeypatch):
+    write_metadata(tmp_path / 'output.csv')
+    db_path = str(tmp_path / 'ilthermo.db')
+    load_property(db_path, str(json_dir), str(tmp_path / 'output.csv'), str(tmp_path / 'compounds.csv'))
+    opened = []
+
+    class Tracked(sqlite3.Connection):
+        closed = False
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, 'connect', lambda path, **kwargs: opened.append(connect(path, factory=Tracked, **kwargs)) or opened[-1])
+    for _ in range(3):
+        assert len(query_measurements(db_path)) == 6
+    assert len(opened) == 3 and all(conn.closed for conn in opened)
@@ -0,0 +1,61 @@
+import os
+import json
+import filecmp
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import set_json
+from json_to_csv import convert_incremental
+from star_schema import MEASUREMENT_COLUMNS, export_star_schema, load_measurements, wide_frame, write_wide_csvs
+
+DENSITY = 'Specific density, kg/m<SUP>3</SUP>'
+FRACTION = 'Mole fraction of water'
+
+@pytest.fixture
+def star(json_dir, tmp_path):
+    """json_dir with an extra condition column, an exponent cell and a melting set, exported to tmp_path/star."""
+    with open(json_dir / 'density_setid_Bb002.json', 'w') as f:
+        data = set_json('Bb002')
+        data['dhead'].insert(2, [FRACTION, 'Liquid'])
+        data['data'] = [[['298.15'], ['101.325'], ['0.25'], ['1.2e+03', '0.5']], [['308.15'], [''], ['0.5'], ['995']]]
+        json.dump(data, f)
+    with open(json_dir / 'meltingtemp_setid_Dd004.json', 'w') as f:
+        json.dump({'dhead': [['Normal melting temperature, K', 'Crystal']], 'data': [[['350.5', '1.5']]], 'components': []}, f)
+    metadata = tmp_path / 'metadata.csv'
+    pd.DataFrame({'setid': ['Aa001', 'Bb002', 'Cc003', 'Dd004'], 'reference': list('ABCD'),
+                  'property': ['Density'] * 3 + ['Normal melting temperature'],
+                  'compound id 1': ['AAAAA'] * 4, 'compound name 1': ['water', 'water', 'water, shifted', 'water'],
+                  'smile 1': 'O'}).to_csv(metadata, index=False)
+    star_dir = str(tmp_path / 'star')
+    assert export_star_schema(str(json_dir), str(metadata), star_dir, str(tmp_path / 'missing.csv')) == 4
+    return json_dir, str(metadata), star_dir
+
+def test_measurements_are_typed_and_keep_the_uncertainty(star):
+    _, _, star_dir = star
+    measurements, conditions = load_measurements(star_dir, with_conditions=True)
+    assert list(measurements.columns) == MEASUREMENT_COLUMNS + ['property', 'quantity']
+    for col in ('temperature', 'pressure', 'value', 'uncertainty'):
+        assert measurements[col].dtype == 'float64'
+    table = measurements.set_index(['setid', 'row'])
+    assert table.loc[('Aa001', 0), ['temperature', 'pressure', 'value', 'uncertainty']].tolist() == [298.15, 101.325, 1000.0, 0.5]
+    assert table.loc[('Bb002', 0), 'value'] == 1200.0
+    assert np.isnan(table.loc[('Bb002', 1), 'pressure']) and np.isnan(table.loc[('Bb002', 1), 'uncertainty'])
+    # The melting set has no state columns, only its value
+    melting = table.loc[('Dd004', 0)]
+    assert np.isnan(melting['temperature']) and (melting['value'], melting['uncertainty']) == (350.5, 1.5)
+    assert melting['quantity'] == 'Normal melting temperature, K' and melting['property'] == 'Normal melting temperature'
+    assert conditions[['setid', 'row', 'name', 'value']].values.tolist() == [['Bb002', 0, FRACTION, 0.25], ['Bb002', 1, FRACTION, 0.5]]
+
+def test_wide_view_matches_json_to_csv_byte_for_byte(star, tmp_path):
+    json_dir, metadata, star_dir = star
+    reference, rebuilt = str(tmp_path / 'csv'), str(tmp_path / 'wide')
+    convert_incremental(str(json_dir), reference, metadata)
+    assert write_wide_csvs(star_dir, rebuilt) == 4
+    names = sorted(name for name in os.listdir(reference) if name.endswith('.csv'))
+    assert sorted(os.listdir(rebuilt)) == names
+    match, mismatch, errors = filecmp.cmpfiles(reference, rebuilt, names, shallow=False)
+    assert mismatch == errors == []
+
+    frame = wide_frame(star_dir, setids={'Bb002', 'Cc003'})
+    assert frame.loc[frame['setid'] == 'Bb002', DENSITY].tolist() == ['1.2e+03', '995']
+    assert set(frame.loc[frame['setid'] == 'Cc003', 'compound name 1']) == {'water, shifted'}
@@ -0,0 +1,39 @@
+import csv
+import json
+from main_functions import process_json_files_to_csv_streaming, read_dhead
+from conftest import set_json
+
+def test_union_header_is_the_default(json_dir, tmp_path):
+    # The last set has a column the others lack, written after the dhead of a long title
+    data = set_json('Cc003')
+    data = {'title': 'a "dhead": [] lookalike', **data}
+    data['dhead'].append(['Mole fraction of water, Liquid'])
+    for row in data['data']:
+        row.append(['0.25'])
+    with open(json_dir / 'density_setid_Cc003.json', 'w') as f:
+        json.dump(data, f)
+
+    output = tmp_path / 'out.csv'
+    process_json_files_to_csv_streaming(sorted(p.name for p in json_dir.iterdir()), str(output), {}, data_dir=str(json_dir))
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert 'Mole fraction of water, Liquid' in rows[0]
+    assert all('0.25' in row['Mole fraction of water, Liquid'] for row in rows if row['setid'] == 'Cc003')
+    assert all(row['Mole fraction of water, Liquid'] == '' for row in rows if row['setid'] != 'Cc003')
+
+    required = tmp_path / 'required.csv'
+    process_json_files_to_csv_streaming(sorted(p.name for p in json_dir.iterdir()), str(required), {}, all_columns=False, data_dir=str(json_dir))
+    with open(required, newline='') as f:
+        assert 'Mole fraction of water, Liquid' not in next(csv.reader(f))
+
+def test_read_dhead_matches_full_decode(json_dir):
+    data = set_json('Dd004')
+    # dhead after the data, and longer than the first window
+    data['dhead'] = [[f'Column {i} ' + 'x' * 50] for i in range(100)]
+    data = {'data': data.pop('data'), **data}
+    with open(json_dir / 'density_setid_Dd004.json', 'w') as f:
+        json.dump(data, f)
+    for path in json_dir.iterdir():
+        with open(path) as f:
+            assert read_dhead(path.name, str(json_dir)) == json.load(f)['dhead']
+    assert read_dhead('density_setid_missing.json', str(json_dir)) == []
@@ -0,0 +1,84 @@
+import os
+import json
+import pytest
+from install_all_jsons import (load_manifest, manifest_entry, manifest_path, plan_fetch, remove_sets,
+                               save_manifest, sync_sets)
+
+def set_path(folder, setid):
+    return os.path.join(folder, f'density_setid_{setid}.json')
+
+def write_idset(setids):
+    os.makedirs('idsets', exist_ok=True)
+    with open(os.path.join('idsets', 'density-idset.json'), 'w') as f:
+        json.dump({'res': [[setid] for setid in setids]}, f)
+
+@pytest.fixture
+def served(json_dir, tmp_path, monkeypatch, stub_server):
+    """The stub server over json_dir, with the working directory at tmp_path for idsets/."""
+    monkeypatch.chdir(tmp_path)
+    return stub_server(str(json_dir), validators=False)
+
+def test_plan_fetch_skips_done_retries_failed_and_adopts_existing(tmp_path):
+    folder = str(tmp_path)
+    for setid in ('Aa001', 'Bb002', 'Cc003'):
+        with open(set_path(folder, setid), 'wb') as f:
+            f.write(b'{"data": []}')
+    manifest = {
+        'Aa001': manifest_entry(b'{"data": []}'),
+        'Bb002': manifest_entry(None, 'failed', 'timeout'),
+        # Recorded size no longer matches the file on disk
+        'Cc003': manifest_entry(b'{"data": [1]}'),
+    }
+    todo, skipped = plan_fetch('density', ['Aa001', 'Bb002', 'Cc003', 'Dd004', 'Ee005'], folder, manifest)
+    assert skipped == ['Aa001']
+    assert todo == ['Bb002', 'Cc003', 'Dd004', 'Ee005']
+
+    with open(set_path(folder, 'Dd004'), 'wb') as f:
+        f.write(b'{}')
+    todo, skipped = plan_fetch('density', ['Dd004'], folder, {})
+    assert skipped == ['Dd004'] and todo == []
+
+def test_manifest_round_trip(tmp_path):
+    path = manifest_path(str(tmp_path / 'density_json_data'))
+    assert path.endswith('density_json_data-manifest.json')
+    assert load_manifest(path) == {}
+    save_manifest(path, {'Aa001': manifest_entry(b'abc')})
+    assert load_manifest(path)['Aa001']['size'] == 3 and not os.path.exists(path + '.tmp')
+    with open(path, 'w') as f:
+        f.write('{"Aa001": ')
+    assert load_manifest(path) == {}
+
+def test_remove_sets_deletes_files_and_entries(tmp_path):
+    folder = str(tmp_path)
+    with open(set_path(folder, 'Aa001'), 'w') as f:
+        f.write('{}')
+    manifest = {'Aa001': manifest_entry(b'{}'), 'Bb002': manifest_entry(None, 'failed')}
+    assert remove_sets('density', ['Aa001', 'Bb002', 'Zz999'], folder, manifest) == 1
+    assert manifest == {} and not os.path.exists(set_path(folder, 'Aa001'))
+
+def test_sync_fetches_only_what_is_missing(served, tmp_path):
+    folder = str(tmp_path / 'density_json_data')
+    write_idset(['Aa001', 'Bb002'])
+    assert sync_sets('density', 'density', folder, max_workers=2, base_url=served)['files'] == 2
+
+    write_idset(['Aa001', 'Bb002', 'Cc003', 'Zz999'])
+    summary = sync_sets('density', 'density', folder, max_workers=2, base_url=served)
+    assert summary['skipped'] == 2 and summary['files'] == 1 and summary['failed'] == ['Zz999']
+    manifest = load_manifest(manifest_path(folder))
+    assert manifest['Cc003']['status'] == 'ok' and manifest['Zz999']['status'] == 'failed'
+    assert manifest['Cc003']['size'] == os.path.getsize(set_path(folder, 'Cc003'))
+
+def test_sync_applies_an_idset_delta(served, tmp_path):
+    folder = str(tmp_path / 'density_json_data')
+    write_idset(['Aa001', 'Bb002', 'Cc003'])
+    sync_sets('density', 'density', folder, max_workers=2, base_url=served)
+    before = os.path.getmtime(set_path(folder, 'Bb002'))
+    os.utime(set_path(folder, 'Bb002'), (before - 100, before - 100))
+
+    write_idset(['Aa001', 'Bb002'])
+    delta = {'added': [], 'removed': ['Cc003'], 'changed': {'Bb002': ['np']}, 'refetch': ['Bb002']}
+    summary = sync_sets('density', 'density', folder, max_workers=2, base_url=served, delta=delta)
+    assert summary['files'] == 1 and summary['skipped'] == 1
+    assert not os.path.exists(set_path(folder, 'Cc003'))
+    assert 'Cc003' not in load_manifest(manifest_path(folder))
+    assert os.path.getmtime(set_path(folder, 'Bb002')) > before - 100
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from temperature_fits import fit_groups, fit_temperature_dependence, load_set_points
+
+def test_fit_recovers_a_line_and_drops_short_series():
+    points = pd.DataFrame({
+        'setid': ['Aa001'] * 3 + ['Bb002'],
+        'conditions': [''] * 4,
+        'temperature': [298.15, 308.15, 318.15, 298.15],
+        'value': [1000.0, 995.0, 990.0, 900.0],
+    })
+    table = fit_temperature_dependence(points)
+    assert list(table['setid']) == ['Aa001']
+    assert np.isclose(table['c0'][0], 1000.0) and np.isclose(table['c1'][0], -0.5)
+
+def test_property_without_temperature_column_gives_an_empty_table(tmp_path):
+    with open(tmp_path / 'meltingtemp_setid_Aa001.csv', 'w') as f:
+        f.write('setid,"Melting point, K",reference\nAa001,300.5,ref\n')
+    table = fit_temperature_dependence(load_set_points(str(tmp_path)), degree=2)
+    assert table.empty
+    assert list(table.columns) == ['setid', 'conditions', 'n_points', 't_min', 't_max', 'c0', 'c1', 'c2', 'rmse', 'max_residual']
+
+def test_all_nan_temperatures_give_an_empty_table():
+    points = pd.DataFrame({'setid': ['Aa001', 'Aa001'], 'conditions': ['', ''],
+                           'temperature': [np.nan, np.nan], 'value': [1000.0, 995.0]})
+    assert fit_temperature_dependence(points).empty
+    fits = fit_groups(np.array([], dtype=np.int64), np.array([]), np.array([]), degree=1)
+    assert fits['coefficients'].shape == (0, 2) and len(fits['n']) == 0
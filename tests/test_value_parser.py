@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from main_functions import clean_numeric_value, clean_temperature_value
+from value_parser import parse_value_column, parse_values
+
+# (cell, value, uncertainty) with NaN where nothing is given
+CASES = [
+    (['298.15'], 298.15, np.nan),
+    (['997.8', '2'], 997.8, 2.0),
+    (['-1.5'], -1.5, np.nan),
+    (['12', ''], 12.0, np.nan),
+    (['0.25', 'x'], 0.25, np.nan),
+    ([], np.nan, np.nan),
+    ([None], np.nan, np.nan),
+    (None, np.nan, np.nan),
+    ('', np.nan, np.nan),
+    (float('nan'), np.nan, np.nan),
+    (298.15, 298.15, np.nan),
+    (7, 7.0, np.nan),
+    ('997.8±2', 997.8, 2.0),
+    ('-3.2 ± 0.1', -3.2, 0.1),
+    ("['298.15']", 298.15, np.nan),
+    ('298.15 K', 298.15, np.nan),
+    ('n/a', np.nan, np.nan),
+    ('abc', np.nan, np.nan),
+]
+
+def scalar(cell):
+    """The per-cell path the vectorized parser replaced."""
+    value = clean_numeric_value(clean_temperature_value(str(cell)))
+    return np.nan if value is None else value
+
+def test_matches_the_scalar_path_on_edge_cases():
+    cells = [cell for cell, _, _ in CASES]
+    values, uncertainties = parse_value_column(cells)
+    assert values.dtype == uncertainties.dtype == np.float64
+    np.testing.assert_array_equal(values, [value for _, value, _ in CASES])
+    np.testing.assert_array_equal(uncertainties, [uncertainty for _, _, uncertainty in CASES])
+    np.testing.assert_array_equal(values, [scalar(cell) for cell in cells])
+    np.testing.assert_array_equal(parse_values(cells), values)
+
+@pytest.mark.parametrize('cell, value', [(['1.5e-3'], 0.0015), (['.5'], 0.5), ('2.5E+2±1e1', 250.0)])
+def test_reads_exponents_and_leading_points_the_scalar_path_truncated(cell, value):
+    values, _ = parse_value_column([cell])
+    assert values[0] == value and scalar(cell) != value
+
+def test_mixed_column_takes_the_fallback_per_cell():
+    # One text cell makes the fast float conversion fail for the whole column
+    values, uncertainties = parse_value_column([['1.0'], ['2.0', '0.1'], 'about 3', 4])
+    np.testing.assert_array_equal(values, [1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_array_equal(uncertainties, [np.nan, 0.1, np.nan, np.nan])
+    assert parse_value_column([])[0].shape == (0,)
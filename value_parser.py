@@ -0,0 +1,71 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+
+# A number with optional exponent, optionally followed by '±' and an uncertainty
+VALUE_PATTERN = r'(?P<value>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?:\s*±\s*(?P<uncertainty>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?))?'
+
+def _split_cells(cells):
+    """Splits raw cells into a value part and an uncertainty part: ['997.8', '2'] -> '997.8', '2'."""
+    first = [(cell[0] if cell else None) if isinstance(cell, (list, tuple)) else cell for cell in cells]
+    second = [cell[1] if isinstance(cell, (list, tuple)) and len(cell) > 1 else None for cell in cells]
+    return first, second
+
+def _to_float_array(raw):
+    """Converts a list of numbers/numeric strings at C speed, falling back to pandas when some entries are not numbers."""
+    try:
+        return np.array(raw, dtype='float64')
+    except (ValueError, TypeError):
+        return pd.to_numeric(pd.Series(raw, dtype=object), errors='coerce').to_numpy(dtype='float64', copy=True)
+
+def parse_value_column(cells):
+    """
+    Parses a whole column of raw ILThermo cells into float64 value and uncertainty arrays
+    (NaN where missing). Accepts the JSON cells (['298.15'], ['997.8', '2'], [], None),
+    plain numbers and text such as '997.8±2', "['298.15']" or '298.15 K'.
+    """
+    first, second = _split_cells(cells)
+    values = _to_float_array(first)
+    uncertainties = _to_float_array(second)
+
+    # Text that is not a bare number goes through one regex pass over the unparsed cells
+    text = np.flatnonzero(np.isnan(values) & np.array([isinstance(cell, str) for cell in first], dtype=bool))
+    if len(text):
+        extracted = pd.Series([first[i] for i in text], dtype=object).str.extract(VALUE_PATTERN)
+        values[text] = pd.to_numeric(extracted['value'], errors='coerce').to_numpy(dtype='float64')
+        parsed = pd.to_numeric(extracted['uncertainty'], errors='coerce').to_numpy(dtype='float64')
+        uncertainties[text] = np.where(np.isnan(uncertainties[text]), parsed, uncertainties[text])
+    return values, uncertainties
+
+def parse_values(cells):
+    """Returns only the float64 values of parse_value_column."""
+    return parse_value_column(cells)[0]
+
+def benchmark(json_dir='density_json_data', n_files=2000):
+    """Times the per-cell clean_numeric_value path against parse_value_column on the first n_files sets."""
+    from main_functions import clean_numeric_value, clean_temperature_value
+
+    cells = []
+    for json_file in sorted(os.listdir(json_dir))[:n_files]:
+        with open(os.path.join(json_dir, json_file), 'r') as file:
+            for row in json.load(file).get('data', []):
+                cells.extend(row)
+    series = pd.Series(cells, dtype=object)
+
+    start = time.perf_counter()
+    per_cell = series.apply(lambda x: clean_numeric_value(clean_temperature_value(str(x))))
+    per_cell_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values, _ = parse_value_column(cells)
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = int((~np.isclose(per_cell.astype('float64'), values, equal_nan=True)).sum())
+    print(f"{len(cells)} cells from {n_files} sets")
+    print(f"per-cell: {per_cell_seconds:.3f} s, batch: {batch_seconds:.3f} s "
+          f"({per_cell_seconds / batch_seconds:.1f}x), value mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    benchmark()